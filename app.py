@@ -1,10 +1,9 @@
 from flask import Flask
 from config import Config
-from celery import Celery
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 
-celery = Celery(__name__, broker=Config.CELERY_BROKER_URL, backend=Config.CELERY_RESULT_BACKEND)
+from tasks import app as celery  # Единое приложение Celery (celery_config.make_celery)
 
 # Инициализация лимитера вне функции, чтобы можно было использовать декораторы
 limiter = Limiter(key_func=get_remote_address)
@@ -20,7 +19,4 @@ def create_app():
     from routes import main
     app.register_blueprint(main)
 
-    # Обновляем конфигурацию Celery
-    celery.conf.update(app.config)
-
     return app
\ No newline at end of file
@@ -0,0 +1,45 @@
+"""
+Бенчмарк загрузки чата: последовательная цепочка курсоров против параллельных отрезков.
+
+Запуск из корня проекта:
+    python -m benchmarks.chat_download_benchmark [длительность_с] [сообщений_в_секунду] [задержка_с]
+
+Чат отдаёт локальная заглушка GQL (benchmarks.gql_stub_server), файлы пишутся во временный PROJECT_ROOT.
+"""
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.gql_stub_server import start_server
+
+SEGMENT_COUNTS = [1, 4, 8, 16]
+
+
+def main(duration=1800, rate=5, latency=0.02):
+    server, url = start_server(duration, rate, latency)
+    os.environ["GQL_URL"] = url
+    os.environ["PROJECT_ROOT"] = tempfile.mkdtemp(prefix="chat_download_bench_")
+    os.environ.setdefault("CHAT_CLIENT_ID", "stub")
+    os.environ.setdefault("CHAT_CLIENT_SHA", "stub")
+
+    from data_collectors.chat_download import download_chat_to_file
+
+    reference = None
+    print(f"{'отрезков':>9} {'время, с':>9} {'комментариев':>13} {'совпадает':>10}")
+    for segments in SEGMENT_COUNTS:
+        start = time.perf_counter()
+        comments = download_chat_to_file("bench", force_download=True, segments=segments,
+                                         max_workers=segments, duration=duration)
+        elapsed = time.perf_counter() - start
+
+        ids = [comment["_id"] for comment in comments]
+        if reference is None:
+            reference = ids
+        print(f"{segments:>9} {elapsed:>9.2f} {len(ids):>13} {'да' if ids == reference else 'нет':>10}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main(*[float(arg) if "." in arg else int(arg) for arg in sys.argv[1:]])
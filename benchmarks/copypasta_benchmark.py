@@ -0,0 +1,112 @@
+"""
+Бенчмарк группировки паст: group_similar_pastas против исходного попарного сравнения.
+
+Запуск из корня проекта:
+    python -m benchmarks.copypasta_benchmark [размер ...]
+
+Для каждого размера генерируется синтетический набор повторяющихся сообщений (базовые пасты и их
+варианты с добавленными/удалёнными словами и опечатками), затем замеряется время обеих реализаций
+и совпадение результатов. Попарное сравнение запускается только до BRUTE_FORCE_MAX_SIZE паст.
+"""
+import random
+import sys
+import time
+from difflib import SequenceMatcher
+
+from data_analytic import copypasta
+from data_analytic.copypasta import SIMILARITY_THRESHOLD, group_similar_pastas, normalize_text
+
+DEFAULT_SIZES = [500, 1000, 2000, 5000, 10000, 20000]
+BRUTE_FORCE_MAX_SIZE = 2000
+SEED = 42
+
+
+def group_similar_pastas_bruteforce(pasta_data):
+    """Исходная реализация: сравнение каждой пасты с каждой через SequenceMatcher."""
+    grouped_pastas = []
+    seen = set()
+
+    for base_pasta, count in sorted(pasta_data.items(), key=lambda x: -x[1]):
+        if base_pasta in seen:
+            continue
+
+        base_normalized = normalize_text(base_pasta)
+        group = {"base_pasta": base_pasta, "count": count, "variants": []}
+
+        for other_pasta, other_count in pasta_data.items():
+            if other_pasta in seen or other_pasta == base_pasta:
+                continue
+
+            similarity = SequenceMatcher(None, base_normalized, normalize_text(other_pasta)).ratio()
+            if similarity >= SIMILARITY_THRESHOLD:
+                group["variants"].append({"text": other_pasta, "count": other_count})
+                seen.add(other_pasta)
+
+        grouped_pastas.append(group)
+        seen.add(base_pasta)
+
+    return grouped_pastas
+
+
+def generate_pastas(size, rng):
+    """Генерирует словарь текст -> число повторов (вход group_similar_pastas)."""
+    alphabet = "abcdefghijklmnopqrstuvwxyzабвгдежзиклмнопрст"
+    vocab = ["".join(rng.choice(alphabet) for _ in range(rng.randint(2, 8))) for _ in range(3000)]
+
+    def mutate(text):
+        words = text.split()
+        roll = rng.random()
+        if roll < 0.2:
+            words.append(rng.choice(vocab))
+        elif roll < 0.4:
+            words.insert(0, rng.choice(vocab))
+        elif roll < 0.6 and len(words) > 3:
+            words.pop(rng.randrange(len(words)))
+        else:
+            chars = list(text)
+            for _ in range(1 if roll < 0.8 else 3):
+                chars[rng.randrange(len(chars))] = rng.choice("xyzqw")
+            return "".join(chars)
+        return " ".join(words)
+
+    pastas = {}
+    while len(pastas) < size:
+        base = " ".join(rng.choice(vocab) for _ in range(rng.randint(2, 12)))
+        for _ in range(rng.randint(1, 8)):
+            text = base
+            for _ in range(rng.randint(0, 2)):
+                text = mutate(text)
+            if len(text) >= copypasta.PASTA_MIN_LENGTH and len(pastas) < size:
+                pastas[text] = pastas.get(text, 0) + rng.randint(2, 20)
+    return pastas
+
+
+def measure(func, data):
+    start = time.perf_counter()
+    result = func(data)
+    return result, time.perf_counter() - start
+
+
+def main(sizes):
+    rng = random.Random(SEED)
+    print(f"{'паст':>8} {'попарно, с':>12} {'индекс, с':>10} {'ускорение':>10} {'совпадение':>11}")
+
+    for size in sizes:
+        data = generate_pastas(size, rng)
+        indexed, indexed_time = measure(group_similar_pastas, data)
+
+        if size > BRUTE_FORCE_MAX_SIZE:
+            print(f"{size:>8} {'—':>12} {indexed_time:>10.2f} {'—':>10} {'—':>11}")
+            continue
+
+        reference, reference_time = measure(group_similar_pastas_bruteforce, data)
+        reference_pairs = {(g["base_pasta"], v["text"]) for g in reference for v in g["variants"]}
+        indexed_pairs = {(g["base_pasta"], v["text"]) for g in indexed for v in g["variants"]}
+        agreement = len(reference_pairs & indexed_pairs) / len(reference_pairs) if reference_pairs else 1.0
+
+        print(f"{size:>8} {reference_time:>12.2f} {indexed_time:>10.2f} "
+              f"{reference_time / indexed_time:>9.1f}x {agreement:>10.1%}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
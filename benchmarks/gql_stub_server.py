@@ -0,0 +1,118 @@
+"""
+Локальная заглушка GQL Twitch для проверки загрузки чата без обращения к gql.twitch.tv.
+
+Отдаёт синтетический чат на запрос VideoCommentsByOffsetOrCursor: страницы по PAGE_SIZE комментариев,
+начиная с contentOffsetSeconds (без курсора) или с позиции курсора. Задержка ответа имитирует RTT.
+Сбои задаются очередью server.faults: очередной запрос снимает из неё HTTP-статус и отвечает им
+(с Retry-After: 0), байты — отвечает ими со статусом 200 (битая страница), None в очереди — обычный ответ.
+server.requests — число полученных запросов.
+
+Запуск отдельно:
+    python -m benchmarks.gql_stub_server --port 8765 --duration 3600 --rate 5 --latency 0.05
+затем GQL_URL=http://127.0.0.1:8765/gql
+"""
+import argparse
+import bisect
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PAGE_SIZE = 50
+
+
+def build_comments(duration, rate):
+    """Генерирует комментарии: rate сообщений в секунду на протяжении duration секунд."""
+    comments = []
+    for second in range(duration):
+        for k in range(rate):
+            n = len(comments)
+            comments.append({
+                "id": f"comment-{n}",
+                "createdAt": f"2025-01-01T00:00:{second % 60:02d}Z",
+                "contentOffsetSeconds": second,
+                "commenter": {"id": str(n % 500), "login": f"user{n % 500}", "displayName": f"User{n % 500}"},
+                "message": {
+                    "fragments": [{"text": f"message {n} at {second}"}],
+                    "userColor": "#FFFFFF",
+                    "userBadges": [],
+                },
+            })
+    return comments
+
+
+def make_handler(comments, latency):
+    offsets = [comment["contentOffsetSeconds"] for comment in comments]
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            with self.server.lock:
+                self.server.requests += 1
+                fault = self.server.faults.popleft() if self.server.faults else None
+            if isinstance(fault, bytes):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(fault)))
+                self.end_headers()
+                self.wfile.write(fault)
+                return
+            if fault is not None:
+                self.send_response(fault)
+                self.send_header("Retry-After", "0")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            variables = body["variables"]
+            if variables.get("cursor"):
+                position = int(variables["cursor"])
+            else:
+                position = bisect.bisect_left(offsets, variables.get("contentOffsetSeconds", 0))
+
+            page = comments[position:position + PAGE_SIZE]
+            edges = [{"cursor": str(position + i + 1), "node": node} for i, node in enumerate(page)]
+            payload = {"data": {"video": {"comments": {
+                "edges": edges,
+                "pageInfo": {"hasNextPage": position + PAGE_SIZE < len(comments)},
+            }}}}
+
+            time.sleep(latency)
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def start_server(duration=600, rate=5, latency=0.02, port=0):
+    """Запускает заглушку в фоновом потоке, возвращает (server, url)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(build_comments(duration, rate), latency))
+    server.lock = threading.Lock()
+    server.faults = deque()
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/gql"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--duration", type=int, default=3600)
+    parser.add_argument("--rate", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    server, url = start_server(args.duration, args.rate, args.latency, args.port)
+    print(f"GQL-заглушка слушает {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
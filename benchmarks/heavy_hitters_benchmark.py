@@ -0,0 +1,93 @@
+"""
+Бенчмарк приближённого топа (SpaceSaving) против точного Counter.
+
+Запуск из корня проекта:
+    python -m benchmarks.heavy_hitters_benchmark [сообщений] [авторов] [top_n]
+
+Генерируется поток имён авторов с распределением Ципфа (по умолчанию 2 000 000 сообщений от
+500 000 разных авторов) — так распределена активность в больших чатах: немного очень активных
+и длинный хвост авторов с одним-двумя сообщениями. Для Counter и SpaceSaving разной ёмкости
+замеряются время прохода, пик памяти (tracemalloc), доля точного топа-N, найденная приближённо,
+максимальная ошибка счётчика в топе и соблюдение гарантии count - error <= истинное <= count.
+"""
+import random
+import sys
+import time
+import tracemalloc
+from collections import Counter
+
+from data_analytic.heavy_hitters import SpaceSaving
+
+DEFAULT_MESSAGES = 2_000_000
+DEFAULT_AUTHORS = 500_000
+DEFAULT_TOP_N = 10
+CAPACITIES = (100, 1_000, 10_000)
+ZIPF_EXPONENT = 1.1
+SEED = 42
+
+
+def generate(messages_count, authors_count, rng):
+    """Генерирует поток имён авторов с распределением Ципфа."""
+    names = [f"user_{i:07d}" for i in range(authors_count)]
+    rng.shuffle(names)
+    weights = [1 / (rank ** ZIPF_EXPONENT) for rank in range(1, authors_count + 1)]
+    return rng.choices(names, weights=weights, k=messages_count)
+
+
+def measure(build, stream):
+    """Время и пик памяти построения структуры подсчёта по потоку."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    structure = build(stream)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return structure, elapsed, peak
+
+
+def count_exact(stream):
+    counts = Counter()
+    for name in stream:
+        counts[name] += 1
+    return counts
+
+
+def count_sketch(capacity):
+    def build(stream):
+        sketch = SpaceSaving(capacity)
+        add = sketch.add
+        for name in stream:
+            add(name)
+        return sketch
+    return build
+
+
+def main(messages_count, authors_count, top_n):
+    rng = random.Random(SEED)
+    stream = generate(messages_count, authors_count, rng)
+
+    exact, exact_time, exact_peak = measure(count_exact, stream)
+    exact_top = exact.most_common(top_n)
+    exact_names = {name for name, _ in exact_top}
+
+    print(f"Сообщений: {len(stream)}, разных авторов: {len(exact)}, top_n: {top_n}")
+    print(f"{'вариант':<22} {'время, с':>9} {'пик памяти, МБ':>15} {'топ найден':>11} "
+          f"{'макс. ошибка':>13} {'граница N/k':>12} {'гарантия':>9}")
+    print(f"{'Counter (точно)':<22} {exact_time:>9.2f} {exact_peak / 2 ** 20:>15.1f} {'100%':>11} "
+          f"{0:>13} {'-':>12} {'-':>9}")
+
+    for capacity in CAPACITIES:
+        sketch, sketch_time, sketch_peak = measure(count_sketch(capacity), stream)
+        top = sketch.top(top_n)
+        recall = len(exact_names & {name for name, _, _ in top}) / max(1, len(exact_names))
+        max_error = max((count - exact[name] for name, count, _ in top), default=0)
+        bounds_ok = all(count - error <= exact[name] <= count for name, count, error in sketch.top())
+        print(f"{f'SpaceSaving k={capacity}':<22} {sketch_time:>9.2f} {sketch_peak / 2 ** 20:>15.1f} "
+              f"{recall:>10.0%} {max_error:>13} {sketch.error_bound():>12.0f} {str(bounds_ok):>9}")
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(args[0] if args else DEFAULT_MESSAGES,
+         args[1] if len(args) > 1 else DEFAULT_AUTHORS,
+         args[2] if len(args) > 2 else DEFAULT_TOP_N)
@@ -0,0 +1,84 @@
+"""
+Бенчмарк поиска ключевых слов: KeywordMatcher против исходной проверки каждого слова.
+
+Запуск из корня проекта:
+    python -m benchmarks.keyword_benchmark [сообщений] [ключевых слов]
+
+Генерируется синтетический чат (по умолчанию 1 000 000 сообщений) и набор ключевых слов
+(по умолчанию 50), часть из которых пересекается друг с другом. Замеряется время исходной
+проверки any(kw.lower() in text.lower()), KeywordMatcher.matches и KeywordMatcher.find,
+а также совпадение результатов: найденные слова сверяются с перебором.
+"""
+import random
+import sys
+import time
+
+from data_analytic.filter import KeywordMatcher
+
+DEFAULT_MESSAGES = 1_000_000
+DEFAULT_KEYWORDS = 50
+SEED = 42
+
+
+def generate(messages_count, keywords_count, rng):
+    """Генерирует тексты сообщений и ключевые слова (часть слов — префиксы/части других)."""
+    alphabet = "abcdefghijklmnopqrstuvwxyzабвгдежзиклмнопрст"
+    vocab = ["".join(rng.choice(alphabet) for _ in range(rng.randint(2, 9))) for _ in range(20000)]
+
+    keywords = []
+    while len(keywords) < keywords_count:
+        word = rng.choice(vocab)
+        if rng.random() < 0.2 and len(word) > 3:
+            word = word[:rng.randint(2, len(word) - 1)]
+        if rng.random() < 0.3:
+            word = word.upper()
+        keywords.append(word)
+
+    texts = []
+    for _ in range(messages_count):
+        words = [rng.choice(vocab) for _ in range(rng.randint(1, 12))]
+        if rng.random() < 0.5:
+            words = [w.capitalize() for w in words]
+        texts.append(" ".join(words))
+    return texts, keywords
+
+
+def measure(func, texts):
+    start = time.perf_counter()
+    result = [func(text) for text in texts]
+    return result, time.perf_counter() - start
+
+
+def main(messages_count, keywords_count):
+    rng = random.Random(SEED)
+    texts, keywords = generate(messages_count, keywords_count, rng)
+    matcher = KeywordMatcher(keywords)
+
+    def baseline(text):
+        return any(kw.lower() in text.lower() for kw in keywords)
+
+    def baseline_find(text):
+        lowered = text.lower()
+        return [kw for kw in matcher.keywords if kw.lower() in lowered]
+
+    reference, reference_time = measure(baseline, texts)
+    matched, matches_time = measure(matcher.matches, texts)
+    found, find_time = measure(matcher.find, texts)
+
+    sample = range(0, len(texts), max(1, len(texts) // 100_000))
+    find_ok = all(found[i] == baseline_find(texts[i]) for i in sample)
+
+    print(f"Сообщений: {len(texts)}, ключевых слов: {len(keywords)}, "
+          f"совпавших сообщений: {sum(reference)}")
+    print(f"{'вариант':<28} {'время, с':>9} {'ускорение':>10}")
+    print(f"{'any(kw in text.lower())':<28} {reference_time:>9.2f} {'1.0x':>10}")
+    print(f"{'KeywordMatcher.matches':<28} {matches_time:>9.2f} {reference_time / matches_time:>9.1f}x")
+    print(f"{'KeywordMatcher.find':<28} {find_time:>9.2f} {reference_time / find_time:>9.1f}x")
+    print(f"matches совпадает с исходной проверкой: {matched == reference}")
+    print(f"find совпадает с перебором (выборка {len(sample)}): {find_ok}")
+    print(f"find согласован с matches: {[bool(f) for f in found] == matched}")
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(args[0] if args else DEFAULT_MESSAGES, args[1] if len(args) > 1 else DEFAULT_KEYWORDS)
@@ -0,0 +1,147 @@
+"""
+Бенчмарк холодного старта: время импорта веб-процесса и воркера (python -X importtime).
+
+Запуск из корня проекта (в CI — без флагов):
+    python -m benchmarks.startup_benchmark [--runs N] [--record] [--update-baseline]
+
+Для каждой цели из startup_budget.json модуль импортируется в отдельном процессе с -X importtime
+(N раз, берётся медиана). Проверяется бюджет времени и то, что в граф импорта не попали
+запрещённые для этой цели модули (например, selenium в веб-процессе).
+
+Изменение от коммита к коммиту отслеживается по базовой линии startup_baseline.json, которая хранится
+в git: число импортируемых модулей не зависит от машины и сравнивается с допуском MODULES_TOLERANCE,
+время показывается рядом для справки (абсолютные миллисекунды на разных машинах несравнимы).
+--update-baseline перезаписывает базовую линию текущим замером — это делается в том же коммите,
+который осознанно меняет граф импорта. С --record замер дописывается в startup_history.jsonl —
+подробную историю для машины, на которой делаются замеры (в git не хранится, .gitignore).
+Код возврата 1, если бюджет превышен, найден запрещённый модуль или модулей стало больше допуска.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCHMARK_DIR)
+BUDGET_FILE = os.path.join(BENCHMARK_DIR, "startup_budget.json")
+HISTORY_FILE = os.path.join(BENCHMARK_DIR, "startup_history.jsonl")
+BASELINE_FILE = os.path.join(BENCHMARK_DIR, "startup_baseline.json")
+MODULES_TOLERANCE = 0.05  # Допустимый рост числа импортируемых модулей относительно базовой линии
+DEFAULT_RUNS = 5
+TOP_N = 8
+
+
+def measure_import(module):
+    """
+    Импортирует модуль в новом процессе с -X importtime.
+
+    Returns:
+        tuple: (общее время импорта в мс, {модуль: собственное время в мс})
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_DIR, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Импорт {module} завершился ошибкой:\n{result.stderr[-2000:]}")
+
+    self_times = {}
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name.rstrip()
+        self_times[name.strip()] = int(self_us) / 1000
+        # Модули верхнего уровня (без отступа) складываются в общее время
+        if not name[1:].startswith(" "):
+            total_us += int(cumulative_us)
+    return total_us / 1000, self_times
+
+
+def check_target(name, target, runs):
+    totals = []
+    self_times = {}
+    for _ in range(runs):
+        total_ms, self_times = measure_import(target["module"])
+        totals.append(total_ms)
+
+    median_ms = statistics.median(totals)
+    forbidden = [
+        prefix for prefix in target.get("forbidden", [])
+        if any(module == prefix or module.startswith(prefix + ".") for module in self_times)
+    ]
+    heaviest = sorted(self_times.items(), key=lambda item: -item[1])[:TOP_N]
+
+    ok = median_ms <= target["budget_ms"] and not forbidden
+    print(f"{'✅' if ok else '❌'} {name} (import {target['module']}): {median_ms:.0f} мс "
+          f"из {target['budget_ms']} мс, модулей: {len(self_times)}")
+    print("   самые тяжёлые: " + ", ".join(f"{module} {ms:.0f} мс" for module, ms in heaviest))
+    if forbidden:
+        print("   запрещённые модули: " + ", ".join(forbidden))
+
+    return ok, {"median_ms": round(median_ms, 1), "modules": len(self_times), "forbidden": forbidden}
+
+
+def compare_with_baseline(name, result, baseline):
+    """Сравнивает замер цели с базовой линией; False, если модулей стало больше допуска."""
+    base = baseline.get("results", {}).get(name)
+    if base is None:
+        print(f"   базовой линии для {name} нет")
+        return True
+
+    limit = int(base["modules"] * (1 + MODULES_TOLERANCE))
+    ok = result["modules"] <= limit
+    print(f"   {'' if ok else '❌ '}базовая линия ({baseline.get('revision')}): модулей {base['modules']} "
+          f"({result['modules'] - base['modules']:+d}, допустимо до {limit}), "
+          f"время {base['median_ms']:.0f} мс ({result['median_ms'] - base['median_ms']:+.0f} мс)")
+    return ok
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main(argv):
+    runs = int(argv[argv.index("--runs") + 1]) if "--runs" in argv else DEFAULT_RUNS
+    with open(BUDGET_FILE, "r", encoding="utf-8") as f:
+        budget = json.load(f)
+
+    baseline = None
+    if os.path.exists(BASELINE_FILE) and "--update-baseline" not in argv:
+        with open(BASELINE_FILE, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    results = {}
+    all_ok = True
+    for name, target in budget.items():
+        ok, results[name] = check_target(name, target, runs)
+        if baseline is not None:
+            ok = compare_with_baseline(name, results[name], baseline) and ok
+        all_ok = all_ok and ok
+
+    record = {"date": time.strftime("%Y-%m-%dT%H:%M:%S"), "revision": git_revision(), "results": results}
+    if "--update-baseline" in argv:
+        baseline = {**record, "results": {name: {"median_ms": result["median_ms"], "modules": result["modules"]}
+                                          for name, result in results.items()}}
+        with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"📌 Базовая линия записана в {BASELINE_FILE}")
+
+    if "--record" in argv:
+        with open(HISTORY_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        print(f"📝 Результат записан в {HISTORY_FILE}")
+
+    return 0 if all_ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
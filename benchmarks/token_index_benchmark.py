@@ -0,0 +1,89 @@
+"""
+Бенчмарк поиска по ключевым словам: индекс токенов против полного просмотра чата.
+
+Запуск из корня проекта:
+    python -m benchmarks.token_index_benchmark [сообщений]
+
+Генерируется синтетический чат (по умолчанию 1 000 000 сообщений), сохраняется в колоночное
+хранилище во временном каталоге, для него строится индекс токенов. Затем метрики keywords_search,
+keyword_counts и chat_activity считаются для нескольких наборов ключевых слов двумя способами —
+проходом по сообщениям и по индексу — и сравниваются время и результаты. Отдельно показано время
+по индексу без keywords_search: эта метрика возвращает сами сообщения, и её время определяется
+количеством найденных сообщений, а не поиском.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from data_analytic.engine import run_metrics
+from data_processors.chat_store import open_chat_store, write_chat_store
+from data_processors.token_index import build_token_index, open_token_index
+
+DEFAULT_MESSAGES = 1_000_000
+METRICS = ["keywords_search", "keyword_counts", "chat_activity"]
+COUNT_METRICS = ["keyword_counts", "chat_activity"]
+QUERIES = [["kekw"], ["pog", "lul", "omegalul"], ["gg"], ["ааа", "clip", "5head", "monkas"]]
+SEED = 42
+
+
+def generate_chat(messages_count, rng):
+    """Генерирует сообщения чата с эмоутами и случайными словами."""
+    alphabet = "abcdefghijklmnopqrstuvwxyzабвгдежзиклмнопрст"
+    vocab = ["".join(rng.choice(alphabet) for _ in range(rng.randint(2, 9))) for _ in range(50000)]
+    emotes = ["KEKW", "Pog", "LUL", "OMEGALUL", "monkaS", "5Head", "Clap", "PepeHands"]
+
+    for i in range(messages_count):
+        words = [rng.choice(emotes) if rng.random() < 0.15 else rng.choice(vocab) for _ in range(rng.randint(1, 10))]
+        yield {
+            "_id": f"id-{i}",
+            "content_offset_seconds": i * 4 * 3600 // messages_count,
+            "commenter": {"_id": str(i % 5000), "name": f"user{i % 5000}", "display_name": f"User{i % 5000}"},
+            "message": {"body": " ".join(words)},
+        }
+
+
+def main(messages_count):
+    rng = random.Random(SEED)
+    with tempfile.TemporaryDirectory() as directory:
+        store_path = os.path.join(directory, "bench.chat")
+        index_path = os.path.join(directory, "bench.idx")
+
+        started = time.perf_counter()
+        write_chat_store(store_path, {"chat": generate_chat(messages_count, rng)})
+        store = open_chat_store(store_path)
+        print(f"Хранилище: {len(store)} сообщений, {time.perf_counter() - started:.1f} с")
+
+        started = time.perf_counter()
+        tokens = build_token_index(store, index_path)
+        print(f"Индекс: {tokens} токенов, {os.path.getsize(index_path) / 2 ** 20:.1f} МБ, "
+              f"{time.perf_counter() - started:.1f} с")
+
+        index = open_token_index(index_path, store.content_sha256)
+        print(f"{'ключевые слова':<34} {'просмотр, с':>12} {'индекс, мс':>11} {'без сообщ., мс':>15} {'совпадение':>11}")
+        for keywords in QUERIES:
+            params = {"keywords": keywords}
+
+            started = time.perf_counter()
+            scanned = run_metrics({"chat": store, "categories": []}, METRICS, params)
+            scan_time = time.perf_counter() - started
+
+            started = time.perf_counter()
+            indexed = run_metrics({"chat": store, "categories": [], "token_index": index}, METRICS, params)
+            index_time = time.perf_counter() - started
+
+            started = time.perf_counter()
+            run_metrics({"chat": store, "categories": [], "token_index": index}, COUNT_METRICS, params)
+            count_time = time.perf_counter() - started
+
+            same = all(indexed[metric] == scanned[metric] for metric in indexed)
+            print(f"{', '.join(keywords):<34} {scan_time:>12.2f} {index_time * 1000:>11.1f} "
+                  f"{count_time * 1000:>15.1f} {str(same):>11}")
+
+        index.close()
+        store.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_MESSAGES)
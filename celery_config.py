@@ -1,10 +1,38 @@
+import os
 from celery import Celery
+from kombu import Queue
+from kombu.exceptions import ChannelError
 from config import Config
 
-def make_celery():
-    """Функция для создания Celery."""
+# Задачи разделены по очередям по типу нагрузки; у каждой очереди свой воркер со своим пулом
+# (см. docker-compose.yml), поэтому долгий анализ не занимает слоты скачивания чата и наоборот:
+#   ingest-io     — сбор VOD: HTTP-запросы и скачивание чата (потоки, много слотов)
+#   browser       — парсинг категорий в headless Chrome (потоки, по числу браузеров)
+#   analytics-cpu — аналитика чата (prefork, по числу ядер)
+#   maintenance   — очистка хранилища (один слот)
+INGEST_QUEUE = "ingest-io"
+BROWSER_QUEUE = "browser"
+ANALYTICS_QUEUE = "analytics-cpu"
+MAINTENANCE_QUEUE = "maintenance"
+TASK_QUEUES = (INGEST_QUEUE, BROWSER_QUEUE, ANALYTICS_QUEUE, MAINTENANCE_QUEUE)
+
+TASK_ROUTES = {
+    "tasks.save_stream_task": {"queue": INGEST_QUEUE},
+    "tasks.scrape_categories_task": {"queue": BROWSER_QUEUE},
+    "tasks.run_analysis_task": {"queue": ANALYTICS_QUEUE},
+    "tasks.analyze_shard_task": {"queue": ANALYTICS_QUEUE},
+    "tasks.merge_analysis_task": {"queue": ANALYTICS_QUEUE},
+    "tasks.analysis_failed_task": {"queue": ANALYTICS_QUEUE},
+    "tasks.cleanup_task": {"queue": MAINTENANCE_QUEUE},
+}
+
+BROWSER_TASK_TIMEOUT = float(os.getenv("BROWSER_TASK_TIMEOUT", 300))  # Ожидание парсинга категорий сборщиком, с
+
+
+def make_celery(name='tasks'):
+    """Функция для создания Celery (одно приложение для веб-процесса, воркеров и beat)."""
     celery = Celery(
-        'dip',  # Название приложения
+        name,  # Название приложения
         backend=Config.CELERY_RESULT_BACKEND,
         broker=Config.CELERY_BROKER_URL
     )
@@ -12,6 +40,34 @@ def make_celery():
     celery.conf.update(
         accept_content=Config.CELERY_ACCEPT_CONTENT,
         task_serializer=Config.CELERY_TASK_SERIALIZER,
-        result_serializer=Config.CELERY_RESULT_SERIALIZER
+        result_serializer=Config.CELERY_RESULT_SERIALIZER,
+        task_queues=[Queue(queue) for queue in TASK_QUEUES],
+        task_default_queue=INGEST_QUEUE,
+        task_routes=TASK_ROUTES,
+        # Задачи долгие: воркер берёт следующую, только освободив слот, а не копит их у себя
+        worker_prefetch_multiplier=1,
+        task_track_started=True,
     )
-    return celery
\ No newline at end of file
+    return celery
+
+
+def get_queue_depths(celery, queues=TASK_QUEUES):
+    """
+    Число сообщений, ожидающих в каждой очереди брокера.
+
+    Returns:
+        dict: {очередь: число сообщений}.
+    """
+    depths = {}
+    with celery.connection_for_read() as connection:
+        for queue in queues:
+            # Каждой очереди свой канал: ошибка passive-объявления закрывает канал (AMQP)
+            channel = connection.channel()
+            try:
+                depths[queue] = channel.queue_declare(queue=queue, passive=True).message_count
+            except ChannelError:
+                # Очередь ещё не объявлена (в Redis пустой очереди нет как ключа) — в ней ничего не ждёт
+                depths[queue] = 0
+            finally:
+                channel.close()
+    return depths
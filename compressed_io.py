@@ -0,0 +1,94 @@
+import gzip
+import io
+import os
+import tempfile
+from contextlib import contextmanager
+
+# Артефакты VOD (JSON трансляций, NDJSON чатов) хранятся сжатыми gzip: текст чата сжимается в разы,
+# а сжатый JSON можно отдавать клиенту как есть с Content-Encoding: gzip
+GZIP_EXTENSION = ".gz"
+COMPRESS_LEVEL = int(os.getenv("ARTIFACT_COMPRESS_LEVEL", 6))
+
+
+def is_compressed(path):
+    return path.endswith(GZIP_EXTENSION)
+
+
+def find_artifact(path):
+    """
+    Возвращает путь к сжатой версии файла, если она есть, иначе к несжатой (файлы старого формата).
+
+    Args:
+        path (str): Путь без расширения .gz.
+
+    Returns:
+        str | None: Существующий путь или None.
+    """
+    for candidate in (path + GZIP_EXTENSION, path):
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def open_text(path):
+    """Открывает файл на чтение как текст UTF-8, потоково распаковывая .gz."""
+    if is_compressed(path):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+@contextmanager
+def durable_writer(path, compress, text=True, name=""):
+    """
+    Пишет файл path (сжимая gzip при compress) и при выходе из блока сбрасывает его на диск.
+
+    Yields:
+        Файловый объект (текстовый UTF-8 или двоичный).
+    """
+    with open(path, "wb") as raw:
+        stream = raw
+        if compress:
+            # Имя и время в заголовке gzip фиксированы: одинаковые данные дают одинаковые байты
+            stream = gzip.GzipFile(filename=name, mode="wb", fileobj=raw, compresslevel=COMPRESS_LEVEL, mtime=0)
+        out = io.TextIOWrapper(stream, encoding="utf-8") if text else stream
+        yield out
+        out.flush()
+        if stream is not raw:
+            stream.close()  # Дописывает хвост gzip; raw остаётся открытым
+        raw.flush()
+        os.fsync(raw.fileno())
+
+
+@contextmanager
+def atomic_writer(path, text=True):
+    """
+    Пишет файл через временный и атомарно публикует его; в .gz данные сжимаются по мере записи.
+    Имя временного файла уникально, поэтому одновременные записи одного файла не портят друг друга:
+    остаётся целиком один из вариантов.
+
+    Yields:
+        Файловый объект (текстовый UTF-8 или двоичный).
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                    prefix=f"{os.path.basename(path)}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        name = os.path.basename(path)[:-len(GZIP_EXTENSION)] if is_compressed(path) else ""
+        with durable_writer(tmp_path, is_compressed(path), text, name) as out:
+            yield out
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def iter_decompressed(path, chunk_size=64 * 1024):
+    """Отдаёт распакованное содержимое .gz-файла кусками (для клиентов без поддержки gzip)."""
+    with gzip.open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
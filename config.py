@@ -21,6 +21,7 @@ class Config:
     SECRET_KEY = os.getenv("SECRET_KEY")  # Взять секретный ключ из переменных окружения
     CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL')  # Брокер сообщений Celery
     CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND')  # Бэкенд для хранения результатов
+    REDIS_URL = os.getenv('REDIS_URL') or CELERY_RESULT_BACKEND  # Redis для кэшей и блокировок
     CELERY_ACCEPT_CONTENT = ['json']  # Типы контента, которые Celery будет обрабатывать
     CELERY_TASK_SERIALIZER = 'json'  # Формат сериализации задач
     CELERY_RESULT_SERIALIZER = 'json'  # Формат сериализации результатов
\ No newline at end of file
@@ -1,7 +1,103 @@
-from data_analytic.filter import filter_messages_by_keywords
+import numpy as np
+from data_analytic.filter import KeywordMatcher
 from data_processors.stream_compose import get_chat_data
+from data_processors.chat_store import ChatStore
+from data_analytic.buckets import DEFAULT_BUCKET_SECONDS
 
-def analyze_chat_activity(chat_data, keywords=None, use_regex=False, match_case=True):
+def build_activity_histogram(offsets, keyword_offsets=None, bucket_seconds=DEFAULT_BUCKET_SECONDS, dense=False):
+    """
+    Считает количество сообщений в интервалах через np.bincount.
+
+    Args:
+        offsets: Смещения всех сообщений в секундах (массив, memoryview или последовательность).
+        keyword_offsets: Смещения сообщений с ключевыми словами.
+        bucket_seconds (int): Ширина интервала в секундах.
+        dense (bool): Если True, возвращает плотные списки, иначе словари «номер интервала -> количество».
+
+    Returns:
+        dict: Ширина интервала bucket_seconds и счётчики. Словарный формат — messages_by_bucket (только
+        непустые интервалы) и keyword_messages_by_bucket (все интервалы от первого до последнего), номера
+        интервалов в единицах bucket_seconds; для минутных интервалов те же словари дублируются под прежними
+        ключами messages_per_minute и keyword_messages_per_minute. Плотный формат — messages_per_bucket
+        и keyword_messages_per_bucket, где элемент i относится к интервалу first_bucket + i.
+    """
+    first_bucket, counts, keyword_counts = count_activity_buckets(offsets, keyword_offsets, bucket_seconds)
+    return format_activity_histogram(first_bucket, counts, keyword_counts, bucket_seconds, dense)
+
+
+def count_activity_buckets(offsets, keyword_offsets=None, bucket_seconds=DEFAULT_BUCKET_SECONDS):
+    """
+    Считает сообщения по интервалам (np.bincount) начиная с первого непустого интервала.
+
+    Returns:
+        tuple: (first_bucket, counts, keyword_counts) — номер первого интервала и массивы количества
+        всех сообщений и сообщений с ключевыми словами; элемент i относится к интервалу first_bucket + i.
+    """
+    buckets = np.asarray(offsets, dtype=np.int64) // bucket_seconds
+    if buckets.size:
+        first_bucket = int(buckets.min())
+        counts = np.bincount(buckets - first_bucket)
+    else:
+        first_bucket = 0
+        counts = np.zeros(0, dtype=np.int64)
+
+    keyword_buckets = np.asarray(keyword_offsets if keyword_offsets is not None else [], dtype=np.int64) // bucket_seconds
+    keyword_counts = np.bincount(keyword_buckets - first_bucket, minlength=len(counts))
+    return first_bucket, counts, keyword_counts
+
+
+def merge_activity_buckets(parts):
+    """
+    Складывает счётчики интервалов, посчитанные по частям чата (count_activity_buckets).
+
+    Args:
+        parts (iterable): Кортежи (first_bucket, counts, keyword_counts).
+
+    Returns:
+        tuple: (first_bucket, counts, keyword_counts) для всего чата.
+    """
+    parts = [(first, np.asarray(counts, dtype=np.int64), np.asarray(keyword_counts, dtype=np.int64))
+             for first, counts, keyword_counts in parts if len(counts)]
+    if not parts:
+        return 0, np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    first_bucket = min(first for first, _, _ in parts)
+    size = max(first + len(counts) for first, counts, _ in parts) - first_bucket
+    counts = np.zeros(size, dtype=np.int64)
+    keyword_counts = np.zeros(size, dtype=np.int64)
+    for first, part_counts, part_keyword_counts in parts:
+        counts[first - first_bucket:first - first_bucket + len(part_counts)] += part_counts
+        keyword_counts[first - first_bucket:first - first_bucket + len(part_keyword_counts)] += part_keyword_counts
+    return first_bucket, counts, keyword_counts
+
+
+def format_activity_histogram(first_bucket, counts, keyword_counts, bucket_seconds=DEFAULT_BUCKET_SECONDS, dense=False):
+    """Формирует ответ build_activity_histogram из счётчиков интервалов."""
+    counts = np.asarray(counts, dtype=np.int64)
+    keyword_counts = np.asarray(keyword_counts, dtype=np.int64)
+    if dense:
+        return {
+            "bucket_seconds": bucket_seconds,
+            "first_bucket": first_bucket,
+            "messages_per_bucket": counts.tolist(),
+            "keyword_messages_per_bucket": keyword_counts.tolist(),
+        }
+
+    nonzero = np.flatnonzero(counts)
+    result = {
+        "bucket_seconds": bucket_seconds,
+        "messages_by_bucket": dict(zip((nonzero + first_bucket).tolist(), counts[nonzero].tolist())),
+        "keyword_messages_by_bucket": dict(enumerate(keyword_counts.tolist(), start=first_bucket)),
+    }
+    if bucket_seconds == 60:
+        # Прежние ключи верны только для минутных интервалов: для 10, 30 и 300 с их нет
+        result["messages_per_minute"] = result["messages_by_bucket"]
+        result["keyword_messages_per_minute"] = result["keyword_messages_by_bucket"]
+    return result
+
+
+def analyze_chat_activity(chat_data, keywords=None, use_regex=False, match_case=True,
+                          bucket_seconds=DEFAULT_BUCKET_SECONDS, dense=False):
     """
     Анализирует активность чата и возвращает данные для графика.
 
@@ -10,51 +106,41 @@ def analyze_chat_activity(chat_data, keywords=None, use_regex=False, match_case=
         keywords (list, optional): Список ключевых слов или regex-выражений.
         use_regex (bool): Если True, искать через regex.
         match_case (bool): Учитывать ли регистр.
+        bucket_seconds (int): Ширина интервала графика в секундах (10, 30, 60 или 300).
+        dense (bool): Вернуть плотные списки вместо словарей.
 
     Returns:
         dict: Данные для построения графика.
     """
-    messages_per_minute = {}
-    keyword_messages_per_minute = {} if keywords else {}  # Если нет ключевых слов, то не считаем
-    category_intervals = []
+    chat = chat_data["chat"]
 
-    # Извлекаем категории из chat_data
-    categories = chat_data.get('categories', [])
-    for cat in categories:
-        start_time = (cat["end_time"] - cat["duration"]) // 60
-        end_time = cat["end_time"] // 60
-        category_intervals.append((start_time, end_time, cat["category"]))
+    if isinstance(chat, ChatStore):
+        # Колоночное хранилище: столбец смещений читается без копирования
+        offsets = np.asarray(chat.offsets)
+        bodies = chat.iter_bodies()
+    else:
+        offsets = np.fromiter((msg["content_offset_seconds"] for msg in chat), dtype=np.int64)
+        bodies = (msg["message"].get("body", "") for msg in chat)
 
-    # Фильтруем сообщения по ключевым словам (если они есть)
+    # Сообщения с ключевыми словами (если они есть)
+    keyword_offsets = None
     if keywords:
-        filtered_chat = filter_messages_by_keywords(chat_data["chat"], keywords, use_regex, match_case)
-    else:
-        filtered_chat = chat_data["chat"]
+        matches = KeywordMatcher(keywords, use_regex, match_case).matches
+        hits = np.fromiter((matches(text) for text in bodies), dtype=bool, count=len(offsets))
+        keyword_offsets = offsets[hits]
 
-    # Подсчет всех сообщений в минуту
-    for msg in chat_data["chat"]:
-        minute = msg["content_offset_seconds"] // 60
-        messages_per_minute[minute] = messages_per_minute.get(minute, 0) + 1
+    result = build_activity_histogram(offsets, keyword_offsets, bucket_seconds, dense)
+    result["category_intervals"] = build_category_intervals(chat_data.get('categories', []), bucket_seconds)
+    return result
 
-    # Подсчет сообщений по ключевым словам (если они есть)
-    if keywords:
-        for msg in filtered_chat:
-            minute = msg["content_offset_seconds"] // 60
-            keyword_messages_per_minute[minute] = keyword_messages_per_minute.get(minute, 0) + 1
-
-    # Заполняем нулями минуты, где нет сообщений по ключевым словам (если нужны такие данные)
-    min_time = min(messages_per_minute.keys())
-    max_time = max(messages_per_minute.keys())
-
-    for minute in range(min_time, max_time + 1):
-        if minute not in keyword_messages_per_minute:
-            keyword_messages_per_minute[minute] = 0
-
-    return {
-        "messages_per_minute": messages_per_minute,
-        "keyword_messages_per_minute": keyword_messages_per_minute,
-        "category_intervals": category_intervals,
-    }
+def build_category_intervals(categories, bucket_seconds=DEFAULT_BUCKET_SECONDS):
+    """Переводит категории трансляции в интервалы (начальный интервал, конечный интервал, категория)."""
+    category_intervals = []
+    for cat in categories or []:
+        start_time = (cat["end_time"] - cat["duration"]) // bucket_seconds
+        end_time = cat["end_time"] // bucket_seconds
+        category_intervals.append((start_time, end_time, cat["category"]))
+    return category_intervals
 
 if __name__ == "__main__":
     stream_id = "2425707027"  # ID нужной трансляции
@@ -69,11 +155,11 @@ if __name__ == "__main__":
     # Отображение результатов
     print("📊 Результаты анализа активности чата:")
     print("💬 Сообщения по минутам:")
-    for minute, count in result["messages_per_minute"].items():
+    for minute, count in result["messages_by_bucket"].items():
         print(f"  Минутa {minute}: {count} сообщений")
 
     print("\n🔑 Сообщения по ключевым словам:")
-    for minute, count in result["keyword_messages_per_minute"].items():
+    for minute, count in result["keyword_messages_by_bucket"].items():
         print(f"  Минутa {minute}: {count} сообщений с ключевыми словами")
 
     print("\n📅 Интервалы категорий:")
@@ -0,0 +1,20 @@
+# Ширина интервалов графика активности. Модуль без тяжёлых зависимостей: его импортирует веб-процесс
+# для проверки параметров запроса.
+
+ACTIVITY_BUCKET_SECONDS = (10, 30, 60, 300)  # Допустимая ширина интервала графика активности, с
+DEFAULT_BUCKET_SECONDS = 60
+
+
+def parse_bucket_seconds(value):
+    """
+    Проверяет ширину интервала графика активности.
+
+    Raises:
+        ValueError: Если значение не входит в ACTIVITY_BUCKET_SECONDS.
+    """
+    if value in (None, ""):
+        return DEFAULT_BUCKET_SECONDS
+    bucket_seconds = int(value)
+    if bucket_seconds not in ACTIVITY_BUCKET_SECONDS:
+        raise ValueError(f"Ширина интервала должна быть одной из {ACTIVITY_BUCKET_SECONDS}")
+    return bucket_seconds
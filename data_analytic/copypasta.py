@@ -1,14 +1,17 @@
-import json
 import re
-from collections import defaultdict
+import math
+from collections import Counter, defaultdict
 from difflib import SequenceMatcher
 import os
 from pathlib import Path
 from dotenv import load_dotenv
+from data_processors.chat_store import ChatStore
+from data_processors.stream_compose import get_chat_data
 
 # === ПАРАМЕТРЫ ===
 PASTA_MIN_LENGTH = 10  # Минимальная длина пасты
 SIMILARITY_THRESHOLD = 0.8  # Порог схожести для группировки
+BRUTE_FORCE_LIMIT = 300  # До стольких паст сравниваем все пары без индекса
 
 # Загрузка переменных среды
 # Загрузим .env.local для локальной разработки
@@ -25,15 +28,14 @@ if not PROJECT_ROOT:
 
 # Функция загрузки чата по stream_id
 def load_chat_data(stream_id):
-    """Функция загрузки чата по stream_id"""
-    # Строим абсолютный путь к файлу
-    file_path = Path(PROJECT_ROOT) / "stream_data" / f"{stream_id}.json"
+    """Функция загрузки чата по stream_id (колоночное хранилище, открытое через mmap)"""
+    chat_data = get_chat_data(stream_id)
 
-    if not file_path.exists():
+    if not chat_data:
+        file_path = Path(PROJECT_ROOT) / "stream_data" / f"{stream_id}.json.gz"
         raise FileNotFoundError(f"Файл {file_path} не найден.")
 
-    with open(file_path, "r", encoding="utf-8") as file:
-        return json.load(file)["chat"]
+    return chat_data["chat"]
 
 # Функция нормализации текста
 def normalize_text(text):
@@ -42,48 +44,78 @@ def normalize_text(text):
 
 # Функция для извлечения паст из чата
 def extract_pastas(chat_data):
-    """Извлекает повторяющиеся пасты из чата"""
-    pasta_counter = defaultdict(list)
-
-    for msg in chat_data:
-        text = msg["message"]["body"]
-        msg_id = msg["_id"]
-
-        if len(text) < PASTA_MIN_LENGTH:
-            continue  # Пропускаем короткие фразы
-
-        pasta_counter[text].append(msg_id)
-
-    return {text: ids for text, ids in pasta_counter.items() if len(ids) > 1}
+    """
+    Извлекает повторяющиеся пасты из чата.
+
+    Returns:
+        dict: Текст пасты -> число её повторов (только пасты, встретившиеся больше одного раза).
+    """
+    if isinstance(chat_data, ChatStore):
+        # Колоночное хранилище: тексты читаются из столбца без создания словарей сообщений
+        bodies = chat_data.iter_bodies()
+    else:
+        bodies = (msg["message"]["body"] for msg in chat_data)
+
+    # Короткие фразы пропускаем
+    pasta_counter = Counter(text for text in bodies if len(text) >= PASTA_MIN_LENGTH)
+    return {text: count for text, count in pasta_counter.items() if count > 1}
 
 # Функция для группировки паст по схожести
 def group_similar_pastas(pasta_data):
-    """Группирует пасты по схожести"""
+    """
+    Группирует пасты по схожести.
+
+    Args:
+        pasta_data (dict): Текст пасты -> число её повторов.
+
+    Пасты обходятся по убыванию количества; к базовой пасте присоединяются ещё не сгруппированные пасты,
+    у которых SequenceMatcher.ratio() нормализованных текстов не ниже SIMILARITY_THRESHOLD.
+    Чтобы не сравнивать все пары, кандидаты берутся из индекса биграмм (см. _BigramIndex); индекс
+    отбрасывает только пары, у которых ratio гарантированно ниже порога, поэтому результат совпадает
+    с попарным сравнением. При небольшом числе паст (или пороге не выше 2/3) сравниваются все пары.
+    """
     grouped_pastas = []
     seen = set()
 
-    for base_pasta, message_ids in sorted(pasta_data.items(), key=lambda x: -len(x[1])):  # Сортируем по убыванию
+    texts = list(pasta_data)
+    normalized = [normalize_text(text) for text in texts]
+    position = {text: i for i, text in enumerate(texts)}
+
+    index = _BigramIndex(normalized) if len(texts) > BRUTE_FORCE_LIMIT and _BigramIndex.applicable() else None
+
+    matcher = SequenceMatcher(None)
+
+    for base_pasta, count in sorted(pasta_data.items(), key=lambda x: -x[1]):  # Сортируем по убыванию
         if base_pasta in seen:
             continue
 
-        base_normalized = normalize_text(base_pasta)
+        base_index = position[base_pasta]
+        base_normalized = normalized[base_index]
         group = {
             "base_pasta": base_pasta,
-            "count": len(message_ids),
+            "count": count,
             "variants": []
         }
 
-        for other_pasta, other_ids in pasta_data.items():
-            if other_pasta in seen or other_pasta == base_pasta:
+        candidates = index.candidates(base_index) if index else range(len(texts))
+        for other_index in candidates:
+            other_pasta = texts[other_index]
+            if other_pasta in seen or other_index == base_index:
+                continue
+            if index and not index.is_similar(base_index, other_index):
                 continue
 
-            other_normalized = normalize_text(other_pasta)
-            similarity = SequenceMatcher(None, base_normalized, other_normalized).ratio()
+            # Верхняя оценка ratio по длинам — отсекает пару без построения SequenceMatcher
+            total_length = len(base_normalized) + len(normalized[other_index])
+            if total_length and 2 * min(len(base_normalized), len(normalized[other_index])) < SIMILARITY_THRESHOLD * total_length:
+                continue
 
-            if similarity >= SIMILARITY_THRESHOLD:
+            matcher.set_seqs(base_normalized, normalized[other_index])
+            # quick_ratio — верхняя оценка ratio, отсекает пары без поиска совпадающих блоков
+            if matcher.quick_ratio() >= SIMILARITY_THRESHOLD and matcher.ratio() >= SIMILARITY_THRESHOLD:
                 group["variants"].append({
                     "text": other_pasta,
-                    "count": len(other_ids)
+                    "count": pasta_data[other_pasta]
                 })
                 seen.add(other_pasta)
 
@@ -92,6 +124,83 @@ def group_similar_pastas(pasta_data):
 
     return grouped_pastas
 
+def _bigram_tokens(text):
+    """Биграммы текста с номером вхождения: пересечение таких множеств — пересечение мультимножеств биграмм."""
+    occurrences = defaultdict(int)
+    tokens = []
+    for i in range(len(text) - 1):
+        bigram = text[i:i + 2]
+        tokens.append((bigram, occurrences[bigram]))
+        occurrences[bigram] += 1
+    return tokens
+
+def _min_overlap(total_length):
+    """
+    Сколько общих биграмм (с повторами) есть у любой пары с ratio >= SIMILARITY_THRESHOLD.
+
+    ratio = 2M / T, где M — сумма длин k совпадающих блоков SequenceMatcher, T — сумма длин строк.
+    Соседние блоки разделены хотя бы одним несовпавшим символом, поэтому k - 1 <= T - 2M, а блок длины L
+    даёт L - 1 общих биграмм: общих биграмм не меньше M - k >= 3M - T - 1 >= (1.5t - 1)T - 1.
+    """
+    return math.ceil((1.5 * SIMILARITY_THRESHOLD - 1) * total_length - 1 - 1e-9)
+
+class _BigramIndex:
+    """
+    Индекс биграмм с префиксной фильтрацией, не теряющий пар с ratio >= SIMILARITY_THRESHOLD.
+
+    По длинам у пары с ratio >= t вторая строка не короче n * t / (2 - t), значит у строки длины n с любой
+    подходящей парой не меньше o = _min_overlap(n + n * t / (2 - t)) общих биграмм. Биграммы каждой пасты
+    упорядочиваются от редких к частым, в индекс попадает префикс длины |S| - o + 1: пары с o общими
+    биграммами обязательно пересекаются по префиксам. Пасты, для которых o < 1 (очень короткие),
+    остаются кандидатами для всех.
+    """
+
+    @staticmethod
+    def applicable():
+        """Оценка общих биграмм положительна только при пороге выше 2/3."""
+        return SIMILARITY_THRESHOLD > 2 / 3
+
+    def __init__(self, normalized):
+        self.token_sets = []
+        ordered_tokens = []
+        frequency = defaultdict(int)
+        for text in normalized:
+            tokens = _bigram_tokens(text)
+            ordered_tokens.append(tokens)
+            self.token_sets.append(set(tokens))
+            for token in tokens:
+                frequency[token] += 1
+
+        self.lengths = [len(text) for text in normalized]
+        self.prefixes = []
+        self.postings = defaultdict(list)
+        self.unfiltered = []  # Пасты без гарантированных общих биграмм — кандидаты для всех
+        shortest_ratio = SIMILARITY_THRESHOLD / (2 - SIMILARITY_THRESHOLD)
+        for i, tokens in enumerate(ordered_tokens):
+            overlap = _min_overlap(self.lengths[i] * (1 + shortest_ratio))
+            if overlap < 1:
+                self.prefixes.append(None)
+                self.unfiltered.append(i)
+                continue
+            tokens.sort(key=lambda token: (frequency[token], token))
+            prefix = tokens[:len(tokens) - overlap + 1]
+            self.prefixes.append(prefix)
+            for token in prefix:
+                self.postings[token].append(i)
+
+    def candidates(self, i):
+        """Индексы паст-кандидатов в исходном порядке паст."""
+        if self.prefixes[i] is None:
+            return range(len(self.prefixes))
+        candidates = set(self.unfiltered)
+        for token in self.prefixes[i]:
+            candidates.update(self.postings[token])
+        return sorted(candidates)
+
+    def is_similar(self, i, j):
+        """Проверяет, что общих биграмм не меньше, чем у любой пары с ratio >= SIMILARITY_THRESHOLD."""
+        return len(self.token_sets[i] & self.token_sets[j]) >= _min_overlap(self.lengths[i] + self.lengths[j])
+
 # Основная функция для получения паст
 def get_pastas_for_stream(stream_id, top_n=None):
     """Основная функция: загружает чат, анализирует пасты и возвращает их отсортированными."""
@@ -1,3 +1,6 @@
+from data_processors.chat_store import ChatStore
+
+
 def analyze_emotes(chat_data, top_n=None, include_platform=True):
     """
     Считает общее количество использований каждого эмоута за стрим с опцией добавления платформы.
@@ -10,31 +13,36 @@ def analyze_emotes(chat_data, top_n=None, include_platform=True):
     Returns:
         list[dict]: Список словарей с данными по эмоутам: имя, количество, ссылка (и платформа при include_platform=True).
     """
-    emotes_data = chat_data.get("emotes", {})
     messages = chat_data.get("chat", [])
 
     # Собираем имя -> {url, платформа}
-    emote_info = {}
-    for platform, emotes in emotes_data.items():
-        for e in emotes:
-            emote_info[e["name"]] = {
-                "url": e["url"],
-                "platform": platform
-            }
+    emote_info = build_emote_info(chat_data.get("emotes", {}))
 
     emote_counts = {}
 
-    for msg in messages:
-        try:
-            text = msg["message"]["body"]
-        except (KeyError, TypeError):
-            continue
-
+    for text in _iter_message_bodies(messages):
         words = text.split()
         for word in words:
             if word in emote_info:
                 emote_counts[word] = emote_counts.get(word, 0) + 1
 
+    return format_emote_counts(emote_counts, emote_info, top_n, include_platform)
+
+
+def build_emote_info(emotes_data):
+    """Собирает словарь имя эмоута -> {url, платформа}."""
+    emote_info = {}
+    for platform, emotes in (emotes_data or {}).items():
+        for e in emotes:
+            emote_info[e["name"]] = {
+                "url": e["url"],
+                "platform": platform
+            }
+    return emote_info
+
+
+def format_emote_counts(emote_counts, emote_info, top_n=None, include_platform=True, errors=None):
+    """Сортирует счётчики эмоутов и формирует результат для ответа (errors — погрешности приближённого подсчёта)."""
     # Сортировка
     sorted_emotes = sorted(emote_counts.items(), key=lambda item: item[1], reverse=True)
 
@@ -51,7 +59,22 @@ def analyze_emotes(chat_data, top_n=None, include_platform=True):
         }
         if include_platform:
             emote_data["platform"] = emote_info[name]["platform"]
+        if errors is not None:
+            emote_data["error"] = errors[name]
 
         result.append(emote_data)
 
     return result
+
+
+def _iter_message_bodies(messages):
+    """Итерирует тексты сообщений; для колоночного хранилища — без создания словарей."""
+    if isinstance(messages, ChatStore):
+        yield from messages.iter_bodies()
+        return
+
+    for msg in messages:
+        try:
+            yield msg["message"]["body"]
+        except (KeyError, TypeError):
+            continue
@@ -0,0 +1,550 @@
+from array import array
+from collections import Counter
+from itertools import islice
+import numpy as np
+from data_processors.chat_store import ChatStore
+from data_analytic.filter import KeywordMatcher
+from data_analytic.emotes import build_emote_info, format_emote_counts
+from data_analytic.analyse import (build_category_intervals, count_activity_buckets, format_activity_histogram,
+                                   merge_activity_buckets)
+from data_analytic.buckets import DEFAULT_BUCKET_SECONDS
+from data_analytic.copypasta import PASTA_MIN_LENGTH, group_similar_pastas
+from data_analytic.heavy_hitters import SpaceSaving, make_heavy_hitters
+
+# Реестр агрегаторов: метрика -> класс. Порядок регистрации задаёт порядок ключей в результате.
+AGGREGATORS = {}
+
+
+def register_aggregator(metric):
+    """Декоратор: регистрирует агрегатор метрики в движке."""
+    def decorator(cls):
+        AGGREGATORS[metric] = cls
+        return cls
+    return decorator
+
+
+class MessageRow:
+    """
+    Текущее сообщение, которое движок передаёт всем агрегаторам.
+
+    Объект переиспользуется между итерациями, поэтому агрегаторы не должны хранить ссылку на него.
+    """
+
+    __slots__ = ("index", "offset", "commenter", "body", "keyword_hit", "keyword_hits", "_chat", "_msg")
+
+    def __init__(self, chat):
+        self._chat = chat
+        self._msg = None
+        self.keyword_hit = False
+        self.keyword_hits = []
+
+    def message_id(self):
+        """_id сообщения (для колоночного хранилища читается только по запросу)."""
+        if self._msg is None:
+            return self._chat.message_id(self.index)
+        return self._msg.get("_id")
+
+    def message(self):
+        """Сообщение в исходном формате (словарь)."""
+        if self._msg is None:
+            return self._chat[self.index]
+        return self._msg
+
+
+def iter_message_rows(chat, rows=None):
+    """
+    Итерирует сообщения чата в виде MessageRow, не создавая словари для колоночного хранилища.
+
+    rows (range, optional) ограничивает проход сообщениями с этими индексами (шард чата).
+    """
+    row = MessageRow(chat)
+    start, stop = (0, None) if rows is None else (rows.start, rows.stop)
+
+    if isinstance(chat, ChatStore):
+        names = chat.commenter_names
+        for index, (offset, commenter_index, body) in enumerate(
+                zip(chat.offsets[start:stop], chat.commenter_index[start:stop], chat.iter_bodies(start, stop)),
+                start=start):
+            row.index = index
+            row.offset = offset
+            row.commenter = names[commenter_index]
+            row.body = body
+            yield row
+        return
+
+    for index, msg in enumerate(islice(chat or [], start, stop), start=start):
+        # Пропускаем элементы, которые не являются сообщениями
+        if not isinstance(msg, dict) or "message" not in msg:
+            continue
+        row.index = index
+        row._msg = msg
+        row.offset = msg.get("content_offset_seconds", 0)
+        row.commenter = (msg.get("commenter") or {}).get("name")
+        row.body = msg["message"].get("body", "") or ""
+        yield row
+
+
+class Aggregator:
+    """
+    Базовый агрегатор метрики.
+
+    Движок вызывает update() для каждого сообщения и result() после прохода по чату.
+    needs_keywords = True означает, что агрегатору нужен признак row.keyword_hit,
+    needs_keyword_hits = True — список совпавших ключевых слов row.keyword_hits.
+    supports_postings = True означает, что метрику можно посчитать по индексу токенов
+    через update_postings(), без прохода по сообщениям; supports_columns = True — по столбцам
+    колоночного хранилища через update_columns().
+
+    Для анализа по шардам агрегатор считает только сообщения из rows и отдаёт состояние через
+    partial() (JSON-совместимое); итоговый агрегатор складывает состояния шардов через merge()
+    в порядке сообщений, и result() даёт тот же ответ, что и один проход по всему чату.
+    """
+
+    needs_keywords = False
+    needs_keyword_hits = False
+    supports_postings = False
+    supports_columns = False
+
+    def __init__(self, chat_data, params, rows=None):
+        self.chat_data = chat_data
+        self.params = params
+        self.rows = rows
+
+    def update(self, row):
+        raise NotImplementedError
+
+    def update_postings(self, postings, hits):
+        """
+        Заполняет состояние по результатам поиска в индексе токенов.
+
+        Args:
+            postings (dict): Ключевое слово -> отсортированные индексы сообщений с ним.
+            hits (numpy.ndarray): Отсортированные индексы сообщений хотя бы с одним ключевым словом.
+        """
+        raise NotImplementedError
+
+    def update_columns(self, chat, rows):
+        """
+        Заполняет состояние по столбцам колоночного хранилища.
+
+        Args:
+            chat (ChatStore): Хранилище чата.
+            rows (range | None): Индексы сообщений шарда (None — весь чат).
+        """
+        raise NotImplementedError
+
+    def result(self):
+        raise NotImplementedError
+
+    def partial(self):
+        """Состояние агрегатора после прохода по шарду."""
+        raise NotImplementedError
+
+    def merge(self, partial):
+        """Добавляет состояние следующего шарда (результат partial())."""
+        raise NotImplementedError
+
+
+@register_aggregator("top_chatters")
+class TopChattersAggregator(Aggregator):
+    """
+    Топ-N самых активных чаттеров.
+
+    С параметром heavy_hitters_capacity считается приближённо в фиксированной памяти (SpaceSaving),
+    и каждая строка топа дополняется погрешностью: (имя, счётчик, погрешность). Для колоночного
+    хранилища считаются индексы авторов из столбца, а имена читаются только для счётчиков в таблице.
+    """
+
+    def __init__(self, chat_data, params, rows=None):
+        super().__init__(chat_data, params, rows)
+        self.user_counts = Counter()
+        self.sketch = make_heavy_hitters(params)
+        if self.sketch is not None:
+            self.update = self.update_sketch
+            self.supports_columns = isinstance(chat_data.get("chat"), ChatStore)
+
+    def update(self, row):
+        if row.commenter:
+            self.user_counts[row.commenter] += 1
+
+    def update_sketch(self, row):
+        if row.commenter:
+            self.sketch.add(row.commenter)
+
+    def update_columns(self, chat, rows):
+        column = chat.commenter_index if rows is None else chat.commenter_index[rows.start:rows.stop]
+        blank = {i for i, (_, name, _) in enumerate(chat.commenters) if not name}
+        add = self.sketch.add
+        for commenter_index in column:
+            if commenter_index not in blank:
+                add(commenter_index)
+
+    def result(self):
+        top_n = self.params.get("top_chatters_count", 10)
+        if self.sketch is None:
+            return self.user_counts.most_common(top_n)
+        if not self.supports_columns:
+            return self.sketch.top(top_n)
+
+        # Индекс автора -> имя; у одного логина может быть несколько индексов (сменилось отображаемое имя)
+        commenters = self.chat_data["chat"].commenters
+        totals = {}
+        for commenter_index, count, error in self.sketch.top():
+            name = commenters[commenter_index][1]
+            total_count, total_error = totals.get(name, (0, 0))
+            totals[name] = (total_count + count, total_error + error)
+        top = sorted(totals.items(), key=lambda item: item[1][0], reverse=True)[:top_n]
+        return [(name, count, error) for name, (count, error) in top]
+
+    def partial(self):
+        if self.sketch is not None:
+            return self.sketch.to_state()
+        return dict(self.user_counts)
+
+    def merge(self, partial):
+        if self.sketch is not None:
+            self.sketch.merge(SpaceSaving.from_state(partial))
+            return
+        # Новые имена добавляются в порядке первого сообщения, как при одном проходе: равные счётчики
+        # в most_common упорядочены так же
+        self.user_counts.update(partial)
+
+
+@register_aggregator("keywords_search")
+class KeywordsSearchAggregator(Aggregator):
+    """
+    Сообщения, содержащие ключевые слова.
+
+    Хранятся индексы сообщений, а сами сообщения читаются из чата только в result(): состояние шарда —
+    список чисел, а не словари сообщений.
+    """
+
+    needs_keywords = True
+    supports_postings = True
+
+    def __init__(self, chat_data, params, rows=None):
+        super().__init__(chat_data, params, rows)
+        self.indices = []
+
+    def update(self, row):
+        if row.keyword_hit:
+            self.indices.append(row.index)
+
+    def update_postings(self, postings, hits):
+        self.indices = hits.tolist()
+
+    def result(self):
+        chat = self.chat_data["chat"]
+        return [chat[index] for index in self.indices]
+
+    def partial(self):
+        return self.indices
+
+    def merge(self, partial):
+        self.indices.extend(partial)
+
+
+@register_aggregator("keyword_counts")
+class KeywordCountsAggregator(Aggregator):
+    """Количество сообщений с каждым ключевым словом."""
+
+    needs_keywords = True
+    needs_keyword_hits = True
+    supports_postings = True
+
+    def __init__(self, chat_data, params, rows=None):
+        super().__init__(chat_data, params, rows)
+        self.keyword_counts = Counter()
+
+    def update(self, row):
+        self.keyword_counts.update(row.keyword_hits)
+
+    def update_postings(self, postings, hits):
+        self.keyword_counts = Counter({kw: len(indices) for kw, indices in postings.items()})
+
+    def result(self):
+        return {kw: self.keyword_counts[kw] for kw in self.params.get("keywords") or []}
+
+    def partial(self):
+        return dict(self.keyword_counts)
+
+    def merge(self, partial):
+        self.keyword_counts.update(partial)
+
+
+@register_aggregator("top_pastes")
+class TopPastesAggregator(Aggregator):
+    """Повторяющиеся пасты, сгруппированные по схожести (в результат попадает число повторов, а не _id)."""
+
+    def __init__(self, chat_data, params, rows=None):
+        super().__init__(chat_data, params, rows)
+        self.pasta_counts = {}
+
+    def update(self, row):
+        body = row.body
+        if len(body) >= PASTA_MIN_LENGTH:
+            self.pasta_counts[body] = self.pasta_counts.get(body, 0) + 1
+
+    def result(self):
+        pastas = {text: count for text, count in self.pasta_counts.items() if count > 1}
+        return group_similar_pastas(pastas)[:self.params.get("top_pastes_count")]
+
+    def partial(self):
+        # Кандидаты передаются все, включая одиночные: повтор может оказаться в другом шарде
+        return self.pasta_counts
+
+    def merge(self, partial):
+        # Тексты добавляются в порядке первого сообщения, как при одном проходе: пасты с равным
+        # числом повторов группируются в том же порядке
+        pasta_counts = self.pasta_counts
+        for text, count in partial.items():
+            pasta_counts[text] = pasta_counts.get(text, 0) + count
+
+
+@register_aggregator("top_emoticons")
+class TopEmoticonsAggregator(Aggregator):
+    """
+    Самые используемые эмоуты.
+
+    С параметром heavy_hitters_capacity считается приближённо (SpaceSaving), у каждого эмоута
+    в ответе появляется поле "error" — погрешность счётчика.
+    """
+
+    def __init__(self, chat_data, params, rows=None):
+        super().__init__(chat_data, params, rows)
+        self.emote_info = build_emote_info(chat_data.get("emotes", {}))
+        self.emote_counts = {}
+        self.sketch = make_heavy_hitters(params)
+        if self.sketch is not None:
+            self.update = self.update_sketch
+
+    def update(self, row):
+        emote_info, emote_counts = self.emote_info, self.emote_counts
+        for word in row.body.split():
+            if word in emote_info:
+                emote_counts[word] = emote_counts.get(word, 0) + 1
+
+    def update_sketch(self, row):
+        emote_info, add = self.emote_info, self.sketch.add
+        for word in row.body.split():
+            if word in emote_info:
+                add(word)
+
+    def result(self):
+        if self.sketch is not None:
+            return format_emote_counts(self.sketch.counts, self.emote_info, self.params.get("emoticons_count"),
+                                       errors=self.sketch.errors)
+        return format_emote_counts(self.emote_counts, self.emote_info, self.params.get("emoticons_count"))
+
+    def partial(self):
+        if self.sketch is not None:
+            return self.sketch.to_state()
+        return self.emote_counts
+
+    def merge(self, partial):
+        if self.sketch is not None:
+            self.sketch.merge(SpaceSaving.from_state(partial))
+            return
+        emote_counts = self.emote_counts
+        for name, count in partial.items():
+            emote_counts[name] = emote_counts.get(name, 0) + count
+
+
+@register_aggregator("chat_activity")
+class ChatActivityAggregator(Aggregator):
+    """Гистограмма активности чата (всего и по ключевым словам) с настраиваемой шириной интервала."""
+
+    needs_keywords = True
+    supports_postings = True
+
+    def __init__(self, chat_data, params, rows=None):
+        super().__init__(chat_data, params, rows)
+        chat = chat_data.get("chat")
+        # Смещения колоночного хранилища берутся целиком из столбца, для списка собираются по ходу
+        self.store_offsets = chat.offsets if isinstance(chat, ChatStore) else None
+        self.offsets = array("q")
+        self.keyword_offsets = array("q")
+        self.merged_buckets = None  # Сумма счётчиков интервалов шардов (merge)
+
+    def update(self, row):
+        if self.store_offsets is None:
+            self.offsets.append(row.offset)
+        if row.keyword_hit:
+            self.keyword_offsets.append(row.offset)
+
+    def update_postings(self, postings, hits):
+        # Индекс строится только для колоночного хранилища, смещения берутся из столбца
+        self.keyword_offsets = np.asarray(self.store_offsets)[hits]
+
+    def _bucket_seconds(self):
+        return self.params.get("activity_bucket_seconds") or DEFAULT_BUCKET_SECONDS
+
+    def _count_buckets(self):
+        if self.store_offsets is None:
+            offsets = self.offsets
+        elif self.rows is None:
+            offsets = self.store_offsets
+        else:
+            offsets = self.store_offsets[self.rows.start:self.rows.stop]
+        return count_activity_buckets(offsets, self.keyword_offsets, self._bucket_seconds())
+
+    def result(self):
+        bucket_seconds = self._bucket_seconds()
+        buckets = self._count_buckets() if self.merged_buckets is None else self.merged_buckets
+        result = format_activity_histogram(*buckets, bucket_seconds, dense=self.params.get("activity_dense", False))
+        result["category_intervals"] = build_category_intervals(self.chat_data.get("categories", []), bucket_seconds)
+        return result
+
+    def partial(self):
+        first_bucket, counts, keyword_counts = self._count_buckets()
+        return [first_bucket, counts.tolist(), keyword_counts.tolist()]
+
+    def merge(self, partial):
+        parts = [] if self.merged_buckets is None else [self.merged_buckets]
+        self.merged_buckets = merge_activity_buckets(parts + [partial])
+
+
+def run_metrics(chat_data, metrics, params):
+    """
+    Считает все запрошенные метрики за один проход по сообщениям чата.
+
+    Args:
+        chat_data (dict): Данные трансляции (ключи "chat", "emotes", "categories").
+        metrics (list): Названия метрик из реестра AGGREGATORS.
+        params (dict): Параметры анализа (top_chatters_count, keywords, ...).
+
+    Returns:
+        dict: Результаты по каждой запрошенной метрике.
+    """
+    aggregators = _run_aggregators(chat_data, metrics, params)
+    return {metric: aggregator.result() for metric, aggregator in aggregators.items()}
+
+
+def run_metrics_partial(chat_data, metrics, params, start, stop):
+    """
+    Считает метрики по шарду — сообщениям с индексами [start, stop).
+
+    Returns:
+        dict: Метрика -> состояние агрегатора (JSON-совместимое) для merge_metric_partials.
+    """
+    aggregators = _run_aggregators(chat_data, metrics, params, range(start, stop))
+    return {metric: aggregator.partial() for metric, aggregator in aggregators.items()}
+
+
+def merge_metric_partials(chat_data, metrics, params, partials):
+    """
+    Собирает результаты метрик из состояний шардов.
+
+    Args:
+        partials (list): Результаты run_metrics_partial в порядке шардов (по возрастанию индексов).
+
+    Returns:
+        dict: То же, что run_metrics по всему чату.
+    """
+    aggregators = _create_aggregators(chat_data, metrics, params)
+    for partial in partials:
+        for metric, aggregator in aggregators.items():
+            aggregator.merge(partial[metric])
+    return {metric: aggregator.result() for metric, aggregator in aggregators.items()}
+
+
+def plan_message_shards(chat, shard_count):
+    """
+    Делит сообщения на шарды по диапазонам content_offset_seconds.
+
+    Шард — непрерывный диапазон индексов [start, stop); границы сдвигаются так, чтобы сообщения
+    одной секунды попадали в один шард. Если смещения в хранилище не упорядочены, шарды делятся
+    только по индексам (результат от этого не меняется).
+
+    Returns:
+        list: Пары (start, stop) в порядке сообщений.
+    """
+    total = len(chat)
+    shard_count = max(1, min(shard_count, total))
+    cuts = [total * i // shard_count for i in range(1, shard_count)]
+
+    offsets = np.asarray(chat.offsets) if isinstance(chat, ChatStore) else None
+    if offsets is not None and offsets.size and bool(np.all(offsets[1:] >= offsets[:-1])):
+        cuts = np.searchsorted(offsets, offsets[cuts], side="left").tolist()
+
+    bounds = [0] + [cut for cut in cuts if cut > 0] + [total]
+    return [(start, stop) for start, stop in zip(bounds, bounds[1:]) if stop > start]
+
+
+def _create_aggregators(chat_data, metrics, params, rows=None):
+    return {
+        metric: aggregator_cls(chat_data, params, rows)
+        for metric, aggregator_cls in AGGREGATORS.items()
+        if metric in metrics
+    }
+
+
+def _run_aggregators(chat_data, metrics, params, rows=None):
+    """Проходит по сообщениям чата (или шарда rows) и возвращает заполненные агрегаторы."""
+    aggregators = _create_aggregators(chat_data, metrics, params, rows)
+    if not aggregators:
+        return {}
+
+    # Ключевые слова проверяются один раз на сообщение для всех агрегаторов
+    keywords = params.get("keywords")
+    matcher = None
+    if keywords and any(aggregator.needs_keywords for aggregator in aggregators.values()):
+        matcher = KeywordMatcher(keywords, params.get("use_regex", False), params.get("match_case", True))
+    # Список совпавших слов нужен не всем метрикам, а для проверки «есть ли совпадение» хватает search
+    find_hits = matcher is not None and any(aggregator.needs_keyword_hits for aggregator in aggregators.values())
+
+    # Поиск подстрок без regex по колоночному хранилищу: метрики по ключевым словам считаются по
+    # индексу токенов, а проход по сообщениям нужен только остальным метрикам
+    pending = aggregators
+    postings = lookup_postings(chat_data, matcher, rows)
+    if postings is not None:
+        hits = np.unique(np.concatenate([np.empty(0, dtype=np.int64), *postings.values()]))
+        pending = {}
+        for metric, aggregator in aggregators.items():
+            if aggregator.supports_postings:
+                aggregator.update_postings(postings, hits)
+            else:
+                pending[metric] = aggregator
+
+    # Метрики, которым хватает столбцов хранилища, считаются без создания MessageRow
+    chat = chat_data.get("chat")
+    if isinstance(chat, ChatStore):
+        for aggregator in pending.values():
+            if aggregator.supports_columns:
+                aggregator.update_columns(chat, rows)
+        pending = {metric: aggregator for metric, aggregator in pending.items() if not aggregator.supports_columns}
+
+    if pending:
+        updates = [aggregator.update for aggregator in pending.values()]
+        for row in iter_message_rows(chat, rows):
+            if find_hits:
+                row.keyword_hits = matcher.find(row.body)
+                row.keyword_hit = bool(row.keyword_hits)
+            elif matcher is not None:
+                row.keyword_hit = matcher.matches(row.body)
+            for update in updates:
+                update(row)
+
+    return aggregators
+
+
+def lookup_postings(chat_data, matcher, rows=None):
+    """
+    Ищет ключевые слова в индексе токенов трансляции (chat_data["token_index"]).
+
+    rows (range, optional) оставляет только сообщения шарда.
+
+    Returns:
+        dict | None: Ключевое слово -> индексы сообщений, или None, если индекса нет
+        или запрос требует полного просмотра (regex, слова с пробелами).
+    """
+    index = chat_data.get("token_index")
+    if matcher is None or index is None or not isinstance(chat_data.get("chat"), ChatStore):
+        return None
+    if not all(index.supports(kw, matcher.use_regex) for kw in matcher.keywords):
+        return None
+    postings = {kw: index.lookup(kw) for kw in matcher.keywords}
+    if rows is not None:
+        postings = {kw: indices[np.searchsorted(indices, rows.start):np.searchsorted(indices, rows.stop)]
+                    for kw, indices in postings.items()}
+    return postings
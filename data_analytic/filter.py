@@ -1,4 +1,90 @@
 import re
+from data_processors.chat_store import ChatStore
+
+class KeywordMatcher:
+    """
+    Набор ключевых слов, скомпилированный один раз для проверки множества сообщений.
+
+    Обычный поиск (без regex) не учитывает регистр: все слова объединяются в одно регулярное
+    выражение по нижнему регистру, а сообщение приводится к нижнему регистру один раз, а не
+    для каждого ключевого слова.
+    """
+
+    def __init__(self, keywords, use_regex=False, match_case=True):
+        """
+        Args:
+            keywords (list): Ключевые слова или regex-выражения
+            use_regex (bool): Если True, использует regex, иначе обычный поиск
+            match_case (bool): Учитывать ли регистр (только для regex)
+        """
+        self.keywords = list(dict.fromkeys(keywords))
+        self.use_regex = use_regex
+
+        if use_regex:
+            regex_flags = 0 if match_case else re.IGNORECASE
+            self._patterns = [(kw, re.compile(kw, regex_flags)) for kw in self.keywords]
+            return
+
+        # Длинные слова идут раньше, чтобы при общем начале совпало самое длинное
+        alternatives = sorted(dict.fromkeys(kw.lower() for kw in self.keywords), key=len, reverse=True)
+        # Без ключевых слов выражение не должно совпадать ни с чем
+        pattern = "|".join(map(re.escape, alternatives)) or r"(?!)"
+        self._search = re.compile(pattern).search
+        # Опережающая проверка находит совпадение в каждой позиции, включая перекрывающиеся
+        self._finditer = re.compile(f"(?=({pattern}))").finditer
+
+        # Слова, входящие в другие слова: при совпадении длинного слова совпало и короткое
+        self._contained = {
+            word: [other for other in alternatives if other != word and other in word]
+            for word in alternatives
+        }
+
+    def matches(self, text):
+        """Есть ли в тексте хотя бы одно ключевое слово."""
+        if self.use_regex:
+            return any(pattern.search(text) for _, pattern in self._patterns)
+        return self._search(text.lower()) is not None
+
+    def find(self, text):
+        """
+        Возвращает ключевые слова, найденные в тексте, в порядке их перечисления.
+
+        Returns:
+            list: Совпавшие ключевые слова (пустой список, если совпадений нет)
+        """
+        if self.use_regex:
+            return [kw for kw, pattern in self._patterns if pattern.search(text)]
+
+        lowered = text.lower()
+        if self._search(lowered) is None:
+            return []
+
+        # В каждой позиции regex выбирает самое длинное слово; более короткие слова с тем же
+        # началом являются его префиксами и добавляются через _contained
+        found = set()
+        for match in self._finditer(lowered):
+            word = match.group(1)
+            if word not in found:
+                found.add(word)
+                found.update(self._contained[word])
+
+        return [kw for kw in self.keywords if kw.lower() in found]
+
+
+def build_keyword_predicate(keywords, use_regex=False, match_case=True):
+    """
+    Компилирует ключевые слова в функцию проверки текста сообщения.
+
+    Args:
+        keywords (list): Ключевые слова или regex-выражения
+        use_regex (bool): Если True, использует regex, иначе обычный поиск
+        match_case (bool): Учитывать ли регистр (только для regex)
+
+    Returns:
+        callable: Функция text -> bool
+    """
+    return KeywordMatcher(keywords, use_regex, match_case).matches
+
 
 def filter_messages_by_keywords(chat_data, keywords, use_regex=False, match_case=True):
     """
@@ -14,23 +100,24 @@ def filter_messages_by_keywords(chat_data, keywords, use_regex=False, match_case
         list: Отфильтрованные сообщения
     """
     filtered_messages = []
-    regex_flags = 0 if match_case else re.IGNORECASE
 
-    # Если используется regex, компилируем выражения заранее
-    if use_regex:
-        compiled_keywords = [re.compile(kw, regex_flags) for kw in keywords]
+    # Компилируем выражения заранее
+    matches = KeywordMatcher(keywords, use_regex, match_case).matches
+
+    # Колоночное хранилище: проверяем только тексты, словари создаём лишь для найденных сообщений
+    if isinstance(chat_data, ChatStore):
+        for index, text in enumerate(chat_data.iter_bodies()):
+            if matches(text):
+                filtered_messages.append(chat_data[index])
+        return filtered_messages
 
     for msg in chat_data:
         # Проверяем, что msg — это словарь и содержит ключ "message"
         if isinstance(msg, dict) and "message" in msg:
             text = msg["message"].get("body", "")
 
-            if use_regex:
-                if any(pattern.search(text) for pattern in compiled_keywords):
-                    filtered_messages.append(msg)
-            else:
-                if any(kw.lower() in text.lower() for kw in keywords):
-                    filtered_messages.append(msg)
+            if matches(text):
+                filtered_messages.append(msg)
         else:
             # Если структура неправильная или это не сообщение, выводим предупреждение
             print(f"Предупреждение: Не обрабатываем элемент: {msg}")
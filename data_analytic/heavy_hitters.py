@@ -0,0 +1,158 @@
+import heapq
+import os
+
+# Приближённый топ (Space-Saving): вместо счётчика на каждое имя хранится не больше capacity счётчиков,
+# поэтому память не зависит от числа разных авторов и эмоутов. Счётчик элемента завышен не больше чем
+# на его error, а error не больше total / capacity. Включается параметром heavy_hitters_capacity.
+# Модуль без тяжёлых зависимостей: веб-процесс импортирует его для проверки параметров запроса.
+HEAVY_HITTERS_CAPACITY = int(os.getenv("HEAVY_HITTERS_CAPACITY", 1000))  # Размер по умолчанию, если включено
+HEAVY_HITTERS_MAX_CAPACITY = int(os.getenv("HEAVY_HITTERS_MAX_CAPACITY", 100_000))  # Больше — не принимаем
+
+
+class SpaceSaving:
+    """
+    Потоковый подсчёт самых частых элементов в фиксированной памяти (алгоритм Space-Saving).
+
+    Пока элементов меньше capacity, подсчёт точный. Новый элемент при заполненной таблице вытесняет
+    элемент с минимальным счётчиком и наследует его счётчик (+1) как погрешность error:
+    истинное количество элемента лежит в [count - error, count]. Любой элемент, встретившийся
+    больше total / capacity раз, гарантированно остаётся в таблице.
+    """
+
+    __slots__ = ("capacity", "total", "counts", "errors", "_heap", "_seq")
+
+    def __init__(self, capacity=HEAVY_HITTERS_CAPACITY):
+        if capacity < 1:
+            raise ValueError("capacity должен быть положительным.")
+        self.capacity = capacity
+        self.total = 0
+        self.counts = {}
+        self.errors = {}
+        # Min-куча (счётчик, порядок, элемент); счётчик в куче может отставать от counts — такие
+        # записи обновляются, когда доходят до вершины. На каждый элемент в куче одна запись.
+        self._heap = []
+        self._seq = 0
+
+    def __len__(self):
+        return len(self.counts)
+
+    def add(self, item, count=1):
+        self.total += count
+        counts = self.counts
+        if item in counts:
+            counts[item] += count
+            return
+        if len(counts) < self.capacity:
+            counts[item] = count
+            self.errors[item] = 0
+            self._push(item, count)
+            return
+
+        evicted, min_count = self._pop_min()
+        del counts[evicted]
+        del self.errors[evicted]
+        counts[item] = min_count + count
+        self.errors[item] = min_count
+        self._push(item, min_count + count)
+
+    def min_count(self):
+        """Наименьший счётчик в таблице (0, пока таблица не заполнена): оценка сверху для отсутствующих."""
+        if len(self.counts) < self.capacity:
+            return 0
+        item, count = self._pop_min()
+        self._push(item, count)
+        return count
+
+    def error_bound(self):
+        """Максимальная погрешность любого счётчика: total / capacity."""
+        return self.total / self.capacity
+
+    def top(self, n=None):
+        """
+        Самые частые элементы.
+
+        Returns:
+            list: Кортежи (элемент, счётчик, погрешность), по убыванию счётчика.
+        """
+        items = sorted(self.counts.items(), key=lambda item: item[1], reverse=True)
+        if n is not None:
+            items = items[:n]
+        return [(item, count, self.errors[item]) for item, count in items]
+
+    def to_state(self):
+        """Состояние для передачи между процессами (JSON-совместимое)."""
+        return {"capacity": self.capacity, "total": self.total,
+                "items": [[item, count, self.errors[item]] for item, count in self.counts.items()]}
+
+    @classmethod
+    def from_state(cls, state):
+        sketch = cls(state["capacity"])
+        sketch.total = state["total"]
+        for item, count, error in state["items"]:
+            sketch.counts[item] = count
+            sketch.errors[item] = error
+            sketch._push(item, count)
+        return sketch
+
+    def merge(self, other):
+        """
+        Добавляет таблицу другой части потока (например, шарда чата).
+
+        Элементу, которого нет в одной из таблиц, добавляется её минимальный счётчик — и к счётчику,
+        и к погрешности; после объединения остаются capacity элементов с наибольшими счётчиками.
+        Погрешность объединения не больше (total + other.total) / capacity.
+        """
+        own_min, other_min = self.min_count(), other.min_count()
+        merged = {}
+        for item in {**self.counts, **other.counts}:
+            count = self.counts.get(item, own_min) + other.counts.get(item, other_min)
+            error = self.errors.get(item, own_min) + other.errors.get(item, other_min)
+            merged[item] = (count, error)
+
+        kept = {item for item, _ in heapq.nlargest(self.capacity, merged.items(), key=lambda item: item[1][0])}
+        self.total += other.total
+        # Порядок элементов — порядок первого появления, как при одном проходе: равные счётчики в top()
+        # упорядочены одинаково при подсчёте целиком и по шардам
+        self.counts = {item: count for item, (count, _) in merged.items() if item in kept}
+        self.errors = {item: error for item, (_, error) in merged.items() if item in kept}
+        self._heap = []
+        for item, count in self.counts.items():
+            self._push(item, count)
+
+    def _push(self, item, count):
+        self._seq += 1
+        heapq.heappush(self._heap, (count, self._seq, item))
+
+    def _pop_min(self):
+        """Снимает с кучи элемент с минимальным текущим счётчиком (устаревшие записи обновляются)."""
+        heap, counts = self._heap, self.counts
+        while True:
+            count, _, item = heapq.heappop(heap)
+            current = counts[item]
+            if current == count:
+                return item, count
+            self._push(item, current)
+
+
+def make_heavy_hitters(params):
+    """SpaceSaving для параметров анализа или None (точный подсчёт, по умолчанию)."""
+    capacity = params.get("heavy_hitters_capacity")
+    return SpaceSaving(int(capacity)) if capacity else None
+
+
+def parse_heavy_hitters_capacity(value):
+    """
+    Проверяет размер приближённого топа из параметров запроса: пусто или 0 — точный подсчёт (None).
+
+    Raises:
+        ValueError: Если значение не целое или вне [0, HEAVY_HITTERS_MAX_CAPACITY].
+    """
+    if value in (None, ""):
+        return None
+    try:
+        capacity = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("Размер должен быть целым числом") from None
+    if not 0 <= capacity <= HEAVY_HITTERS_MAX_CAPACITY:
+        raise ValueError(f"Размер должен быть от 0 до {HEAVY_HITTERS_MAX_CAPACITY}")
+    return capacity or None
@@ -1,10 +1,19 @@
 from collections import Counter
+from data_processors.chat_store import ChatStore
 
 def get_top_chatters(data, top_n=10):
     """Возвращает топ-N самых активных чаттеров"""
     chat_data = data.get("chat", [])  # Извлекаем список сообщений из данных
     user_counts = Counter()
 
+    # Колоночное хранилище: считаем по столбцу индексов авторов, не создавая словари сообщений
+    if isinstance(chat_data, ChatStore):
+        for commenter_index, count in Counter(chat_data.commenter_index).items():
+            commenter_name = chat_data.commenter_names[commenter_index]
+            if commenter_name:
+                user_counts[commenter_name] += count
+        return user_counts.most_common(top_n)
+
     # Проходим по каждому сообщению в чате
     for msg in chat_data:
         # Проверяем, что msg является словарем и что он содержит нужные ключи
@@ -0,0 +1,216 @@
+import atexit
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from dotenv import load_dotenv
+from logging_config import setup_logger
+
+# Логгер
+logger = setup_logger("browser_pool")
+
+# Загрузим .env.local для локальной разработки
+if os.environ.get('FLASK_ENV') == 'development':
+    load_dotenv('.env.local')
+else:
+    load_dotenv('.env.docker')
+
+CHROMEDRIVER_PATH = os.getenv('CHROMEDRIVER_PATH')
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", 2))  # Одновременно открытых браузеров на процесс
+BROWSER_MAX_PAGES = int(os.getenv("BROWSER_MAX_PAGES", 50))  # Страниц до перезапуска браузера
+BROWSER_ACQUIRE_TIMEOUT = float(os.getenv("BROWSER_ACQUIRE_TIMEOUT", 120))  # Ожидание свободного браузера, с
+BROWSER_PAGE_LOAD_TIMEOUT = float(os.getenv("BROWSER_PAGE_LOAD_TIMEOUT", 30))  # Таймаут загрузки страницы, с
+
+
+def create_driver():
+    """Запускает headless Chrome с настройками парсера категорий."""
+    service = Service(CHROMEDRIVER_PATH)
+    options = Options()
+
+    # Настройки Selenium
+    options.add_argument('--headless')
+    options.add_argument('--disable-gpu')
+    options.add_argument('--incognito')
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument('--lang=en-US')
+    options.add_experimental_option("prefs", {"intl.accept_languages": "en,en-US"})
+
+    driver = webdriver.Chrome(service=service, options=options)
+    driver.set_page_load_timeout(BROWSER_PAGE_LOAD_TIMEOUT)
+    return driver
+
+
+class _PooledDriver:
+    """Браузер пула и количество страниц, открытых в нём."""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0
+        self.created_at = time.time()
+
+
+class BrowserPool:
+    """
+    Пул долгоживущих headless-браузеров одного процесса.
+
+    Запуск Chrome — самый медленный шаг парсера категорий, поэтому браузеры переиспользуются:
+    перед выдачей проверяется, что браузер отвечает, после BROWSER_MAX_PAGES страниц или ошибки
+    WebDriver он закрывается и при следующем запросе запускается новый. Одновременно выдаётся
+    не больше size браузеров, остальные запросы ждут.
+    """
+
+    def __init__(self, size=BROWSER_POOL_SIZE, max_pages=BROWSER_MAX_PAGES, driver_factory=create_driver):
+        self.size = size
+        self.max_pages = max_pages
+        self._driver_factory = driver_factory
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = []
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._stats = {"launched": 0, "recycled": 0, "crashed": 0, "pages": 0, "waits": 0, "wait_seconds": 0.0}
+
+    @contextmanager
+    def acquire(self, timeout=BROWSER_ACQUIRE_TIMEOUT):
+        """
+        Выдаёт рабочий браузер на время блока with.
+
+        Ошибка WebDriver внутри блока считается падением браузера: он закрывается, а исключение
+        пробрасывается дальше.
+
+        Raises:
+            TimeoutError: Если свободный браузер не освободился за timeout секунд.
+        """
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError(f"Нет свободного браузера за {timeout} с")
+        waited = time.monotonic() - started
+
+        pooled = None
+        try:
+            pooled = self._checkout()
+            with self._lock:
+                self._in_use += 1
+                self._stats["waits"] += waited > 0.01
+                self._stats["wait_seconds"] += waited
+
+            try:
+                yield pooled.driver
+            except WebDriverException:
+                self._discard(pooled, crashed=True)
+                pooled = None
+                raise
+            finally:
+                if pooled is not None:
+                    pooled.pages += 1
+                    self._checkin(pooled)
+                with self._lock:
+                    self._in_use -= 1
+                    self._stats["pages"] += 1
+        finally:
+            self._slots.release()
+
+    def _checkout(self):
+        """Берёт свободный отвечающий браузер или запускает новый."""
+        while True:
+            with self._lock:
+                pooled = self._idle.pop() if self._idle else None
+            if pooled is None:
+                break
+            if self._is_alive(pooled.driver):
+                return pooled
+            logger.warning("⚠️ Браузер из пула не отвечает, перезапускаем.")
+            self._discard(pooled, crashed=True)
+
+        started = time.monotonic()
+        driver = self._driver_factory()
+        with self._lock:
+            self._stats["launched"] += 1
+        logger.info(f"🚀 Запущен браузер для пула за {time.monotonic() - started:.1f} с")
+        return _PooledDriver(driver)
+
+    def _checkin(self, pooled):
+        """Возвращает браузер в пул или закрывает его после max_pages страниц."""
+        if pooled.pages >= self.max_pages:
+            self._discard(pooled)
+            return
+        try:
+            # Страница и cookies предыдущего VOD не должны влиять на следующий
+            pooled.driver.delete_all_cookies()
+            pooled.driver.get("about:blank")
+        except WebDriverException:
+            self._discard(pooled, crashed=True)
+            return
+        with self._lock:
+            self._idle.append(pooled)
+
+    def _discard(self, pooled, crashed=False):
+        with self._lock:
+            self._stats["crashed" if crashed else "recycled"] += 1
+        try:
+            pooled.driver.quit()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _is_alive(driver):
+        """Проверка здоровья: браузер отвечает на простой скрипт."""
+        try:
+            return driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    def stats(self):
+        """Возвращает счётчики пула."""
+        with self._lock:
+            return {
+                **self._stats,
+                "wait_seconds": round(self._stats["wait_seconds"], 3),
+                "size": self.size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+            }
+
+    def close(self):
+        """Закрывает все свободные браузеры."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for pooled in idle:
+            try:
+                pooled.driver.quit()
+            except Exception:
+                pass
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool():
+    """Возвращает пул браузеров текущего процесса (после fork создаётся новый)."""
+    global _pool, _pool_pid
+
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = BrowserPool()
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def get_browser_pool_stats():
+    """Возвращает счётчики пула браузеров текущего процесса (пустой словарь, если пул не создавался)."""
+    if _pool is None or _pool_pid != os.getpid():
+        return {}
+    return _pool.stats()
+
+
+@atexit.register
+def _close_pool():
+    if _pool is not None and _pool_pid == os.getpid():
+        _pool.close()
@@ -1,13 +1,11 @@
-import re, os
+import re, os, sys
 import logging
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
+from selenium.common.exceptions import TimeoutException, WebDriverException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from bs4 import BeautifulSoup
 from dotenv import load_dotenv
+from data_collectors.browser_pool import get_browser_pool
 from data_collectors.helix_api import get_stream_duration  # Функция для получения длительности видео
 
 # Настройка логирования
@@ -24,76 +22,97 @@ if os.environ.get('FLASK_ENV') == 'development':
 else:
     load_dotenv('.env.docker')
 
-CHROMEDRIVER_PATH = os.getenv('CHROMEDRIVER_PATH')
+PAGE_READY_TIMEOUT = float(os.getenv("CATEGORY_PAGE_READY_TIMEOUT", 15))  # Ожидание готовности страницы VOD, с
 
-def parse_data(video_id):
-    """Собирает текстовую информацию о видео с Twitch VOD."""
+UNAVAILABLE_XPATH = "//*[contains(text(), \"Sorry. Unless you've got a time machine, that content is unavailable.\")]"
+START_WATCHING_XPATH = "//div[@data-a-target='tw-core-button-label-text' and contains(text(), 'Start Watching')]"
+CONTINUE_WATCHING_XPATH = "//button[contains(text(), 'Continue Watching')]"
 
-    service = Service(CHROMEDRIVER_PATH)
-    options = Options()
+# Текст плеера, по которому extract_info находит категории: его появление означает, что страница готова
+READY_SCRIPT = (
+    "return document.readyState === 'complete' && !!document.body"
+    " && document.body.textContent.indexOf('Volume') !== -1"
+)
 
-    # Настройки Selenium
-    options.add_argument('--headless')
-    options.add_argument('--disable-gpu')
-    options.add_argument('--incognito')
-    options.add_argument('--no-sandbox')
-    options.add_argument('--disable-dev-shm-usage')
-    options.add_argument('--lang=en-US')
-    options.add_experimental_option("prefs", {"intl.accept_languages": "en,en-US"})
 
-    driver = webdriver.Chrome(service=service, options=options)
+def _page_state(driver):
+    """
+    Определяет состояние страницы VOD для WebDriverWait.
+
+    Returns:
+        str | bool: "unavailable", "start", "continue", "ready" или False, если страница ещё грузится.
+    """
+    if driver.find_elements(By.XPATH, UNAVAILABLE_XPATH):
+        return "unavailable"
+    for state, xpath in (("start", START_WATCHING_XPATH), ("continue", CONTINUE_WATCHING_XPATH)):
+        buttons = driver.find_elements(By.XPATH, xpath)
+        if buttons and buttons[0].is_displayed() and buttons[0].is_enabled():
+            return state
+    if driver.execute_script(READY_SCRIPT):
+        return "ready"
+    return False
+
+
+def fetch_vod_html(driver, video_id, timeout=PAGE_READY_TIMEOUT):
+    """
+    Открывает страницу VOD в переданном браузере и возвращает её HTML.
+
+    Вместо фиксированных пауз ждёт первое из состояний: видео недоступно, нужна кнопка
+    «Start Watching»/«Continue Watching» (нажимается, после чего ожидание продолжается)
+    или на странице появился текст плеера. Если за timeout страница так и не стала готовой,
+    возвращается то, что успело загрузиться.
+
+    Returns:
+        str | None: HTML страницы или None, если видео недоступно.
+    """
     url = f"https://www.twitch.tv/videos/{video_id}"
+    logger.info(f"🚀 Открываем страницу {url}")
+    driver.get(url)
 
-    try:
-        logger.info(f"🚀 Открываем страницу {url}")
-        driver.get(url)
-
-        # Проверка на недоступность видео
+    clicked = set()
+    while True:
         try:
-            WebDriverWait(driver, 2).until(
-                EC.presence_of_element_located((By.XPATH,
-                                                "//*[contains(text(), \"Sorry. Unless you've got a time machine, that content is unavailable.\")]"))
-            )
+            state = WebDriverWait(driver, timeout, poll_frequency=0.2).until(_page_state)
+        except TimeoutException:
+            logger.warning(f"⚠️ Страница {url} не дождалась готовности за {timeout} с, берём текущий HTML.")
+            break
+
+        if state == "unavailable":
             logger.warning(f"⚠️ Видео {video_id} недоступно.")
             return None
-        except Exception:
-            pass
+        if state == "ready" or state in clicked:
+            break
 
-        # Нажатие кнопки "Start Watching", если она есть
-        try:
-            start_button = WebDriverWait(driver, 1).until(
-                EC.element_to_be_clickable((By.XPATH,
-                                            "//div[@data-a-target='tw-core-button-label-text' and contains(text(), 'Start Watching')]"))
-            )
-            start_button.click()
-            logger.info("▶️ Нажата кнопка 'Start Watching'.")
-        except Exception:
-            pass
-
-        # Нажатие кнопки "Continue Watching" при возрастном ограничении
-        try:
-            continue_button = WebDriverWait(driver, 1).until(
-                EC.element_to_be_clickable((By.XPATH, "//button[contains(text(), 'Continue Watching')]"))
-            )
-            continue_button.click()
-            logger.info("🔞 Нажата кнопка 'Continue Watching'.")
-        except Exception:
-            pass
-
-        # Получаем HTML страницы
-        WebDriverWait(driver, 2).until(EC.presence_of_element_located((By.TAG_NAME, 'body')))
-        html = driver.page_source
-        logger.info(f"✅ Страница {url} загружена успешно.")
-
-    except Exception as e:
+        # Нажатие кнопки "Start Watching" или "Continue Watching" при возрастном ограничении
+        xpath = START_WATCHING_XPATH if state == "start" else CONTINUE_WATCHING_XPATH
+        driver.find_element(By.XPATH, xpath).click()
+        clicked.add(state)
+        logger.info("▶️ Нажата кнопка 'Start Watching'." if state == "start" else "🔞 Нажата кнопка 'Continue Watching'.")
+
+    logger.info(f"✅ Страница {url} загружена успешно.")
+    return driver.page_source
+
+
+def html_to_text(html):
+    """Извлекает текст страницы из HTML (без браузера, подходит для сохранённых страниц)."""
+    soup = BeautifulSoup(html, 'html.parser')
+    return soup.get_text(separator=' ', strip=True)
+
+
+def parse_data(video_id):
+    """Собирает текстовую информацию о видео с Twitch VOD (браузер берётся из пула процесса)."""
+    try:
+        with get_browser_pool().acquire() as driver:
+            html = fetch_vod_html(driver, video_id)
+    except (WebDriverException, TimeoutError) as e:
         logger.error(f"❌ Ошибка при загрузке страницы: {e}")
         return None
-    finally:
-        driver.quit()
+
+    if html is None:
+        return None
 
     # Обработка HTML с помощью BeautifulSoup
-    soup = BeautifulSoup(html, 'html.parser')
-    return soup.get_text(separator=' ', strip=True)
+    return html_to_text(html)
 
 
 def extract_info(text):
@@ -184,6 +203,19 @@ def format_categories(transitions):
     return categories
 
 
+def parse_categories(page_text):
+    """
+    Разбирает текст страницы VOD: текущая категория и список категорий с длительностями.
+
+    Returns:
+        tuple: (текущая категория, список категорий в формате format_categories или None)
+    """
+    current_category, volume_pairs = extract_info(page_text)
+    if not volume_pairs:
+        return current_category, None
+    return current_category, format_categories(accumulate_seconds(volume_pairs))
+
+
 def process_url(video_id):
     """Основной процесс сбора данных по ID видео."""
     logger.info(f"🚀 Начало обработки видео {video_id}.")
@@ -193,12 +225,11 @@ def process_url(video_id):
         logger.error(f"❌ Не удалось загрузить данные для видео {video_id}.")
         return None
 
-    current_category, volume_pairs = extract_info(page_text)
+    current_category, categories = parse_categories(page_text)
 
-    if volume_pairs:
-        accumulated = accumulate_seconds(volume_pairs)
-        logger.info(f"📊 Найдено {len(accumulated)} переходов категорий.")
-        return format_categories(accumulated)
+    if categories:
+        logger.info(f"📊 Найдено {len(categories)} переходов категорий.")
+        return categories
     else:
         stream_duration = get_stream_duration(video_id)
         if stream_duration:
@@ -207,10 +238,17 @@ def process_url(video_id):
             return None
 
 
-# Пример использования
+# Пример использования:
+#   python -m data_collectors.category_parser [video_id]
+#   python -m data_collectors.category_parser page.html  — разбор сохранённой страницы без браузера
 if __name__ == "__main__":
-    video_id = "2376580226"
-    transitions = process_url(video_id)
+    source = sys.argv[1] if len(sys.argv) > 1 else "2376580226"
+    if source.endswith(".html"):
+        with open(source, "r", encoding="utf-8") as f:
+            current, transitions = parse_categories(html_to_text(f.read()))
+        logger.info(f"📜 Текущая категория: {current}")
+    else:
+        transitions = process_url(source)
     if transitions:
         for cat in transitions:
-            logger.info(f"📜 {cat}")
\ No newline at end of file
+            logger.info(f"📜 {cat}")
@@ -1,8 +1,14 @@
 import requests
 import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from logging_config import setup_logger
+from compressed_io import GZIP_EXTENSION
+from data_collectors import http_client
+from data_collectors.chat_file import (CHAT_FILE_EXTENSION, CHAT_REF_EXTENSION, ChatFile, ChatFileWriter, compact_id,
+                                      read_chat_ref, read_resume_state, write_chat_blob, write_chat_ref)
 
 # Настройка логирования
 logger = setup_logger("chat_downloader")
@@ -17,6 +23,14 @@ else:
 PROJECT_ROOT = os.getenv('PROJECT_ROOT')
 CHAT_CLIENT_ID = os.getenv("CHAT_CLIENT_ID")
 CHAT_CLIENT_SHA = os.getenv("CHAT_CLIENT_SHA")
+GQL_URL = os.getenv("GQL_URL", "https://gql.twitch.tv/gql")
+
+# Параллельная загрузка: на сколько отрезков по времени делится VOD и сколько отрезков качается одновременно
+CHAT_DOWNLOAD_SEGMENTS = int(os.getenv("CHAT_DOWNLOAD_SEGMENTS", 1))
+CHAT_DOWNLOAD_WORKERS = int(os.getenv("CHAT_DOWNLOAD_WORKERS", 4))
+
+# Ошибки разбора ответа GQL (не JSON, null вместо объекта, нет ожидаемых полей): отрезок считается незагруженным
+GQL_PARSE_ERRORS = (KeyError, TypeError, ValueError, AttributeError)
 
 if not CHAT_CLIENT_ID or not CHAT_CLIENT_SHA:
     logger.critical("❌ Переменные среды CHAT_CLIENT_ID и CHAT_CLIENT_SHA не заданы.")
@@ -27,18 +41,44 @@ OUTPUT_DIR = os.path.join(PROJECT_ROOT, 'chats')
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 
-def get_chat_file_path(video_id):
-    """Возвращает путь к файлу чата."""
-    return os.path.join(OUTPUT_DIR, f"{video_id}.json")
+def get_chat_ref_path(video_id):
+    """Возвращает путь к ссылке на сохранённый по хэшу чат видео."""
+    return os.path.join(OUTPUT_DIR, f"{video_id}{CHAT_REF_EXTENSION}")
+
+
+def get_chat_blob_path(ref):
+    """Возвращает путь к сохранённому по хэшу чату по ссылке на него."""
+    return os.path.join(OUTPUT_DIR, ref["file"])
+
+
+def get_segment_file_path(video_id, start, end):
+    """Возвращает путь к файлу отрезка, который ещё загружается."""
+    return os.path.join(OUTPUT_DIR, f"{video_id}.{start}-{end if end is not None else 'end'}{CHAT_FILE_EXTENSION}.part")
 
 
 def load_chat_from_file(video_id):
-    """Загружает чат из файла, если он существует."""
-    chat_file = get_chat_file_path(video_id)
-    if os.path.exists(chat_file):
+    """
+    Возвращает чат из файла, если он существует.
+
+    Чат находится по ссылке {video_id}.ref.json и читается лениво (ChatFile); так же читаются NDJSON-файлы
+    прежних версий ({video_id}.ndjson[.gz]), а файлы старого формата ({video_id}.json) загружаются целиком.
+    """
+    ref = read_chat_ref(get_chat_ref_path(video_id))
+    if ref is not None and os.path.exists(get_chat_blob_path(ref)):
+        logger.info(f"📂 Чат для {video_id} найден. Читаем данные из файла.")
+        return ChatFile(get_chat_blob_path(ref), ref)
+
+    legacy_ndjson = os.path.join(OUTPUT_DIR, f"{video_id}{CHAT_FILE_EXTENSION}")
+    for chat_file in (legacy_ndjson + GZIP_EXTENSION, legacy_ndjson):
+        if os.path.exists(chat_file):
+            logger.info(f"📂 Чат для {video_id} найден. Читаем данные из файла.")
+            return ChatFile(chat_file)
+
+    legacy_file = os.path.join(OUTPUT_DIR, f"{video_id}.json")
+    if os.path.exists(legacy_file):
         logger.info(f"📂 Чат для {video_id} найден. Загружаем данные из файла.")
         try:
-            with open(chat_file, "r", encoding="utf-8") as f:
+            with open(legacy_file, "r", encoding="utf-8") as f:
                 return json.load(f)
         except (IOError, json.JSONDecodeError) as e:
             logger.error(f"❌ Ошибка при загрузке чата из файла: {e}")
@@ -46,17 +86,161 @@ def load_chat_from_file(video_id):
     return None
 
 
-def download_chat_to_file(video_id, start=0, force_download=False):
+def parse_comment(node):
+    """Преобразует узел комментария из ответа GQL в формат, в котором чат хранится в файле."""
+    # Извлекаем бейджи пользователя (если есть)
+    badges = [
+        {"set_id": badge["setID"], "version": badge["version"]}
+        for badge in node["message"].get("userBadges", [])
+    ]
+
+    return {
+        "_id": node["id"],
+        "created_at": node["createdAt"],
+        "content_offset_seconds": node["contentOffsetSeconds"],
+        "commenter": {
+            "display_name": node["commenter"]["displayName"].strip(),
+            "_id": node["commenter"]["id"],
+            "name": node["commenter"]["login"]
+        },
+        "message": {
+            "body": "".join(frag["text"] for frag in node["message"]["fragments"] if frag["text"]),
+            "user_color": node["message"]["userColor"],
+            "badges": badges  # Добавляем бейджи
+        }
+    }
+
+
+def fetch_comments_page(video_id, offset, cursor=None):
+    """
+    Запрашивает одну страницу комментариев VideoCommentsByOffsetOrCursor.
+
+    Returns:
+        tuple: (список рёбер комментариев, есть ли следующая страница)
+    """
+    payload = {
+        "operationName": "VideoCommentsByOffsetOrCursor",
+        "variables": {"videoID": video_id, "contentOffsetSeconds": offset},
+        "extensions": {
+            "persistedQuery": {"version": 1, "sha256Hash": CHAT_CLIENT_SHA}
+        }
+    }
+    if cursor:
+        payload["variables"]["cursor"] = cursor
+
+    response = http_client.post(GQL_URL, headers={"Client-ID": CHAT_CLIENT_ID}, json=payload)
+    response.raise_for_status()
+    data = response.json()
+
+    comments = data.get("data", {}).get("video", {}).get("comments", {})
+    return comments.get("edges", []), comments.get("pageInfo", {}).get("hasNextPage", False)
+
+
+def download_segment(video_id, start, end=None, seen_ids=None, lock=None, on_page=None):
+    """
+    Проходит по цепочке курсоров, начиная со смещения start, и дописывает комментарии в файл отрезка.
+
+    В файл попадают комментарии со смещением в [start, end) (у первого отрезка — без нижней границы),
+    поэтому файлы отрезков можно склеить по порядку. Если файл отрезка остался после сбоя,
+    загрузка продолжается с последнего записанного смещения.
+
+    Args:
+        video_id (str): ID видео.
+        start (int): Начало отрезка в секундах.
+        end (int, optional): Конец отрезка; None — до конца чата.
+        seen_ids (set, optional): Общее множество компактных id для дедупликации.
+        lock (threading.Lock, optional): Блокировка для seen_ids при параллельной загрузке.
+        on_page (callable, optional): Вызывается после каждой страницы как on_page(start, достигнутое смещение).
+
+    Returns:
+        str: Путь к файлу отрезка.
+    """
+    segment_path = get_segment_file_path(video_id, start, end)
+    seen_ids = set() if seen_ids is None else seen_ids
+    lock = lock or threading.Lock()
+    lower_bound = start if start > 0 else None
+    offset = start
+
+    if os.path.exists(segment_path):
+        resumed_ids, last_offset = read_resume_state(segment_path)
+        with lock:
+            seen_ids.update(resumed_ids)
+        if last_offset is not None:
+            offset = last_offset
+            logger.info(f"♻️ Продолжаем отрезок {start}–{end} с {offset} с ({len(resumed_ids)} уже загружено).")
+
+    cursor = None
+    with ChatFileWriter(segment_path) as writer:
+        while True:
+            comments, has_next_page = fetch_comments_page(video_id, offset, cursor)
+            if not comments:
+                logger.warning(f"⚠️ Комментарии не найдены или достигнут конец данных (отрезок с {start} с).")
+                break
+
+            page = []
+            for comment in comments:
+                node = comment["node"]
+                if not node.get("commenter"):
+                    logger.warning("⚠️ Пропущен комментарий без информации о пользователе.")
+                    continue
+
+                comment_offset = node["contentOffsetSeconds"]
+                if (lower_bound is not None and comment_offset < lower_bound) or (end is not None and comment_offset >= end):
+                    continue
+
+                key = compact_id(node["id"])
+                with lock:
+                    if key in seen_ids:
+                        continue
+                    seen_ids.add(key)
+                page.append(parse_comment(node))
+
+            writer.write_page(page)
+            if on_page:
+                on_page(start, comments[-1]["node"]["contentOffsetSeconds"])
+
+            if not has_next_page:
+                logger.info(f"🏁 Достигнут конец чата (отрезок с {start} с).")
+                break
+
+            if end is not None and comments[-1]["node"]["contentOffsetSeconds"] >= end:
+                logger.info(f"🏁 Отрезок {start}–{end} с загружен.")
+                break
+
+            cursor = comments[-1]["cursor"]
+
+    return segment_path
+
+
+def split_segments(start, duration, segments):
+    """Делит интервал [start, duration) на segments отрезков (последний открыт справа)."""
+    step = (duration - start) / segments
+    bounds = [int(start + i * step) for i in range(segments)]
+    return [(bound, bounds[i + 1] if i + 1 < segments else None) for i, bound in enumerate(bounds)]
+
+
+def download_chat_to_file(video_id, start=0, force_download=False, segments=None, max_workers=None, duration=None,
+                          progress=None):
     """
     Скачивает чат, если его нет в файле, и возвращает данные.
 
+    Страницы сразу дописываются в NDJSON-файлы отрезков с периодическим fsync, поэтому память не растёт
+    с размером чата, а после сбоя загрузка продолжается с места остановки.
+    При segments > 1 длительность VOD делится на отрезки по contentOffsetSeconds, цепочки курсоров
+    отрезков загружаются параллельно, а файлы отрезков склеиваются по порядку смещений.
+
     Args:
         video_id (str): ID видео.
         start (int): Начальное время в секундах.
         force_download (bool): Если True, загружает чат заново, даже если он уже есть.
+        segments (int, optional): Количество отрезков (по умолчанию CHAT_DOWNLOAD_SEGMENTS).
+        max_workers (int, optional): Количество одновременных загрузок (по умолчанию CHAT_DOWNLOAD_WORKERS).
+        duration (int, optional): Длительность VOD в секундах; если не задана, запрашивается в Helix API.
+        progress (callable, optional): Получает события прогресса загрузки: progress("chat_download", pages=...,
+            messages=..., offset_seconds=..., duration=...) (task_progress.ProgressReporter).
 
     Returns:
-        list: Список загруженных комментариев.
+        ChatFile: Лениво читаемый чат (или список для файлов старого формата).
     """
 
     # Проверяем, существует ли уже чат в файле
@@ -65,86 +249,79 @@ def download_chat_to_file(video_id, start=0, force_download=False):
         if existing_chat is not None:
             return existing_chat
 
-    logger.info(f"🚀 Начало загрузки чата для видео {video_id}. (Принудительно: {force_download})")
-    headers = {"Client-ID": CHAT_CLIENT_ID}
-    comments_dict = {}
-    cursor = None
+    segments = segments or CHAT_DOWNLOAD_SEGMENTS
+    max_workers = max_workers or CHAT_DOWNLOAD_WORKERS
 
-    while True:
-        payload = {
-            "operationName": "VideoCommentsByOffsetOrCursor",
-            "variables": {"videoID": video_id, "contentOffsetSeconds": start},
-            "extensions": {
-                "persistedQuery": {"version": 1, "sha256Hash": CHAT_CLIENT_SHA}
-            }
-        }
-        if cursor:
-            payload["variables"]["cursor"] = cursor
+    if segments > 1 and duration is None:
+        from data_collectors.helix_api import get_stream_duration
+        duration = get_stream_duration(video_id)
+    if segments > 1 and (not duration or duration <= start):
+        logger.warning("⚠️ Длительность VOD неизвестна, загружаем чат одним отрезком.")
+        segments = 1
+
+    logger.info(f"🚀 Начало загрузки чата для видео {video_id}. "
+                f"(Принудительно: {force_download}, отрезков: {segments})")
+
+    bounds = split_segments(start, duration, segments) if segments > 1 else [(start, None)]
+    if force_download:
+        for bound in bounds:
+            segment_path = get_segment_file_path(video_id, *bound)
+            if os.path.exists(segment_path):
+                os.remove(segment_path)
+
+    # Комментарии сразу пишутся в файлы отрезков; в памяти держим только компактные id
+    seen_ids = set()
+    lock = threading.Lock()
+    segment_ends = dict(bounds)
+    covered = {}  # Начало отрезка -> сколько секунд отрезка уже загружено
+    pages = [0]
+
+    def on_page(segment_start, offset):
+        end = segment_ends[segment_start]
+        offset = min(offset, end) if end is not None else offset
+        with lock:
+            pages[0] += 1
+            covered[segment_start] = max(covered.get(segment_start, 0), offset - segment_start)
+            fields = {"pages": pages[0], "messages": len(seen_ids), "offset_seconds": start + sum(covered.values())}
+        progress("chat_download", duration=duration, **fields)
 
+    def download(bound):
+        # Сбой одного отрезка не прерывает остальные: их файлы дописываются и пригодятся при продолжении
         try:
-            response = requests.post("https://gql.twitch.tv/gql", headers=headers, json=payload)
-            response.raise_for_status()
-            data = response.json()
+            return download_segment(video_id, *bound, seen_ids, lock, on_page if progress else None)
         except requests.exceptions.RequestException as e:
-            logger.error(f"❌ Ошибка при запросе данных: {e}")
-            return None
+            logger.error(f"❌ Ошибка при запросе данных (отрезок {bound[0]}–{bound[1]}): {e}")
+        except GQL_PARSE_ERRORS as e:
+            logger.error(f"❌ Некорректный ответ GQL (отрезок {bound[0]}–{bound[1]}): {e!r}")
+        return None
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, segments)) as executor:
+        segment_paths = list(executor.map(download, bounds))
+
+    failed = sum(1 for segment_path in segment_paths if segment_path is None)
+    if failed:
+        logger.error(f"❌ Не загружено отрезков: {failed} из {len(bounds)}. Загруженное сохранено для продолжения.")
+        return None
+
+    logger.info(f"🔍 Загружено {len(seen_ids)} уникальных комментариев.")
+
+    # Склеиваем отрезки по порядку смещений в один сжатый файл с именем из хэша и публикуем ссылку на него
+    def segment_lines():
+        for segment_path in segment_paths:
+            with open(segment_path, "rb") as part:
+                yield from part
 
-        comments = data.get("data", {}).get("video", {}).get("comments", {}).get("edges", [])
-        if not comments:
-            logger.warning("⚠️ Комментарии не найдены или достигнут конец данных.")
-            break
-
-        for comment in comments:
-            node = comment["node"]
-            if not node.get("commenter"):
-                logger.warning("⚠️ Пропущен комментарий без информации о пользователе.")
-                continue
-
-            comment_id = node["id"]
-            if comment_id not in comments_dict:
-                # Извлекаем бейджи пользователя (если есть)
-                badges = [
-                    {"set_id": badge["setID"], "version": badge["version"]}
-                    for badge in node["message"].get("userBadges", [])
-                ]
-
-                comments_dict[comment_id] = {
-                    "_id": comment_id,
-                    "created_at": node["createdAt"],
-                    "content_offset_seconds": node["contentOffsetSeconds"],
-                    "commenter": {
-                        "display_name": node["commenter"]["displayName"].strip(),
-                        "_id": node["commenter"]["id"],
-                        "name": node["commenter"]["login"]
-                    },
-                    "message": {
-                        "body": "".join(frag["text"] for frag in node["message"]["fragments"] if frag["text"]),
-                        "user_color": node["message"]["userColor"],
-                        "badges": badges  # Добавляем бейджи
-                    }
-                }
-
-        page_info = data.get("data", {}).get("video", {}).get("comments", {}).get("pageInfo", {})
-        if not page_info.get("hasNextPage"):
-            logger.info("🏁 Достигнут конец чата.")
-            break
-
-        cursor = comments[-1]["cursor"]
-
-    unique_comments = list(comments_dict.values())
-    logger.info(f"🔍 Загружено {len(unique_comments)} уникальных комментариев.")
-
-    # Сохраняем в файл
-    output_path = get_chat_file_path(video_id)
     try:
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(unique_comments, f, ensure_ascii=False, indent=4)
-        logger.info(f"✅ Чат сохранён в {output_path}.")
+        ref = write_chat_blob(OUTPUT_DIR, segment_lines())
+        write_chat_ref(get_chat_ref_path(video_id), ref)
+        for segment_path in segment_paths:
+            os.remove(segment_path)
+        logger.info(f"✅ Чат сохранён в {get_chat_blob_path(ref)}.")
     except IOError as e:
         logger.error(f"❌ Ошибка при сохранении файла: {e}")
         return None
 
-    return unique_comments
+    return ChatFile(get_chat_blob_path(ref), ref)
 
 
 # Пример использования
@@ -155,6 +332,6 @@ if __name__ == "__main__":
     comments = download_chat_to_file(video_id, force_download=force_reload)
 
     if comments:
-        logger.info(f"🎉 Всего получено {len(comments)} комментариев.")
+        logger.info(f"🎉 Всего получено {sum(1 for _ in comments)} комментариев.")
     else:
         logger.warning("❌ Чат не был загружен.")
\ No newline at end of file
@@ -0,0 +1,179 @@
+import hashlib
+import json
+import os
+import uuid
+from compressed_io import GZIP_EXTENSION, atomic_writer, durable_writer, open_text
+
+# Чат хранится в NDJSON: одна строка — один комментарий в формате parse_comment
+CHAT_FILE_EXTENSION = ".ndjson"
+FSYNC_EVERY_PAGES = int(os.getenv("CHAT_FSYNC_EVERY_PAGES", 20))  # Как часто сбрасывать файл на диск
+
+# Готовый чат хранится один раз, под именем из хэша содержимого: {sha256}.ndjson.gz.
+# Ссылка на него — {"sha256", "file", "messages"}: в {video_id}.ref.json рядом с чатом и в записи трансляции.
+CHAT_BLOB_EXTENSION = CHAT_FILE_EXTENSION + GZIP_EXTENSION
+CHAT_REF_EXTENSION = ".ref.json"
+
+
+class ChatFile:
+    """
+    Чат в NDJSON-файле, читаемый лениво.
+
+    Каждая итерация заново открывает файл и отдаёт комментарии по одному, поэтому объект можно
+    передавать туда, где раньше был список комментариев (повторный проход тоже работает).
+    Файл .gz распаковывается потоково.
+    """
+
+    def __init__(self, path, ref=None):
+        self.path = path
+        self.ref = ref  # Ссылка на чат, если файл — сохранённый по хэшу чат (write_chat_blob)
+
+    def __iter__(self):
+        with open_text(self.path) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def __bool__(self):
+        # Размер сжатого файла не говорит, пуст ли чат, поэтому проверяем первую строку
+        if not os.path.exists(self.path):
+            return False
+        with open_text(self.path) as f:
+            return any(line.strip() for line in f)
+
+    def __repr__(self):
+        return f"ChatFile({self.path!r})"
+
+
+class ChatFileWriter:
+    """Дописывает комментарии в NDJSON-файл и периодически делает fsync."""
+
+    def __init__(self, path, fsync_every_pages=FSYNC_EVERY_PAGES):
+        self.path = path
+        self.fsync_every_pages = fsync_every_pages
+        self._file = open(path, "a", encoding="utf-8")
+        self._pages = 0
+        self.written = 0
+
+    def write_page(self, comments):
+        """Записывает страницу комментариев; раз в fsync_every_pages страниц сбрасывает данные на диск."""
+        for comment in comments:
+            self._file.write(json.dumps(comment, ensure_ascii=False, separators=(",", ":")))
+            self._file.write("\n")
+        self.written += len(comments)
+        self._pages += 1
+        if self._pages % self.fsync_every_pages == 0:
+            self.sync()
+
+    def sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_chat_blob(directory, lines):
+    """
+    Сохраняет чат в каталог под именем из sha256 содержимого (несжатого NDJSON).
+
+    Если такой чат уже сохранён, новый файл не публикуется: одинаковые чаты хранятся один раз.
+
+    Args:
+        directory (str): Каталог чатов.
+        lines (iterable): Строки NDJSON в байтах, каждая с завершающим переводом строки.
+
+    Returns:
+        dict: Ссылка на чат {"sha256", "file", "messages"}.
+    """
+    tmp_path = os.path.join(directory, f"{uuid.uuid4().hex}{CHAT_BLOB_EXTENSION}.tmp")
+    digest = hashlib.sha256()
+    messages = 0
+    try:
+        with durable_writer(tmp_path, compress=True, text=False) as out:
+            for line in lines:
+                digest.update(line)
+                out.write(line)
+                messages += 1
+
+        sha256 = digest.hexdigest()
+        blob_path = os.path.join(directory, f"{sha256}{CHAT_BLOB_EXTENSION}")
+        if os.path.exists(blob_path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, blob_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return {"sha256": sha256, "file": os.path.basename(blob_path), "messages": messages}
+
+
+def encode_comments(comments):
+    """Строки NDJSON для комментариев (в том же виде, в каком их пишет ChatFileWriter)."""
+    for comment in comments or []:
+        yield (json.dumps(comment, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def write_chat_ref(path, ref):
+    """Атомарно записывает ссылку на сохранённый чат."""
+    with atomic_writer(path) as f:
+        json.dump(ref, f)
+
+
+def read_chat_ref(path):
+    """Читает ссылку на сохранённый чат (None, если файла нет или он повреждён)."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            ref = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return ref if isinstance(ref, dict) and ref.get("file") else None
+
+
+def compact_id(comment_id):
+    """Компактный ключ id комментария для множества дедупликации (16 байт для UUID)."""
+    try:
+        return uuid.UUID(comment_id).bytes
+    except (ValueError, AttributeError, TypeError):
+        return comment_id
+
+
+def read_resume_state(path):
+    """
+    Читает частично загруженный файл: множество компактных id и последнее смещение.
+
+    Обрезанная последняя строка (файл оборвался при сбое) отбрасывается.
+
+    Returns:
+        tuple: (множество id, последнее content_offset_seconds или None)
+    """
+    seen_ids = set()
+    last_offset = None
+    valid_size = 0
+
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                comment = json.loads(line)
+            except ValueError:
+                break
+            valid_size += len(line)
+            seen_ids.add(compact_id(comment["_id"]))
+            last_offset = comment["content_offset_seconds"]
+
+    if valid_size != os.path.getsize(path):
+        with open(path, "r+b") as f:
+            f.truncate(valid_size)
+
+    return seen_ids, last_offset
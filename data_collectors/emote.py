@@ -1,104 +1,236 @@
 import requests
-from logging_config import setup_logger
 import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from data_collectors import http_client
+from logging_config import setup_logger
 
 # Настройка логирования
 logger = setup_logger("emote")
 
-def fetch_ffz_emotes(channel_id):
-    """Получает эмоции FrankerFaceZ для указанного канала."""
-    url = f"https://api.frankerfacez.com/v1/room/id/{channel_id}"
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
+# Загрузим .env.local для локальной разработки
+if os.environ.get('FLASK_ENV') == 'development':
+    load_dotenv('.env.local')
+else:
+    load_dotenv('.env.docker')
+
+PROJECT_ROOT = os.getenv('PROJECT_ROOT')
+EMOTE_CACHE_DIR = os.path.join(PROJECT_ROOT or ".", 'cache', 'emotes')
+EMOTE_CACHE_TTL = int(os.getenv("EMOTE_CACHE_TTL", 6 * 3600))  # Сколько секунд набор эмоций считается свежим
+EMOTE_CACHE_MAX_AGE_DAYS = float(os.getenv("EMOTE_CACHE_MAX_AGE_DAYS", 30))  # Кэш канала старше — удаляется, дней
+EMOTE_CACHE_TMP_MAX_AGE = 3600  # Временные файлы старше (запись оборвалась), с
+
+
+def _parse_ffz(data):
+    emotes = []
+    for set_data in data.get("sets", {}).values():
+        for emote in set_data.get("emoticons", []):
+            emotes.append({
+                "name": emote["name"],
+                "url": emote["urls"].get("1", list(emote["urls"].values())[0])
+            })
+    return emotes
 
-        emotes = []
-        for set_data in data.get("sets", {}).values():
-            for emote in set_data.get("emoticons", []):
-                emotes.append({
-                    "name": emote["name"],
-                    "url": emote["urls"].get("1", list(emote["urls"].values())[0])
-                })
 
-        logger.info(f"✅ Найдено {len(emotes)} эмоций FFZ для канала {channel_id}.")
-        return emotes
+def _parse_bttv(data):
+    return [
+        {"name": e["code"], "url": f"https://cdn.betterttv.net/emote/{e['id']}/1x"}
+        for e in data.get("channelEmotes", []) + data.get("sharedEmotes", [])
+    ]
 
-    except requests.exceptions.HTTPError as e:
-        logger.error(f"❌ HTTP ошибка при запросе FFZ: {e}")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"❌ Ошибка сети при запросе FFZ: {e}")
-    except KeyError:
-        logger.warning(f"⚠️ Некорректный ответ API FFZ для {channel_id}.")
 
-    return []
+def _parse_7tv(data):
+    return [
+        {"name": e["name"], "url": f"https://cdn.7tv.app/emote/{e['id']}/1x"}
+        for e in (data.get("emote_set") or {}).get("emotes", [])
+    ]
 
 
-def fetch_bttv_emotes(channel_id):
-    """Получает эмоции BetterTTV для указанного канала."""
-    url = f"https://api.betterttv.net/3/cached/users/twitch/{channel_id}"
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
+# Провайдер -> (название для логов, URL API, разбор ответа)
+PROVIDERS = {
+    "ffz": ("FFZ", "https://api.frankerfacez.com/v1/room/id/{channel_id}", _parse_ffz),
+    "bttv": ("BTTV", "https://api.betterttv.net/3/cached/users/twitch/{channel_id}", _parse_bttv),
+    "7tv": ("7TV", "https://7tv.io/v3/users/twitch/{channel_id}", _parse_7tv),
+}
 
-        emotes = [
-            {"name": e["code"], "url": f"https://cdn.betterttv.net/emote/{e['id']}/1x"}
-            for e in data.get("channelEmotes", []) + data.get("sharedEmotes", [])
-        ]
 
-        logger.info(f"✅ Найдено {len(emotes)} эмоций BTTV для канала {channel_id}.")
-        return emotes
+def fetch_provider_emotes(provider, channel_id, cached=None):
+    """
+    Получает эмоции провайдера для канала.
 
-    except requests.exceptions.HTTPError as e:
-        logger.error(f"❌ HTTP ошибка при запросе BTTV: {e}")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"❌ Ошибка сети при запросе BTTV: {e}")
+    Если передана запись кэша с ETag/Last-Modified, запрос условный: ответ 304 продлевает кэш
+    без повторной загрузки набора. 404 означает, что у канала нет эмоций провайдера.
 
-    return []
+    Returns:
+        dict: Запись кэша {"emotes", "fetched_at", "etag", "last_modified"} или None при ошибке.
+    """
+    name, url_template, parse = PROVIDERS[provider]
+    url = url_template.format(channel_id=channel_id)
 
+    headers = {}
+    if cached and cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    if cached and cached.get("last_modified"):
+        headers["If-Modified-Since"] = cached["last_modified"]
 
-def fetch_7tv_emotes(channel_id):
-    """Получает эмоции 7TV для указанного канала."""
-    url = f"https://7tv.io/v3/users/twitch/{channel_id}"
+    started = time.monotonic()
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
-
-        emotes = [
-            {"name": e["name"], "url": f"https://cdn.7tv.app/emote/{e['id']}/1x"}
-            for e in data.get("emote_set", {}).get("emotes", [])
-        ]
-
-        logger.info(f"✅ Найдено {len(emotes)} эмоций 7TV для канала {channel_id}.")
-        return emotes
+        response = http_client.get(url, headers=headers)
+
+        if response.status_code == 304 and cached:
+            logger.info(f"♻️ Эмоции {name} для канала {channel_id} не изменились "
+                        f"({time.monotonic() - started:.2f} с).")
+            return {**cached, "fetched_at": time.time()}
+
+        if response.status_code == 404:
+            logger.warning(f"⚠️ У канала {channel_id} нет эмоций {name}.")
+            emotes = []
+        else:
+            response.raise_for_status()
+            emotes = parse(response.json())
+
+        logger.info(f"✅ Найдено {len(emotes)} эмоций {name} для канала {channel_id} "
+                    f"({time.monotonic() - started:.2f} с).")
+        return {
+            "emotes": emotes,
+            "fetched_at": time.time(),
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
 
     except requests.exceptions.HTTPError as e:
-        logger.error(f"❌ HTTP ошибка при запросе 7TV: {e}")
+        logger.error(f"❌ HTTP ошибка при запросе {name}: {e}")
     except requests.exceptions.RequestException as e:
-        logger.error(f"❌ Ошибка сети при запросе 7TV: {e}")
+        logger.error(f"❌ Ошибка сети при запросе {name}: {e}")
+    except (KeyError, ValueError):
+        logger.warning(f"⚠️ Некорректный ответ API {name} для {channel_id}.")
 
-    return []
+    return None
 
 
-def load_emotes(channel_id):
-    """Загружает все эмоции (FFZ, BTTV, 7TV) для указанного канала."""
-    emotes = {"ffz": [], "bttv": [], "7tv": []}
+def fetch_ffz_emotes(channel_id):
+    """Получает эмоции FrankerFaceZ для указанного канала."""
+    return (fetch_provider_emotes("ffz", channel_id) or {}).get("emotes", [])
+
+
+def fetch_bttv_emotes(channel_id):
+    """Получает эмоции BetterTTV для указанного канала."""
+    return (fetch_provider_emotes("bttv", channel_id) or {}).get("emotes", [])
 
-    logger.info(f"🚀 Начало загрузки эмоций для канала {channel_id}...")
 
-    emotes["ffz"] = fetch_ffz_emotes(channel_id)
-    if not emotes["ffz"]:
-        logger.warning(f"⚠️ Эмоции FFZ для канала {channel_id} не найдены.")
+def fetch_7tv_emotes(channel_id):
+    """Получает эмоции 7TV для указанного канала."""
+    return (fetch_provider_emotes("7tv", channel_id) or {}).get("emotes", [])
+
+
+def _cache_path(channel_id):
+    return os.path.join(EMOTE_CACHE_DIR, f"{channel_id}.json")
 
-    emotes["bttv"] = fetch_bttv_emotes(channel_id)
-    if not emotes["bttv"]:
-        logger.warning(f"⚠️ Эмоции BTTV для канала {channel_id} не найдены.")
 
-    emotes["7tv"] = fetch_7tv_emotes(channel_id)
-    if not emotes["7tv"]:
-        logger.warning(f"⚠️ Эмоции 7TV для канала {channel_id} не найдены.")
+def load_cached_emotes(channel_id):
+    """Читает кэш эмоций канала: провайдер -> запись кэша."""
+    try:
+        with open(_cache_path(channel_id), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+
+def save_cached_emotes(channel_id, entries):
+    """Атомарно сохраняет кэш эмоций канала."""
+    os.makedirs(EMOTE_CACHE_DIR, exist_ok=True)
+    path = _cache_path(channel_id)
+    # Уникальный временный файл: кэш одного канала могут сохранять несколько потоков одного процесса
+    fd, tmp_path = tempfile.mkstemp(dir=EMOTE_CACHE_DIR, prefix=f"{channel_id}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except IOError as e:
+        logger.error(f"❌ Ошибка при сохранении кэша эмоций: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def prune_emote_cache(max_age_days=EMOTE_CACHE_MAX_AGE_DAYS):
+    """
+    Удаляет кэш эмоций каналов, который не обновлялся дольше max_age_days, и оставшиеся от оборванной
+    записи временные файлы.
+
+    Кэш канала перезаписывается при каждой ревалидации (раз в EMOTE_CACHE_TTL, пока канал анализируют),
+    поэтому по времени изменения файла удаляются только каналы, которые давно не запрашивались.
+
+    Returns:
+        int: Количество удалённых файлов.
+    """
+    if not os.path.isdir(EMOTE_CACHE_DIR):
+        return 0
+
+    now = time.time()
+    deleted = 0
+    with os.scandir(EMOTE_CACHE_DIR) as entries:
+        for entry in entries:
+            if not entry.is_file():
+                continue
+            max_age = EMOTE_CACHE_TMP_MAX_AGE if entry.name.endswith(".tmp") else max_age_days * 86400
+            try:
+                if now - entry.stat().st_mtime > max_age:
+                    os.remove(entry.path)
+                    deleted += 1
+            except OSError as e:
+                logger.warning(f"⚠️ Не удалось удалить кэш эмоций {entry.path}: {e}")
+
+    if deleted:
+        logger.info(f"🗑 Удалено файлов кэша эмоций: {deleted}")
+    return deleted
+
+
+def _load_provider(provider, channel_id, cached, ttl):
+    """Возвращает запись провайдера из кэша или загружает/ревалидирует её."""
+    if cached and time.time() - cached.get("fetched_at", 0) < ttl:
+        logger.info(f"📦 Кэш эмоций {PROVIDERS[provider][0]} для канала {channel_id}: попадание.")
+        return cached
+
+    logger.info(f"📦 Кэш эмоций {PROVIDERS[provider][0]} для канала {channel_id}: "
+                f"{'устарел' if cached else 'промах'}.")
+    entry = fetch_provider_emotes(provider, channel_id, cached)
+    if entry is None and cached:
+        logger.warning(f"⚠️ Используем устаревший кэш эмоций {PROVIDERS[provider][0]} для канала {channel_id}.")
+        return cached
+    return entry
+
+
+def load_emotes(channel_id, ttl=None):
+    """
+    Загружает все эмоции (FFZ, BTTV, 7TV) для указанного канала.
+
+    Провайдеры опрашиваются параллельно. Наборы кэшируются на диске на ttl секунд (по умолчанию
+    EMOTE_CACHE_TTL), после чего ревалидируются условным запросом.
+    """
+    ttl = EMOTE_CACHE_TTL if ttl is None else ttl
+    logger.info(f"🚀 Начало загрузки эмоций для канала {channel_id}...")
+
+    cached = load_cached_emotes(channel_id)
+    with ThreadPoolExecutor(max_workers=len(PROVIDERS)) as executor:
+        futures = {
+            provider: executor.submit(_load_provider, provider, channel_id, cached.get(provider), ttl)
+            for provider in PROVIDERS
+        }
+        entries = {provider: future.result() for provider, future in futures.items()}
+
+    emotes = {}
+    for provider, entry in entries.items():
+        emotes[provider] = entry["emotes"] if entry else []
+        if not emotes[provider]:
+            logger.warning(f"⚠️ Эмоции {PROVIDERS[provider][0]} для канала {channel_id} не найдены.")
+
+    # Кэшируем только успешно полученные наборы
+    fresh = {provider: entry for provider, entry in entries.items() if entry}
+    if fresh and fresh != cached:
+        save_cached_emotes(channel_id, {**cached, **fresh})
 
     logger.info(f"🎉 Загрузка эмоций завершена: FFZ={len(emotes['ffz'])}, BTTV={len(emotes['bttv'])}, 7TV={len(emotes['7tv'])}.")
     return emotes
@@ -1,9 +1,14 @@
 import requests
+import json
 import os
 import re
+import threading
+import time
 from dotenv import load_dotenv
 from logging_config import setup_logger
-from data_collectors.helix_validator import get_helix_token
+from redis_client import acquire_lock, get_redis, release_lock
+from data_collectors import http_client
+from data_collectors.helix_validator import get_token_manager
 
 # Логгер
 logger = setup_logger("helix_api")
@@ -19,11 +24,15 @@ CLIENT_ID = os.getenv("TWITCH_CLIENT_ID")
 CLIENT_SECRET = os.getenv("TWITCH_CLIENT_SECRET")
 BASE_URL = 'https://api.twitch.tv/helix'
 
-# Получаем токен через helix_validator
-TOKEN = get_helix_token(CLIENT_ID, CLIENT_SECRET)
-if not TOKEN:
-    logger.error("❌ Не удалось получить токен доступа. Завершение работы.")
-    exit(1)
+HELIX_CACHE_TTL = int(os.getenv("HELIX_CACHE_TTL", 300))  # Время жизни ответа Helix в кэше, с
+HELIX_NEGATIVE_CACHE_TTL = int(os.getenv("HELIX_NEGATIVE_CACHE_TTL", 60))  # Для пустых ответов (неизвестный id), с
+HELIX_LOCK_TIMEOUT = float(os.getenv("HELIX_LOCK_TIMEOUT", 10))  # Ожидание запроса, уже выполняемого другим, с
+CACHE_PREFIX = "helix_cache"
+LOCAL_CACHE_MAX_ENTRIES = 1024
+
+_local_cache = {}  # ключ -> (момент истечения, ответ)
+_inflight = {}  # ключ -> threading.Event запроса, выполняемого в этом процессе
+_cache_lock = threading.Lock()
 
 
 def extract_vod_id(url):
@@ -47,10 +56,10 @@ def extract_vod_id(url):
             return match.group(1)  # Возвращаем найденный vod_id
     return None  # Если ID не найден
 
-def get_headers():
+def get_headers(token):
     """Создает заголовки для запросов к Helix API."""
     return {
-        'Authorization': f'Bearer {TOKEN}',
+        'Authorization': f'Bearer {token}',
         'Client-Id': CLIENT_ID
     }
 def get_streamer_id(vod_id):
@@ -61,24 +70,141 @@ def get_streamer_id(vod_id):
     return None
 
 def make_request(endpoint, params=None):
-    """Выполняет запрос к API Twitch Helix и обрабатывает ошибки."""
+    """
+    Выполняет запрос к API Twitch Helix и обрабатывает ошибки.
+
+    Токен берётся у менеджера токена при первом запросе; если Helix отклонил токен (401),
+    он сбрасывается и запрос один раз повторяется с новым.
+    """
+    manager = get_token_manager()
+    for attempt in range(2):
+        token = manager.get_token()
+        if not token:
+            logger.error("❌ Не удалось получить токен доступа.")
+            return None
+        try:
+            response = http_client.get(f'{BASE_URL}{endpoint}', headers=get_headers(token), params=params)
+            if response.status_code == 401 and attempt == 0:
+                logger.warning("⚠️ Токен отклонён Helix API, получаем новый.")
+                manager.invalidate(token)
+                continue
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.HTTPError as e:
+            logger.error(f"HTTP ошибка: {e.response.status_code} - {e.response.text}")
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Ошибка сети: {e}")
+        except ValueError:
+            logger.error("Некорректный JSON-ответ.")
+        return None
+
+
+def cached_request(endpoint, params=None, ttl=HELIX_CACHE_TTL, negative_ttl=HELIX_NEGATIVE_CACHE_TTL):
+    """
+    make_request с кэшем ответов: память процесса, затем Redis (общий для веб-процесса и воркеров).
+
+    Ответ с пустым "data" (неизвестный id) кэшируется на negative_ttl. Ошибки запроса не кэшируются.
+    Одновременные запросы с одним ключом объединяются: в процессе ждут первый поток, между процессами —
+    держателя блокировки в Redis.
+    """
+    key = f"{CACHE_PREFIX}:{endpoint}:{json.dumps(params or {}, sort_keys=True)}"
+
+    with _cache_lock:
+        entry = _local_cache.get(key)
+        if entry and entry[0] > time.time():
+            return entry[1]
+        event = _inflight.get(key)
+        leader = event is None
+        if leader:
+            event = _inflight[key] = threading.Event()
+
+    if not leader:
+        # Такой же запрос уже выполняется в этом процессе — ждём его результат
+        event.wait(HELIX_LOCK_TIMEOUT)
+        with _cache_lock:
+            entry = _local_cache.get(key)
+        if entry and entry[0] > time.time():
+            return entry[1]
+        return make_request(endpoint, params)
+
     try:
-        response = requests.get(f'{BASE_URL}{endpoint}', headers=get_headers(), params=params)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.HTTPError as e:
-        logger.error(f"HTTP ошибка: {e.response.status_code} - {e.response.text}")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Ошибка сети: {e}")
-    except ValueError:
-        logger.error("Некорректный JSON-ответ.")
-    return None
+        response, expires_in = _shared_request(key, endpoint, params, ttl, negative_ttl)
+        if response is not None:
+            with _cache_lock:
+                if len(_local_cache) >= LOCAL_CACHE_MAX_ENTRIES:
+                    now = time.time()
+                    for stale_key in [k for k, (expires, _) in _local_cache.items() if expires <= now]:
+                        del _local_cache[stale_key]
+                    if len(_local_cache) >= LOCAL_CACHE_MAX_ENTRIES:
+                        _local_cache.clear()
+                _local_cache[key] = (time.time() + expires_in, response)
+        return response
+    finally:
+        with _cache_lock:
+            _inflight.pop(key).set()
+
+
+def _shared_request(key, endpoint, params, ttl, negative_ttl):
+    """
+    Берёт ответ из Redis или выполняет запрос под блокировкой Redis и сохраняет его.
+
+    Если Redis недоступен, запрос выполняется напрямую.
+
+    Returns:
+        tuple: (ответ или None, сколько секунд он ещё актуален)
+    """
+    lock_key = f"{key}:lock"
+    lock_token = None
+    try:
+        client = get_redis()
+        cached, expires_in = _get_shared(client, key)
+        if cached is not None:
+            return cached, expires_in
+
+        lock_token = acquire_lock(client, lock_key, HELIX_LOCK_TIMEOUT)
+        if lock_token is None:
+            # Запрос выполняет другой процесс — ждём, пока ответ появится в Redis
+            deadline = time.monotonic() + HELIX_LOCK_TIMEOUT
+            while time.monotonic() < deadline:
+                time.sleep(0.1)
+                cached, expires_in = _get_shared(client, key)
+                if cached is not None:
+                    return cached, expires_in
+    except Exception as e:
+        logger.warning(f"⚠️ Кэш Helix в Redis недоступен: {e}")
+        client = None
+
+    try:
+        response = make_request(endpoint, params)
+        expires_in = ttl if response and response.get("data") else negative_ttl
+        if client is not None and response is not None:
+            try:
+                client.set(key, json.dumps(response), ex=expires_in)
+            except Exception as e:
+                logger.warning(f"⚠️ Не удалось сохранить ответ Helix в Redis: {e}")
+        return response, expires_in
+    finally:
+        # Блокировка снимается и при исключении в запросе, иначе другие процессы ждали бы её истечения.
+        # Снимает её только владелец: не дождавшийся ответа процесс её не трогает
+        if lock_token is not None:
+            try:
+                release_lock(client, lock_key, lock_token)
+            except Exception as e:
+                logger.warning(f"⚠️ Не удалось снять блокировку запроса Helix в Redis: {e}")
+
+
+def _get_shared(client, key):
+    """Ответ из Redis и оставшийся срок его жизни в секундах, или (None, None)."""
+    cached, expires_in = client.pipeline().get(key).ttl(key).execute()
+    if cached is None:
+        return None, None
+    return json.loads(cached), max(expires_in, 1)
 
 
 def get_user_info(username):
     """Получает информацию о пользователе Twitch по его логину."""
     logger.info(f"🔍 Получаем информацию о пользователе {username}")
-    user_info = make_request('/users', {'login': username})
+    user_info = cached_request('/users', {'login': username})
     if user_info and user_info.get('data'):
         user = user_info['data'][0]
         logger.info(f"👤 Пользователь найден: {user['display_name']} (ID: {user['id']})")
@@ -90,7 +216,7 @@ def get_user_info(username):
 def get_times_stream_info(vod_id):
     """Получает информацию о VOD по его ID."""
     logger.info(f"🔍 Получаем информацию о VOD с ID {vod_id}")
-    vod_info = make_request('/videos', {'id': vod_id})
+    vod_info = cached_request('/videos', {'id': vod_id})
     if vod_info and vod_info.get('data'):
         logger.info(f"📼 Найдено видео: {vod_info['data'][0]['title']}")
         return vod_info['data'][0]
@@ -146,7 +272,11 @@ def get_stream_duration(vod_id):
     if not vod_info or "duration" not in vod_info:
         return None  # Если нет данных, возвращаем None
 
-    duration_str = vod_info["duration"]  # Берём строку длительности
+    return parse_duration(vod_info["duration"])
+
+
+def parse_duration(duration_str):
+    """Переводит длительность Helix вида "3h8m33s" в секунды (None, если формат не подошёл)."""
     match = re.match(r'(?:(\d+)h)?(?:(\d+)m)?(?:(\d+)s)?', duration_str)
 
     if not match:
@@ -1,7 +1,13 @@
 import requests
+import json
 import os
+import threading
+import time
 from dotenv import load_dotenv
 from logging_config import setup_logger
+from redis.exceptions import WatchError
+from redis_client import acquire_lock, get_redis, release_lock
+from data_collectors import http_client
 
 # Логгер
 logger = setup_logger("helix_validator")
@@ -19,52 +25,77 @@ CLIENT_SECRET = os.getenv("TWITCH_CLIENT_SECRET")
 
 TOKEN_FILE = os.path.join(PROJECT_ROOT, 'config/.helix_token')
 VALIDATION_URL = "https://id.twitch.tv/oauth2/validate"
+TOKEN_URL = "https://id.twitch.tv/oauth2/token"
 
+TOKEN_REFRESH_MARGIN = int(os.getenv("HELIX_TOKEN_REFRESH_MARGIN", 3600))  # Обновлять токен заранее, за столько секунд
+TOKEN_LOCK_TIMEOUT = float(os.getenv("HELIX_TOKEN_LOCK_TIMEOUT", 15))  # Ожидание токена, получаемого другим процессом, с
+TOKEN_REDIS_KEY = "helix_token"
 
-def save_token_to_file(token):
-    """Сохраняет токен в файл."""
+
+def save_token_to_file(token, expires_at=None):
+    """Сохраняет токен и момент его истечения в файл."""
     try:
         with open(TOKEN_FILE, "w") as file:
-            file.write(token)
+            json.dump({"access_token": token, "expires_at": expires_at}, file)
         logger.info(f"💾 Токен сохранён в файл {TOKEN_FILE}")
     except IOError as e:
         logger.error(f"❌ Ошибка при сохранении токена в файл: {e}")
 
 
 def load_token_from_file():
-    """Загружает токен из файла, если он существует."""
+    """
+    Загружает токен из файла, если он существует.
+
+    Returns:
+        tuple: (токен или None, момент истечения или None — для файла старого формата с одним токеном)
+    """
     if os.path.exists(TOKEN_FILE):
         try:
             with open(TOKEN_FILE, "r") as file:
-                return file.read().strip()
+                content = file.read().strip()
         except IOError as e:
             logger.error(f"❌ Ошибка при загрузке токена из файла: {e}")
-    return None
+            return None, None
+        try:
+            data = json.loads(content)
+            return data.get("access_token"), data.get("expires_at")
+        except ValueError:
+            return content or None, None
+    return None, None
 
 
-def is_token_valid(token):
-    """Проверяет валидность токена с помощью Helix API."""
+def validate_token(token):
+    """
+    Проверяет валидность токена с помощью Helix API.
+
+    Returns:
+        int | None: Сколько секунд токен ещё действует, или None, если он недействителен.
+    """
     headers = {"Authorization": f"Bearer {token}"}
     try:
-        response = requests.get(VALIDATION_URL, headers=headers)
+        response = http_client.get(VALIDATION_URL, headers=headers)
         if response.status_code == 200:
             logger.info("✅ Токен валиден")
-            return True
+            return response.json().get("expires_in", 0)
         logger.warning(f"⚠️ Токен недействителен: {response.status_code} - {response.json().get('message', 'Нет сообщения')}")
-        return False
-    except requests.RequestException as e:
+        return None
+    except (requests.RequestException, ValueError) as e:
         logger.error(f"❌ Ошибка проверки токена: {e}")
-        return False
+        return None
 
 
-def get_helix_token(client_id, client_secret):
-    """Получает Bearer токен. Если есть валидный токен в файле — использует его."""
-    existing_token = load_token_from_file()
-    if existing_token and is_token_valid(existing_token):
-        logger.info("✅ Используется сохранённый и валидный токен")
-        return existing_token
+def is_token_valid(token):
+    """Проверяет валидность токена с помощью Helix API."""
+    return validate_token(token) is not None
 
-    url = "https://id.twitch.tv/oauth2/token"
+
+def request_new_token(client_id, client_secret):
+    """
+    Запрашивает новый токен приложения (client credentials).
+
+    Returns:
+        tuple: (токен, момент истечения) или (None, None) при ошибке.
+    """
     payload = {
         'client_id': client_id,
         'client_secret': client_secret,
@@ -72,20 +103,155 @@ def get_helix_token(client_id, client_secret):
     }
 
     try:
-        response = requests.post(url, data=payload)
+        response = http_client.post(TOKEN_URL, data=payload)
         response.raise_for_status()
         data = response.json()
         token = data.get('access_token')
 
         if token:
             logger.info("✅ Новый токен успешно получен")
-            save_token_to_file(token)
-            return token
+            return token, time.time() + data.get('expires_in', 0)
         logger.error("❌ Ошибка: Токен не найден в ответе")
-        return None
-    except requests.RequestException as e:
+        return None, None
+    except (requests.RequestException, ValueError) as e:
         logger.error(f"❌ Ошибка при получении токена: {e}")
-        return None
+        return None, None
+
+
+class HelixTokenManager:
+    """
+    Токен Helix, получаемый при первом обращении и обновляемый заранее до истечения.
+
+    Срок действия (expires_in) хранится вместе с токеном в Redis и в файле, поэтому процессы
+    не проверяют токен в сети при каждом запуске. Получение нового токена выполняется под
+    блокировкой в Redis: остальные процессы ждут и берут готовый токен из Redis.
+    """
+
+    def __init__(self, client_id, client_secret):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self._token = None
+        self._expires_at = 0
+        self._lock = threading.Lock()
+
+    def get_token(self):
+        """Возвращает действующий токен (None, если получить его не удалось)."""
+        if self._is_fresh(self._expires_at) and self._token:
+            return self._token
+
+        with self._lock:
+            if not (self._is_fresh(self._expires_at) and self._token):
+                self._token, self._expires_at = self._acquire()
+            return self._token
+
+    def invalidate(self, token):
+        """Сбрасывает токен, отклонённый Helix API (401), чтобы следующий запрос получил новый."""
+        with self._lock:
+            if self._token == token:
+                self._token, self._expires_at = None, 0
+            if load_token_from_file()[0] == token:
+                save_token_to_file("", None)
+        try:
+            # Сравнение и удаление в транзакции (WATCH/MULTI), как в release_lock: токен, который другой
+            # процесс успел обновить между чтением и удалением, не удаляется
+            with get_redis().pipeline() as pipe:
+                pipe.watch(TOKEN_REDIS_KEY)
+                shared = pipe.get(TOKEN_REDIS_KEY)
+                if shared and json.loads(shared)["access_token"] == token:
+                    pipe.multi()
+                    pipe.delete(TOKEN_REDIS_KEY)
+                    pipe.execute()
+                else:
+                    pipe.unwatch()
+        except WatchError:
+            logger.info("🔄 Токен в Redis уже обновлён другим процессом.")
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось сбросить токен в Redis: {e}")
+
+    @staticmethod
+    def _is_fresh(expires_at):
+        return bool(expires_at) and time.time() < expires_at - TOKEN_REFRESH_MARGIN
+
+    def _acquire(self):
+        """Берёт токен из Redis или получает его под блокировкой Redis."""
+        try:
+            client = get_redis()
+            token, expires_at = self._load_shared(client)
+            if token:
+                return token, expires_at
+
+            lock_key = f"{TOKEN_REDIS_KEY}:lock"
+            lock_token = acquire_lock(client, lock_key, TOKEN_LOCK_TIMEOUT)
+            if lock_token is None:
+                # Токен получает другой процесс — ждём его в Redis
+                deadline = time.monotonic() + TOKEN_LOCK_TIMEOUT
+                while time.monotonic() < deadline:
+                    time.sleep(0.2)
+                    token, expires_at = self._load_shared(client)
+                    if token:
+                        return token, expires_at
+                # Не дождались: получаем токен сами, но чужую блокировку не трогаем
+                return self._publish(client, *self._load_or_request())
+
+            try:
+                return self._publish(client, *self._load_or_request())
+            finally:
+                release_lock(client, lock_key, lock_token)
+        except Exception as e:
+            # Без Redis токен получается локально, как раньше
+            logger.warning(f"⚠️ Redis недоступен для общего токена Helix: {e}")
+            return self._load_or_request()
+
+    @staticmethod
+    def _publish(client, token, expires_at):
+        """Сохраняет полученный токен в Redis для остальных процессов."""
+        if token:
+            client.set(TOKEN_REDIS_KEY, json.dumps({"access_token": token, "expires_at": expires_at}),
+                       ex=max(int(expires_at - time.time()), 1))
+        return token, expires_at
+
+    def _load_shared(self, client):
+        shared = client.get(TOKEN_REDIS_KEY)
+        if shared:
+            data = json.loads(shared)
+            if self._is_fresh(data["expires_at"]):
+                return data["access_token"], data["expires_at"]
+        return None, None
+
+    def _load_or_request(self):
+        """Токен из файла (проверяется в сети только если срок неизвестен) или новый токен."""
+        token, expires_at = load_token_from_file()
+        if token and expires_at is None:
+            expires_in = validate_token(token)
+            if expires_in is not None:
+                expires_at = time.time() + expires_in
+                save_token_to_file(token, expires_at)
+        if token and self._is_fresh(expires_at):
+            logger.info("✅ Используется сохранённый и валидный токен")
+            return token, expires_at
+
+        token, expires_at = request_new_token(self.client_id, self.client_secret)
+        if token:
+            save_token_to_file(token, expires_at)
+        return token, expires_at
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_token_manager():
+    """Возвращает общий менеджер токена процесса (создаётся без сетевых запросов)."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = HelixTokenManager(CLIENT_ID, CLIENT_SECRET)
+        return _manager
+
+
+def get_helix_token(client_id, client_secret):
+    """Получает Bearer токен. Если есть действующий токен в Redis или в файле — использует его."""
+    return HelixTokenManager(client_id, client_secret).get_token()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,150 @@
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from logging_config import setup_logger
+
+# Логгер
+logger = setup_logger("http_client")
+
+# Загрузка переменных окружения
+# Загрузим .env.local для локальной разработки
+if os.environ.get('FLASK_ENV') == 'development':
+    load_dotenv('.env.local')
+else:
+    load_dotenv('.env.docker')
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5))  # Таймаут установки соединения, с
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 30))  # Таймаут чтения ответа, с
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", 4))  # Повторы при 429/5xx и сетевых ошибках
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", 0.5))  # Базовая задержка экспоненциального backoff, с
+HTTP_BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", 30))  # Максимальная задержка между повторами, с
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 16))  # Соединений keep-alive на один хост
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_sessions = {}  # хост -> requests.Session со своим пулом соединений
+_sessions_pid = os.getpid()
+_lock = threading.Lock()
+_stats = {}  # хост -> счётчики запросов
+
+
+def get_session(host):
+    """Возвращает сессию с пулом keep-alive соединений для хоста (отдельную в каждом процессе)."""
+    global _sessions_pid
+
+    with _lock:
+        # После fork (prefork-воркер Celery) сокеты родителя не переиспользуем
+        if _sessions_pid != os.getpid():
+            _sessions.clear()
+            _sessions_pid = os.getpid()
+
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[host] = session
+        return session
+
+
+def request(method, url, timeout=None, max_retries=None, **kwargs):
+    """
+    Выполняет HTTP-запрос через общий пул соединений с таймаутами и повторами.
+
+    При 429/5xx и сетевых ошибках запрос повторяется с экспоненциальной задержкой со случайным
+    разбросом; заголовок Retry-After имеет приоритет над расчётной задержкой. Исключения —
+    стандартные requests.exceptions, как при вызове requests напрямую.
+
+    Args:
+        method (str): HTTP-метод.
+        url (str): Адрес запроса.
+        timeout (tuple, optional): (connect, read) таймауты в секундах.
+        max_retries (int, optional): Количество повторов (по умолчанию HTTP_MAX_RETRIES).
+        **kwargs: Параметры requests (headers, params, json, data).
+
+    Returns:
+        requests.Response: Ответ последней попытки.
+    """
+    host = urlsplit(url).netloc
+    session = get_session(host)
+    timeout = timeout or (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+    max_retries = HTTP_MAX_RETRIES if max_retries is None else max_retries
+
+    attempt = 0
+    while True:
+        started = time.monotonic()
+        try:
+            response = session.request(method, url, timeout=timeout, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            _record(host, time.monotonic() - started, error=True)
+            if attempt >= max_retries:
+                raise
+            delay = _backoff(attempt)
+            logger.warning(f"⚠️ {method} {host}: {e}. Повтор через {delay:.1f} с ({attempt + 1}/{max_retries}).")
+        else:
+            _record(host, time.monotonic() - started, error=response.status_code >= 400)
+            if response.status_code not in RETRY_STATUSES or attempt >= max_retries:
+                return response
+            delay = _retry_after(response)
+            if delay is None:
+                delay = _backoff(attempt)
+            logger.warning(f"⚠️ {method} {host}: HTTP {response.status_code}. "
+                           f"Повтор через {delay:.1f} с ({attempt + 1}/{max_retries}).")
+
+        with _lock:
+            _stats[host]["retries"] += 1
+        time.sleep(delay)
+        attempt += 1
+
+
+def get(url, **kwargs):
+    """GET через общий клиент."""
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    """POST через общий клиент."""
+    return request("POST", url, **kwargs)
+
+
+def _backoff(attempt):
+    """Экспоненциальная задержка с полным случайным разбросом."""
+    return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * 2 ** attempt))
+
+
+def _retry_after(response):
+    """Разбирает Retry-After (секунды или HTTP-дата), возвращает задержку или None."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        delay = float(value)
+    except ValueError:
+        try:
+            delay = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(delay, 0.0), HTTP_BACKOFF_MAX)
+
+
+def _record(host, elapsed, error=False):
+    with _lock:
+        stats = _stats.setdefault(host, {"requests": 0, "retries": 0, "errors": 0, "seconds": 0.0})
+        stats["requests"] += 1
+        stats["seconds"] += elapsed
+        if error:
+            stats["errors"] += 1
+
+
+def get_http_stats():
+    """Возвращает счётчики запросов и суммарное время по каждому хосту (в текущем процессе)."""
+    with _lock:
+        return {host: {**stats, "seconds": round(stats["seconds"], 3)} for host, stats in _stats.items()}
@@ -1,45 +1,97 @@
+import math
+import os
 from data_processors.stream_compose import get_chat_data
-from data_analytic.analyse import analyze_chat_activity
-from data_analytic.top_chatters import get_top_chatters
-from data_analytic.copypasta import get_pastas_for_stream
-from data_analytic.filter import filter_messages_by_keywords
-from data_analytic.emotes import analyze_emotes
+from data_analytic.engine import merge_metric_partials, plan_message_shards, run_metrics, run_metrics_partial
+
+# Анализ по шардам (map-reduce в Celery): чат делится на диапазоны по времени, шарды считаются
+# параллельно разными воркерами, результаты складываются. Размер шарда подбирается по числу сообщений.
+ANALYSIS_SHARD_MIN_MESSAGES = int(os.getenv("ANALYSIS_SHARD_MIN_MESSAGES", 500_000))  # С какого размера чата делить (0 — никогда)
+ANALYSIS_SHARD_MESSAGES = int(os.getenv("ANALYSIS_SHARD_MESSAGES", 250_000))  # Желаемое число сообщений в шарде
+ANALYSIS_MAX_SHARDS = int(os.getenv("ANALYSIS_MAX_SHARDS", 16))  # Не больше шардов на один анализ
 
 
 def analyze_stream_data(result):
+    """
+    Считает запрошенные метрики по чату трансляции.
+
+    Все метрики считаются движком за один проход по сообщениям: каждая метрика — зарегистрированный
+    агрегатор (см. data_analytic.engine), а не отдельный цикл по чату.
+    """
+    received_data = result["received_data"]
+
     # Получаем данные о чате
-    chat_data = get_chat_data(result["received_data"]["vod_id"])
+    chat_data = get_chat_data(received_data["vod_id"])
+    if not chat_data:
+        return _not_found(received_data)
+
+    return run_metrics(chat_data, received_data["metrics"], _analysis_params(received_data))
+
+
+def plan_analysis_shards(received_data, force=False):
+    """
+    Решает, считать ли анализ по шардам, и делит чат на них.
 
-    # Настроим параметры аналитики
-    metrics = result["received_data"]["metrics"]
-    top_chatters_count = result["received_data"]["top_chatters_count"]
-    top_pastes_count = result["received_data"]["top_pastes_count"]
-    emoticons_count = result["received_data"]["emoticons_count"]
-    keywords = result["received_data"]["keywords"]
+    Args:
+        received_data (dict): Параметры анализа (как в analyze_stream_data).
+        force (bool): Делить даже чат меньше ANALYSIS_SHARD_MIN_MESSAGES.
 
-    analysis_result = {}
+    Returns:
+        list | None: Шарды (start, stop) или None, если чат считается одним проходом.
+    """
+    chat_data = get_chat_data(received_data["vod_id"])
+    if not chat_data:
+        return None
+    chat = chat_data["chat"]
+    total = len(chat)
+    if not force and (not ANALYSIS_SHARD_MIN_MESSAGES or total < ANALYSIS_SHARD_MIN_MESSAGES):
+        return None
 
-    # Анализируем топ-чатеров, если указано в метриках
-    if "top_chatters" in metrics:
-        analysis_result["top_chatters"] = get_top_chatters(chat_data, top_n=top_chatters_count)
+    shard_count = min(ANALYSIS_MAX_SHARDS, max(2, math.ceil(total / ANALYSIS_SHARD_MESSAGES)))
+    shards = plan_message_shards(chat, shard_count)
+    return shards if len(shards) > 1 else None
 
-    # Анализируем ключевые слова, если указано
-    if "keywords_search" in metrics:
-        analysis_result["keywords_search"] = filter_messages_by_keywords(chat_data, keywords)
 
-    # Анализируем пасты, если указано
-    if "top_pastes" in metrics:
-        analysis_result["top_pastes"] = get_pastas_for_stream(result["received_data"]["vod_id"], top_n=top_pastes_count)
+def analyze_stream_shard(received_data, start, stop):
+    """Считает состояние метрик по шарду [start, stop) (map-шаг анализа по шардам)."""
+    chat_data = get_chat_data(received_data["vod_id"])
+    if not chat_data:
+        return _not_found(received_data)
+    return run_metrics_partial(chat_data, received_data["metrics"], _analysis_params(received_data), start, stop)
 
-    # Анализируем эмотиконы, если указано
-    if "top_emoticons" in metrics:
-        analysis_result["top_emoticons"] = analyze_emotes(chat_data, top_n=emoticons_count)
 
-    # Анализируем активность чата, если указано
-    if "chat_activity" in metrics:
-        analysis_result["chat_activity"] = analyze_chat_activity(chat_data, keywords=keywords)
+def merge_stream_shards(received_data, partials):
+    """
+    Собирает результат анализа из состояний шардов (reduce-шаг); ответ тот же, что у analyze_stream_data.
+
+    Args:
+        partials (list): Результаты analyze_stream_shard в порядке шардов.
+    """
+    for partial in partials:
+        if partial.get("status") == "error":
+            return partial
+
+    chat_data = get_chat_data(received_data["vod_id"])
+    if not chat_data:
+        return _not_found(received_data)
+    return merge_metric_partials(chat_data, received_data["metrics"], _analysis_params(received_data), partials)
+
+
+def _analysis_params(received_data):
+    """Параметры аналитики из параметров запроса."""
+    return {
+        "top_chatters_count": received_data["top_chatters_count"],
+        "top_pastes_count": received_data["top_pastes_count"],
+        "emoticons_count": received_data["emoticons_count"],
+        "keywords": received_data["keywords"],
+        "activity_bucket_seconds": received_data.get("activity_bucket_seconds", 60),
+        "activity_dense": received_data.get("activity_dense", False),
+        # Приближённый топ чаттеров и эмоутов в фиксированной памяти (по умолчанию — точный подсчёт)
+        "heavy_hitters_capacity": received_data.get("heavy_hitters_capacity"),
+    }
+
 
-    return analysis_result
+def _not_found(received_data):
+    return {"status": "error", "message": f"Данные для VOD {received_data['vod_id']} не найдены"}
 
 
 # Пример использования
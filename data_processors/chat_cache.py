@@ -0,0 +1,103 @@
+# data_processors/chat_cache.py
+
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from logging_config import setup_logger
+
+# Логгер
+logger = setup_logger("chat_cache")
+
+# Бюджет кэша в мегабайтах: суммарный размер файлов хранилищ чата (.chat), открытых через mmap.
+# Содержимое не копируется в память процесса — страницы читаются из page cache ОС по мере обращения
+# и общие у процессов, открывших тот же файл, — поэтому это верхняя оценка отображённой памяти,
+# а не размер кучи Python. Индекс токенов и данные записи трансляции (без чата) в бюджет не входят.
+CHAT_CACHE_MAX_MB = float(os.getenv("CHAT_CACHE_MAX_MB", 1024))
+
+_cache = OrderedDict()  # (vod_id, mtime_ns, size, version) -> данные чата
+_cache_size = 0  # Сумма размеров файлов хранилищ в кэше, байт
+_evicted_in_use = weakref.WeakSet()  # Вытесненные хранилища, которые ещё читает выполняющийся анализ
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def get_cached_chat(vod_id, path, loader, version=None):
+    """
+    Возвращает данные чата из LRU-кэша процесса или загружает их через loader(path).
+
+    Ключ кэша включает mtime и размер файла, поэтому перезаписанный файл загружается заново,
+    а устаревшая запись для того же vod_id удаляется.
+
+    Args:
+        vod_id (str): ID трансляции.
+        path (str): Путь к файлу, из которого загружаются данные.
+        loader (callable): Функция загрузки данных по пути.
+        version (optional): Версия остальных данных, которые загружает loader (например, mtime записи
+            трансляции): при её изменении данные загружаются заново.
+
+    Returns:
+        dict: Данные чата (общие для всех вызовов, изменять их нельзя).
+    """
+    global _cache_size
+
+    stat = os.stat(path)
+    key = (vod_id, stat.st_mtime_ns, stat.st_size, version)
+
+    with _lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            _stats["hits"] += 1
+            logger.debug(f"📦 Кэш чата: попадание для VOD {vod_id}")
+            return _cache[key]
+        _stats["misses"] += 1
+
+    logger.info(f"📦 Кэш чата: промах для VOD {vod_id}, загружаем {path}")
+    value = loader(path)
+
+    with _lock:
+        for stale_key in [k for k in _cache if k[0] == vod_id and k != key]:
+            _evict(stale_key)
+
+        if key not in _cache:
+            _cache[key] = value
+            _cache_size += stat.st_size
+
+        while _cache_size > CHAT_CACHE_MAX_MB * 1024 * 1024 and len(_cache) > 1:
+            _evict(next(iter(_cache)))
+            _stats["evictions"] += 1
+
+        return _cache[key]
+
+
+def _evict(key):
+    """
+    Удаляет запись из кэша (вызывается под _lock).
+
+    Открытые файлы записи (хранилище чата, индекс токенов) закрываются, как только на них не остаётся
+    ссылок: сразу, если чат никто не читает, иначе — когда его отпустит последний анализ.
+    """
+    global _cache_size
+    value = _cache.pop(key)
+    _cache_size -= key[2]
+    if isinstance(value, dict):
+        _evicted_in_use.update(item for item in value.values() if hasattr(item, "close"))
+
+
+def clear_chat_cache():
+    """Очищает кэш чатов процесса."""
+    with _lock:
+        for key in list(_cache):
+            _evict(key)
+
+
+def get_chat_cache_stats():
+    """Возвращает счётчики кэша чатов текущего процесса."""
+    with _lock:
+        return {
+            **_stats,
+            "entries": len(_cache),
+            "size_mb": round(_cache_size / (1024 * 1024), 2),
+            "evicted_in_use": len(_evicted_in_use),
+            "max_mb": CHAT_CACHE_MAX_MB,
+        }
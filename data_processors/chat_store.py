@@ -0,0 +1,384 @@
+# data_processors/chat_store.py
+
+import array
+import functools
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+import uuid
+import zlib
+
+# Колоночный формат хранения чата (единственная копия чата VOD: chats/{content_sha256}.chat):
+#   offsets     — int32[n], content_offset_seconds каждого сообщения
+#   commenters  — int32[n], индекс автора в таблице авторов (meta["commenters"])
+#   body_index  — int64[n + 1], границы тел сообщений в буфере body
+#   body        — UTF-8 тела всех сообщений подряд
+#   id_index/ids — то же самое для _id сообщений
+#   extra_index  — int64[n + 1], границы остальных полей сообщения (JSON) в распакованном буфере extra
+#   extra        — блоки zlib по EXTRA_BLOCK_MESSAGES сообщений, extra_blocks — int64[блоков + 1], их границы
+#   meta        — JSON: таблица авторов, данные о трансляции без чата, хэш содержимого
+#
+# Столбцы, которые читает анализ (offsets, commenters, body), и ids хранятся несжатыми: к ним обращаются
+# через mmap напрямую, без распаковки и копирования. Сжимается только extra (created_at, значки, цвет и т.п.) —
+# около половины файла, — он нужен лишь при сборке словарей сообщений и читается блоками подряд.
+# Хэш содержимого считается по несжатым данным и совпадает с хэшем того же чата в версии 1 (extra без сжатия).
+MAGIC = b"CHATCOL1"
+VERSION = 2
+SECTIONS_V1 = ("offsets", "commenters", "body_index", "body", "id_index", "ids", "extra_index", "extra", "meta")
+SECTIONS = ("offsets", "commenters", "body_index", "body", "id_index", "ids", "extra_index", "extra", "extra_blocks",
+            "meta")
+SECTIONS_BY_VERSION = {1: SECTIONS_V1, VERSION: SECTIONS}
+EXTRA_BLOCK_MESSAGES = 1024
+EXTRA_COMPRESSION_LEVEL = 6
+
+HEADER = struct.Struct("<8sIIQ")  # magic, version, количество секций, количество сообщений
+SECTION = struct.Struct("<QQ")  # смещение секции, длина секции
+ALIGNMENT = 8
+COPY_CHUNK_SIZE = 1024 * 1024
+
+STORE_EXTENSION = ".chat"
+
+
+class _BlobColumn:
+    """Накопитель байтового столбца (тела, id, доп. поля) во временном файле с индексом границ."""
+
+    def __init__(self, directory):
+        self.file = tempfile.TemporaryFile(dir=directory)
+        self.index = array.array("q", [0])
+        self.size = 0
+
+    def append(self, data):
+        self.file.write(data)
+        self.size += len(data)
+        self.index.append(self.size)
+
+    def close(self):
+        self.file.close()
+
+
+def _split_message(msg):
+    """Разбивает сообщение на колонки и JSON с остальными полями."""
+    message = msg.get("message") or {}
+    extra = {k: v for k, v in msg.items() if k not in ("_id", "content_offset_seconds", "commenter", "message")}
+    message_extra = {k: v for k, v in message.items() if k != "body"}
+    return (
+        str(msg.get("_id", "")),
+        int(msg.get("content_offset_seconds", 0)),
+        msg.get("commenter") or {},
+        message.get("body", "") or "",
+        [extra, message_extra],
+    )
+
+
+def write_chat_store(path, stream_data):
+    """
+    Сохраняет данные трансляции в колоночном формате.
+
+    Чат читается за один проход, поэтому stream_data["chat"] может быть любым итерируемым объектом
+    (список, генератор, ChatStore). Файл записывается атомарно через временный файл.
+
+    Args:
+        path (str): Путь к итоговому файлу.
+        stream_data (dict): Данные трансляции с ключом "chat".
+
+    Returns:
+        str: Хэш содержимого чата (sha256).
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    offsets = array.array("i")
+    commenters = array.array("i")
+    commenter_table = []
+    commenter_ids = {}
+    bodies, ids, extras = _BlobColumn(directory), _BlobColumn(directory), _BlobColumn(directory)
+
+    try:
+        for msg in stream_data.get("chat") or []:
+            msg_id, offset, commenter, body, extra = _split_message(msg)
+
+            key = (commenter.get("_id"), commenter.get("name"), commenter.get("display_name"))
+            commenter_index = commenter_ids.get(key)
+            if commenter_index is None:
+                commenter_index = commenter_ids[key] = len(commenter_table)
+                commenter_table.append(list(key))
+
+            offsets.append(offset)
+            commenters.append(commenter_index)
+            bodies.append(body.encode("utf-8"))
+            ids.append(msg_id.encode("utf-8"))
+            extras.append(json.dumps(extra, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                digest = _write_sections(out, offsets, commenters, bodies, ids, extras, commenter_table, stream_data)
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    finally:
+        bodies.close()
+        ids.close()
+        extras.close()
+
+    return digest
+
+
+def write_chat_store_blob(directory, chat):
+    """
+    Сохраняет чат в колоночном формате под именем из хэша содержимого: {content_sha256}.chat.
+
+    Данных трансляции в таком хранилище нет (они в записи трансляции), поэтому одинаковые чаты дают
+    один файл; если он уже есть, новый не публикуется.
+
+    Returns:
+        tuple: (путь к хранилищу, content_sha256).
+    """
+    tmp_path = os.path.join(directory, f"{uuid.uuid4().hex}{STORE_EXTENSION}.tmp")
+    try:
+        content_sha256 = write_chat_store(tmp_path, {"chat": chat})
+        path = os.path.join(directory, f"{content_sha256}{STORE_EXTENSION}")
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path, content_sha256
+
+
+def _write_sections(out, offsets, commenters, bodies, ids, extras, commenter_table, stream_data):
+    """Записывает заголовок и секции в открытый файл, возвращает хэш содержимого."""
+    table_size = HEADER.size + SECTION.size * len(SECTIONS)
+    out.write(b"\0" * table_size)
+    digest = hashlib.sha256()
+    positions = []
+
+    def write_bytes(data):
+        _pad(out)
+        start = out.tell()
+        out.write(data)
+        digest.update(data)
+        positions.append((start, len(data)))
+
+    def write_blob(blob):
+        _pad(out)
+        start = out.tell()
+        blob.file.seek(0)
+        while True:
+            chunk = blob.file.read(COPY_CHUNK_SIZE)
+            if not chunk:
+                break
+            out.write(chunk)
+            digest.update(chunk)
+        positions.append((start, blob.size))
+
+    def write_compressed_blob(blob):
+        # Блок — EXTRA_BLOCK_MESSAGES сообщений подряд; хэш считается по несжатым данным
+        _pad(out)
+        start = out.tell()
+        blocks = array.array("q", [0])
+        blob.file.seek(0)
+        for first in range(0, len(blob.index) - 1, EXTRA_BLOCK_MESSAGES):
+            last = min(first + EXTRA_BLOCK_MESSAGES, len(blob.index) - 1)
+            chunk = blob.file.read(blob.index[last] - blob.index[first])
+            digest.update(chunk)
+            out.write(zlib.compress(chunk, EXTRA_COMPRESSION_LEVEL))
+            blocks.append(out.tell() - start)
+        positions.append((start, blocks[-1]))
+        return blocks
+
+    write_bytes(offsets.tobytes())
+    write_bytes(commenters.tobytes())
+    for blob in (bodies, ids):
+        write_bytes(blob.index.tobytes())
+        write_blob(blob)
+    write_bytes(extras.index.tobytes())
+    extra_blocks = write_compressed_blob(extras)
+
+    content_sha256 = digest.hexdigest()
+    write_bytes(extra_blocks.tobytes())
+    meta = {
+        "commenters": commenter_table,
+        "stream": {k: v for k, v in stream_data.items() if k != "chat"},
+        "content_sha256": content_sha256,
+    }
+    write_bytes(json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+
+    out.seek(0)
+    out.write(HEADER.pack(MAGIC, VERSION, len(SECTIONS), len(offsets)))
+    for start, length in positions:
+        out.write(SECTION.pack(start, length))
+    out.seek(0, os.SEEK_END)
+    return content_sha256
+
+
+def _pad(out):
+    remainder = out.tell() % ALIGNMENT
+    if remainder:
+        out.write(b"\0" * (ALIGNMENT - remainder))
+
+
+class ChatStore:
+    """
+    Чат VOD, открытый через mmap.
+
+    Ведёт себя как список сообщений (len, индексация, итерация возвращают словари в исходном формате),
+    а также даёт прямой доступ к колонкам без создания словарей: offsets, commenter_index, iter_bodies().
+    Читает и файлы версии 1, в которых extra не сжат.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"Файл {path} пуст.")
+
+        magic, version, section_count, self._count = HEADER.unpack_from(self._mm, 0)
+        names = SECTIONS_BY_VERSION.get(version) if magic == MAGIC else None
+        if names is None or section_count != len(names):
+            self.close()
+            raise ValueError(f"Файл {path} не является хранилищем чата (поддерживаются версии {list(SECTIONS_BY_VERSION)}).")
+
+        self._view = memoryview(self._mm)
+        sections = {}
+        for i, name in enumerate(names):
+            start, length = SECTION.unpack_from(self._mm, HEADER.size + i * SECTION.size)
+            sections[name] = self._view[start:start + length]
+
+        self.offsets = sections["offsets"].cast("i")
+        self.commenter_index = sections["commenters"].cast("i")
+        self._body_index = sections["body_index"].cast("q")
+        self._body = sections["body"]
+        self._id_index = sections["id_index"].cast("q")
+        self._ids = sections["ids"]
+        self._extra_index = sections["extra_index"].cast("q")
+        self._extra = sections["extra"]
+        self._extra_blocks = sections["extra_blocks"].cast("q") if "extra_blocks" in sections else None
+        self._extra_block = None  # (номер блока, распакованные данные) — последний прочитанный блок
+        self._sections = sections
+
+        meta = json.loads(str(sections["meta"], "utf-8"))
+        self.commenters = meta["commenters"]
+        self.stream = meta["stream"]
+        self.content_sha256 = meta["content_sha256"]
+
+    def __len__(self):
+        return self._count
+
+    @functools.cached_property
+    def commenter_names(self):
+        """Логины авторов по индексу автора (строится при первом обращении)."""
+        return [name for _, name, _ in self.commenters]
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self._message(i)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self._message(i) for i in range(*item.indices(self._count))]
+        if item < 0:
+            item += self._count
+        if not 0 <= item < self._count:
+            raise IndexError("индекс сообщения вне диапазона")
+        return self._message(item)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def body(self, i):
+        """Текст сообщения по индексу."""
+        return str(self._body[self._body_index[i]:self._body_index[i + 1]], "utf-8")
+
+    def message_id(self, i):
+        """_id сообщения по индексу."""
+        return str(self._ids[self._id_index[i]:self._id_index[i + 1]], "utf-8")
+
+    def commenter_name(self, i):
+        """Логин автора сообщения по индексу."""
+        return self.commenter_names[self.commenter_index[i]]
+
+    def iter_bodies(self, start=0, stop=None):
+        """Итерирует тексты сообщений [start, stop) без создания словарей."""
+        body, index = self._body, self._body_index
+        stop = self._count if stop is None else min(stop, self._count)
+        if start >= stop:
+            return
+        begin = index[start]
+        for i in range(start + 1, stop + 1):
+            end = index[i]
+            yield str(body[begin:end], "utf-8")
+            begin = end
+
+    def _extra_bytes(self, i):
+        """JSON с остальными полями сообщения по индексу (распаковывает блок, если его нет в кэше)."""
+        start, end = self._extra_index[i], self._extra_index[i + 1]
+        if self._extra_blocks is None:
+            return self._extra[start:end]
+        block = i // EXTRA_BLOCK_MESSAGES
+        cached = self._extra_block
+        if cached is None or cached[0] != block:
+            data = zlib.decompress(self._extra[self._extra_blocks[block]:self._extra_blocks[block + 1]])
+            # Кортеж заменяется целиком, поэтому потоки, читающие одно хранилище, не видят половину блока
+            cached = self._extra_block = (block, data)
+        base = self._extra_index[block * EXTRA_BLOCK_MESSAGES]
+        return cached[1][start - base:end - base]
+
+    def _message(self, i):
+        commenter_id, name, display_name = self.commenters[self.commenter_index[i]]
+        extra, message_extra = json.loads(str(self._extra_bytes(i), "utf-8"))
+        msg = {"_id": self.message_id(i)}
+        msg.update(extra)
+        msg["content_offset_seconds"] = self.offsets[i]
+        msg["commenter"] = {"display_name": display_name, "_id": commenter_id, "name": name}
+        msg["message"] = {"body": self.body(i), **message_extra}
+        return msg
+
+    def __del__(self):
+        # Хранилище из кэша чатов закрывается, когда его отпускает последний читатель
+        self.close()
+
+    def close(self):
+        """
+        Освобождает mmap и файл.
+
+        Если на колонки ещё ссылаются массивы numpy (np.asarray(store.offsets)), mmap освобождается
+        вместе с последним из них.
+        """
+        try:
+            if getattr(self, "_sections", None):
+                for view in (self.offsets, self.commenter_index, self._body_index, self._id_index, self._extra_index,
+                             self._extra_blocks):
+                    if view is not None:
+                        view.release()
+                for view in self._sections.values():
+                    view.release()
+                self._sections = None
+                self._view.release()
+            if getattr(self, "_mm", None) is not None and not self._mm.closed:
+                self._mm.close()
+        except BufferError:
+            self._sections = None
+        if getattr(self, "_file", None) is not None:
+            self._file.close()
+
+
+def open_chat_store(path):
+    """Открывает колоночное хранилище чата, если файл существует."""
+    if not os.path.exists(path):
+        return None
+    return ChatStore(path)
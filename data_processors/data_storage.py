@@ -1,54 +1,59 @@
 # data_processors/data_storage.py
 
 import os
-import time
 from pathlib import Path
+from dotenv import load_dotenv
+from data_processors.storage_manifest import get_storage_manifest
+from data_processors.stream_record import read_blob_refs
+
+# Загрузим .env.local для локальной разработки
+if os.environ.get('FLASK_ENV') == 'development':
+    load_dotenv('.env.local')
+else:
+    load_dotenv('.env.docker')
+
+STORAGE_MAX_AGE_DAYS = float(os.getenv("STORAGE_MAX_AGE_DAYS", 30))  # Файлы без доступа дольше — удаляются
+STORAGE_MAX_FOLDER_MB = float(os.getenv("STORAGE_MAX_FOLDER_MB", 5000))  # Лимит размера каждой папки
+STORAGE_MAX_FILE_MB = float(os.getenv("STORAGE_MAX_FILE_MB", 500))  # Файлы больше — удаляются
 
 def get_folder_size(path):
-    """Возвращает размер папки в мегабайтах."""
+    """Возвращает размер папки в мегабайтах (полный обход; лимиты проверяются по манифесту)."""
     return sum(f.stat().st_size for f in Path(path).rglob("*") if f.is_file()) / (1024 * 1024)
 
-def delete_old_streams(paths=None, max_age_days=30, max_folder_size_mb=5000, max_size_mb=500):
-    """Удаляет файлы трансляций, если они старше max_age_days, больше max_size_mb или если папка превышает
-    max_folder_size_mb."""
+def delete_old_streams(paths=None, max_age_days=STORAGE_MAX_AGE_DAYS, max_folder_size_mb=STORAGE_MAX_FOLDER_MB,
+                       max_size_mb=STORAGE_MAX_FILE_MB, rescan=False):
+    """Удаляет файлы трансляций, если к ним не обращались дольше max_age_days, они больше max_size_mb или если
+    папка превышает max_folder_size_mb (тогда — самые давно не использованные).
+
+    Удаляются VOD целиком: запись трансляции вместе с хранилищем, индексом и чатом; чат, сохранённый
+    по хэшу, — когда на него не ссылается ни один VOD.
+
+    Размеры и время доступа берутся из манифеста хранилища (data_processors.storage_manifest), каталог
+    обходится только при rescan=True или если он ещё ни разу не сверялся с манифестом."""
     if paths is None:
         paths = ['/tmp/stream_data', '/tmp/chats']
 
-    now = time.time()
-    max_age_seconds = max_age_days * 86400  # 30 дней в секундах
+    manifest = get_storage_manifest()
     deleted = 0
 
     for storage_path in paths:
-        storage_dir = Path(storage_path)
-        if not storage_dir.exists():
+        if not Path(storage_path).exists():
             continue
 
-        # Удаляем файлы, которые слишком старые или большие
-        files = list(storage_dir.iterdir())
-        for file in files:
-            if file.is_file():
-                file_stat = file.stat()
-                file_age = now - file_stat.st_atime  # Время последнего доступа
-                file_size = file_stat.st_size / (1024 * 1024)  # В МБ
-
-                # Удаляем файлы, которые слишком старые или большие
-                if file_age > max_age_seconds or file_size > max_size_mb:
-                    try:
-                        os.remove(file)
-                        deleted += 1
-                        print(f"Удалён файл: {file}")
-                    except Exception as e:
-                        print(f"Не удалось удалить файл {file}: {e}")
-
-        # Проверяем, не превышен ли размер папки
-        while get_folder_size(storage_path) > max_folder_size_mb:
-            oldest_file = min(storage_dir.iterdir(), key=lambda f: f.stat().st_mtime, default=None)
-            if oldest_file and oldest_file.is_file():
-                try:
-                    os.remove(oldest_file)
-                    deleted += 1
-                    print(f"Удалён старый файл: {oldest_file}")
-                except Exception as e:
-                    print(f"Не удалось удалить файл {oldest_file}: {e}")
-
-    return deleted
\ No newline at end of file
+        if rescan or not manifest.is_synced(storage_path):
+            manifest.sync(storage_path, read_refs=read_blob_refs)
+
+        removed = manifest.evict(
+            storage_path,
+            max_bytes=max_folder_size_mb * 1024 * 1024,
+            max_age_seconds=max_age_days * 86400,
+            max_file_bytes=max_size_mb * 1024 * 1024,
+        )
+        deleted += len(removed)
+
+    return deleted
+
+def storage_over_limit(paths, max_folder_size_mb=STORAGE_MAX_FOLDER_MB):
+    """Превышает ли хотя бы одна папка лимит размера (по манифесту, без обхода каталогов)."""
+    manifest = get_storage_manifest()
+    return any(manifest.total_bytes(path) > max_folder_size_mb * 1024 * 1024 for path in paths)
@@ -0,0 +1,153 @@
+# data_processors/ingest_registry.py
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from logging_config import setup_logger
+from redis_client import get_redis
+
+# Логгер
+logger = setup_logger("ingest_registry")
+
+# Загрузим .env.local для локальной разработки
+if os.environ.get('FLASK_ENV') == 'development':
+    load_dotenv('.env.local')
+else:
+    load_dotenv('.env.docker')
+
+# Реестр сборов в Redis: ingest:{vod_id} -> id задачи save_stream_task, которая собирает этот VOD.
+# Ключ ставится атомарно (SET NX), поэтому один VOD собирает одна задача; остальные запросы получают
+# её id, а задачи, запущенные в обход реестра, ждут её завершения (не дольше INGEST_WAIT_TIMEOUT).
+# Срок ключа короткий: выполняющийся сбор продлевает его из фонового потока (ingest_heartbeat), поэтому
+# после падения воркера VOD освобождается через INGEST_LOCK_TTL, а не по окончании максимального сбора.
+KEY_PREFIX = "ingest"
+INGEST_LOCK_TTL = int(os.getenv("INGEST_LOCK_TTL", 60))  # Срок регистрации без продления, с
+INGEST_HEARTBEAT_INTERVAL = INGEST_LOCK_TTL / 3  # Как часто выполняющийся сбор продлевает регистрацию, с
+INGEST_QUEUED_TTL = int(os.getenv("INGEST_QUEUED_TTL", 15 * 60))  # Срок регистрации задачи, ждущей в очереди, с
+INGEST_WAIT_TIMEOUT = int(os.getenv("INGEST_WAIT_TIMEOUT", 30 * 60))  # Сколько ждать чужой сбор того же VOD, с
+INGEST_POLL_INTERVAL = 1.0
+
+
+def get_ingest_key(vod_id):
+    return f"{KEY_PREFIX}:{vod_id}"
+
+
+def claim_ingest(vod_id, task_id, ttl=INGEST_LOCK_TTL):
+    """
+    Регистрирует задачу как сборщик VOD, если VOD ещё никто не собирает.
+
+    Args:
+        vod_id (str): ID VOD.
+        task_id (str): ID задачи сбора.
+        ttl (int): Срок регистрации, с (INGEST_QUEUED_TTL — для задачи, которая ещё ждёт в очереди).
+
+    Returns:
+        str | None: id задачи, которая собирает VOD (task_id, если регистрация удалась или уже была
+        за этой задачей), или None, если Redis недоступен и сбор не дедуплицируется.
+    """
+    key = get_ingest_key(vod_id)
+    try:
+        client = get_redis()
+        if client.set(key, task_id, nx=True, ex=ttl):
+            return task_id
+        owner = client.get(key)
+        if owner is None:
+            # Ключ истёк между SET и GET — пробуем ещё раз
+            return claim_ingest(vod_id, task_id, ttl)
+        return owner.decode() if isinstance(owner, bytes) else owner
+    except Exception as e:
+        logger.warning(f"⚠️ Реестр сборов в Redis недоступен: {e}")
+        return None
+
+
+def release_ingest(vod_id, task_id):
+    """Снимает регистрацию, если она принадлежит этой задаче."""
+    key = get_ingest_key(vod_id)
+    try:
+        with get_redis().pipeline() as pipe:
+            pipe.watch(key)
+            owner = pipe.get(key)
+            if owner is not None and (owner.decode() if isinstance(owner, bytes) else owner) == task_id:
+                pipe.multi()
+                pipe.delete(key)
+                pipe.execute()
+            else:
+                pipe.unwatch()
+    except Exception as e:
+        logger.warning(f"⚠️ Не удалось снять регистрацию сбора VOD {vod_id}: {e}")
+
+
+def renew_ingest(vod_id, task_id):
+    """
+    Продлевает регистрацию на INGEST_LOCK_TTL, если она принадлежит этой задаче.
+
+    Returns:
+        bool | None: True — продлена, False — регистрация истекла или принадлежит другой задаче,
+        None — Redis недоступен.
+    """
+    key = get_ingest_key(vod_id)
+    try:
+        with get_redis().pipeline() as pipe:
+            pipe.watch(key)
+            owner = pipe.get(key)
+            if owner is None or (owner.decode() if isinstance(owner, bytes) else owner) != task_id:
+                pipe.unwatch()
+                return False
+            pipe.multi()
+            pipe.expire(key, INGEST_LOCK_TTL)
+            pipe.execute()
+            return True
+    except Exception as e:
+        logger.warning(f"⚠️ Не удалось продлить регистрацию сбора VOD {vod_id}: {e}")
+        return None
+
+
+@contextmanager
+def ingest_heartbeat(vod_id, task_id, interval=INGEST_HEARTBEAT_INTERVAL):
+    """
+    Продлевает регистрацию сбора из фонового потока, пока выполняется тело with.
+
+    Первое продление — сразу: срок регистрации из очереди (INGEST_QUEUED_TTL) заменяется коротким.
+    Если регистрацию перехватила другая задача, продление прекращается.
+    """
+    stop = threading.Event()
+
+    def renew():
+        while True:
+            if renew_ingest(vod_id, task_id) is False:
+                logger.warning(f"⚠️ Регистрация сбора VOD {vod_id} задачей {task_id} потеряна.")
+                return
+            if stop.wait(interval):
+                return
+
+    thread = threading.Thread(target=renew, name=f"ingest-heartbeat-{vod_id}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def wait_for_ingest(vod_id, owner_task_id, timeout=INGEST_WAIT_TIMEOUT):
+    """
+    Ждёт, пока задача owner_task_id закончит сбор VOD (снимет регистрацию или она истечёт).
+
+    Returns:
+        bool: True, если сбор завершился, False — если истёк timeout.
+    """
+    key = get_ingest_key(vod_id)
+    deadline = time.monotonic() + timeout
+    logger.info(f"⏳ VOD {vod_id} уже собирает задача {owner_task_id}, ждём её завершения.")
+    while time.monotonic() < deadline:
+        try:
+            owner = get_redis().get(key)
+        except Exception as e:
+            logger.warning(f"⚠️ Реестр сборов в Redis недоступен: {e}")
+            return True
+        if owner is None or (owner.decode() if isinstance(owner, bytes) else owner) != owner_task_id:
+            return True
+        time.sleep(INGEST_POLL_INTERVAL)
+    return False
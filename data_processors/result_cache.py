@@ -0,0 +1,145 @@
+# data_processors/result_cache.py
+
+import hashlib
+import json
+import os
+import threading
+import time
+from dotenv import load_dotenv
+from logging_config import setup_logger
+from redis_client import get_redis
+from compressed_io import open_text
+from data_processors.stream_record import find_stream_json, read_record_chat_ref
+
+# Логгер
+logger = setup_logger("result_cache")
+
+# Загрузим .env.local для локальной разработки
+if os.environ.get('FLASK_ENV') == 'development':
+    load_dotenv('.env.local')
+else:
+    load_dotenv('.env.docker')
+
+ANALYSIS_CACHE_TTL = int(os.getenv("ANALYSIS_CACHE_TTL", 24 * 3600))  # Время жизни результата, с
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", 1000))  # Максимум результатов в кэше
+ANALYSIS_CACHE_MAX_ENTRY_MB = float(os.getenv("ANALYSIS_CACHE_MAX_ENTRY_MB", 5))  # Больше — не кэшируем
+
+# Версия формата результатов: при изменении аналитики старые записи перестают совпадать
+ANALYSIS_VERSION = 3
+KEY_PREFIX = "analysis_cache"
+INDEX_KEY = f"{KEY_PREFIX}:index"
+
+_fingerprints = {}  # (путь, mtime_ns, размер) -> хэш записи трансляции
+_fingerprints_lock = threading.Lock()
+
+
+def get_vod_fingerprint(vod_id):
+    """
+    Возвращает хэш данных VOD или None.
+
+    Хэш считается по всей записи трансляции (эмоуты, категории, метаданные) вместе со ссылкой на чат,
+    в которой есть content_sha256 колоночного хранилища, поэтому повторный сбор с тем же чатом, но
+    другими эмоутами или категориями меняет ключи кэша результатов. Запись читается один раз для
+    каждой пары (mtime, размер) файла.
+    """
+    path = find_stream_json(vod_id)
+    try:
+        stat = os.stat(path) if path else None
+    except OSError:
+        stat = None
+    if stat is None:
+        return None
+
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    with _fingerprints_lock:
+        if key in _fingerprints:
+            return _fingerprints[key]
+
+    # Запись прежнего формата (чат в самой записи) переводится на хранилище при первом анализе
+    fingerprint = None
+    if read_record_chat_ref(path):
+        try:
+            with open_text(path) as f:
+                record = json.load(f)
+            canonical = json.dumps(record, sort_keys=True, ensure_ascii=False)
+            fingerprint = hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+        except (OSError, ValueError, EOFError):
+            fingerprint = None
+
+    with _fingerprints_lock:
+        _fingerprints[key] = fingerprint
+    return fingerprint
+
+
+def normalize_params(received_data):
+    """Приводит параметры анализа к каноническому виду (порядок метрик и ключевых слов не важен)."""
+    params = {k: v for k, v in received_data.items() if k != "vod_id"}
+    params["metrics"] = sorted(set(params.get("metrics") or []))
+    keywords = params.get("keywords") or []
+    params["keywords"] = sorted(set(keywords)) if isinstance(keywords, list) else keywords
+    return params
+
+
+def make_cache_key(vod_id, fingerprint, received_data):
+    """Ключ результата: vod_id + хэш данных VOD + хэш нормализованных параметров."""
+    params = json.dumps(normalize_params(received_data), sort_keys=True, ensure_ascii=False)
+    params_hash = hashlib.sha256(params.encode("utf-8")).hexdigest()[:32]
+    return f"{KEY_PREFIX}:v{ANALYSIS_VERSION}:{vod_id}:{fingerprint[:32]}:{params_hash}"
+
+
+def get_cached_result(received_data):
+    """
+    Возвращает сохранённый результат анализа или None.
+
+    Ошибки Redis не прерывают анализ: кэш просто считается пустым.
+    """
+    vod_id = received_data["vod_id"]
+    try:
+        fingerprint = get_vod_fingerprint(vod_id)
+        if not fingerprint:
+            return None
+
+        key = make_cache_key(vod_id, fingerprint, received_data)
+        client = get_redis()
+        value = client.get(key)
+        if value is None:
+            logger.info(f"🧮 Кэш результатов: промах для VOD {vod_id}")
+            return None
+
+        client.zadd(INDEX_KEY, {key: time.time()})
+        logger.info(f"🧮 Кэш результатов: попадание для VOD {vod_id}")
+        return json.loads(value)
+    except Exception as e:
+        logger.warning(f"⚠️ Кэш результатов недоступен: {e}")
+        return None
+
+
+def store_result(received_data, result):
+    """Сохраняет результат анализа с TTL и вытесняет самые давно использованные записи сверх лимита."""
+    vod_id = received_data["vod_id"]
+    try:
+        fingerprint = get_vod_fingerprint(vod_id)
+        if not fingerprint:
+            return
+
+        value = json.dumps(result, ensure_ascii=False)
+        if len(value) > ANALYSIS_CACHE_MAX_ENTRY_MB * 1024 * 1024:
+            logger.info(f"🧮 Результат для VOD {vod_id} слишком большой для кэша, пропускаем.")
+            return
+
+        key = make_cache_key(vod_id, fingerprint, received_data)
+        client = get_redis()
+        pipe = client.pipeline()
+        pipe.set(key, value, ex=ANALYSIS_CACHE_TTL)
+        pipe.zadd(INDEX_KEY, {key: time.time()})
+        # Записи, истёкшие по TTL, убираем из индекса
+        pipe.zremrangebyscore(INDEX_KEY, "-inf", time.time() - ANALYSIS_CACHE_TTL)
+        pipe.execute()
+
+        overflow = client.zcard(INDEX_KEY) - ANALYSIS_CACHE_MAX_ENTRIES
+        if overflow > 0:
+            evicted = [k for k, _ in client.zpopmin(INDEX_KEY, overflow)]
+            if evicted:
+                client.delete(*evicted)
+    except Exception as e:
+        logger.warning(f"⚠️ Не удалось сохранить результат в кэш: {e}")
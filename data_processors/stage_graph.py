@@ -0,0 +1,78 @@
+# data_processors/stage_graph.py
+
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from logging_config import setup_logger
+
+# Логгер
+logger = setup_logger("stage_graph")
+
+
+def run_stage_graph(stages, required=(), timings=None, max_workers=None, on_stage=None):
+    """
+    Выполняет этапы с зависимостями в пуле потоков: этап запускается, как только готовы все его зависимости.
+
+    Args:
+        stages (dict): Имя этапа -> (функция, кортеж имён зависимостей). Функция получает результаты
+            зависимостей именованными аргументами.
+        required (iterable): Этапы, без результата которых (None) продолжать нет смысла: новые этапы
+            после этого не запускаются, уже запущенные дорабатывают.
+        timings (dict, optional): Сюда записывается время каждого этапа и общее время ("total"), с.
+        max_workers (int, optional): Размер пула потоков (по умолчанию — по числу этапов).
+        on_stage (callable, optional): Вызывается как on_stage(имя, "started" | "done" | "failed") из потока этапа.
+
+    Returns:
+        dict | None: Имя этапа -> результат, или None, если обязательный этап вернул None.
+
+    Raises:
+        Exception: Первое исключение, выброшенное этапом (после завершения уже запущенных этапов).
+    """
+    timings = {} if timings is None else timings
+    required = set(required)
+    results = {}
+    pending = dict(stages)
+    running = {}
+    started_total = time.perf_counter()
+
+    def timed(name, func, kwargs):
+        started = time.perf_counter()
+        if on_stage:
+            on_stage(name, "started")
+        status = "failed"
+        try:
+            result = func(**kwargs)
+            status = "done" if result is not None else "failed"
+            return result
+        finally:
+            timings[name] = round(time.perf_counter() - started, 3)
+            if on_stage:
+                on_stage(name, status)
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(stages) or 1, thread_name_prefix="stage") as executor:
+        aborted = False
+        while pending or running:
+            if not aborted:
+                for name, (func, deps) in list(pending.items()):
+                    if all(dep in results for dep in deps):
+                        kwargs = {dep: results[dep] for dep in deps}
+                        running[executor.submit(timed, name, func, kwargs)] = name
+                        del pending[name]
+
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                error = future.exception()
+                if error is not None:
+                    # Дожидаемся запущенных этапов, чтобы не оставлять фоновую работу после ошибки
+                    wait(running)
+                    raise error
+                results[name] = future.result()
+                if results[name] is None and name in required:
+                    logger.warning(f"⚠️ Этап {name} не вернул результат, остальные этапы не запускаются.")
+                    aborted = True
+
+    timings["total"] = round(time.perf_counter() - started_total, 3)
+    return None if aborted else results
@@ -0,0 +1,473 @@
+# data_processors/storage_manifest.py
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from logging_config import setup_logger
+
+# Логгер
+logger = setup_logger("storage_manifest")
+
+# Загрузим .env.local для локальной разработки
+if os.environ.get('FLASK_ENV') == 'development':
+    load_dotenv('.env.local')
+else:
+    load_dotenv('.env.docker')
+
+PROJECT_ROOT = os.getenv('PROJECT_ROOT')
+STORAGE_MANIFEST_PATH = os.getenv("STORAGE_MANIFEST_PATH") or os.path.join(PROJECT_ROOT or ".", "storage_manifest.sqlite3")
+STORAGE_PIN_TTL = float(os.getenv("STORAGE_PIN_TTL", 6 * 3600))  # Закрепление снимается само, если воркер упал, с
+
+EVICT_BATCH = 256
+# Файлы, которые ещё пишутся (временные и отрезки загрузки чата), в манифест не попадают
+IN_PROGRESS_SUFFIXES = (".tmp", ".part")
+
+# Манифест артефактов хранилища (JSON трансляций, колоночные хранилища, индексы, скачанные чаты):
+#   artifacts — размер и время последнего доступа каждого файла; индекс (root, last_access) даёт
+#               LRU-порядок без сканирования каталога
+#   roots     — общий размер каждого каталога, поддерживается триггерами при каждом изменении artifacts
+#   pins      — закреплённые VOD (сбор ещё идёт), их файлы не удаляются до unpin или истечения срока
+#   blob_refs — ссылки VOD на общие файлы, сохранённые по хэшу (чаты): такой файл удаляется,
+#               только когда на него не ссылается ни один VOD
+# Удаляется всегда VOD целиком (запись трансляции первой, затем остальные его файлы), а не отдельный
+# файл: иначе запись осталась бы со ссылкой на удалённый чат.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    path TEXT PRIMARY KEY,
+    root TEXT NOT NULL,
+    vod_id TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS artifacts_lru ON artifacts (root, last_access, path);
+CREATE INDEX IF NOT EXISTS artifacts_vod ON artifacts (vod_id);
+
+CREATE TABLE IF NOT EXISTS roots (
+    root TEXT PRIMARY KEY,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    synced_at REAL
+);
+
+CREATE TABLE IF NOT EXISTS pins (
+    vod_id TEXT PRIMARY KEY,
+    count INTEGER NOT NULL,
+    expires_at REAL
+);
+
+CREATE TABLE IF NOT EXISTS blob_refs (
+    blob TEXT NOT NULL,
+    vod_id TEXT NOT NULL,
+    PRIMARY KEY (blob, vod_id)
+);
+CREATE INDEX IF NOT EXISTS blob_refs_vod ON blob_refs (vod_id);
+
+CREATE TRIGGER IF NOT EXISTS artifacts_insert AFTER INSERT ON artifacts BEGIN
+    INSERT OR IGNORE INTO roots (root) VALUES (NEW.root);
+    UPDATE roots SET bytes = bytes + NEW.size WHERE root = NEW.root;
+END;
+
+CREATE TRIGGER IF NOT EXISTS artifacts_delete AFTER DELETE ON artifacts BEGIN
+    UPDATE roots SET bytes = bytes - OLD.size WHERE root = OLD.root;
+END;
+
+CREATE TRIGGER IF NOT EXISTS artifacts_resize AFTER UPDATE OF size ON artifacts BEGIN
+    UPDATE roots SET bytes = bytes - OLD.size + NEW.size WHERE root = NEW.root;
+END;
+"""
+
+# Файлы закреплённых VOD в выборки на удаление не попадают
+PINNED = "SELECT vod_id FROM pins WHERE count > 0 AND (expires_at IS NULL OR expires_at > ?)"
+NOT_PINNED = f"vod_id NOT IN ({PINNED})"
+# Записи трансляции удаляются первыми из файлов VOD: без записи VOD считается несобранным
+RECORD_SUFFIXES = (".json", ".json.gz")
+
+
+def vod_id_from_path(path):
+    """VOD, к которому относится файл: имя до первой точки ({vod_id}.json.gz, {vod_id}.export.json.gz, ...)."""
+    return os.path.basename(path).split(".", 1)[0]
+
+
+class StorageManifest:
+    """
+    Учёт файлов хранилища в SQLite: размер, последний доступ и закрепление каждого файла
+    и текущий размер каждого каталога.
+
+    Запись и удаление файла меняют размер каталога инкрементально, поэтому проверка лимита —
+    один запрос, а очистка берёт самые давно не использованные файлы из индекса, а не сканирует
+    каталог. Полный обход каталога (sync) нужен только для сверки с диском: при первом запуске
+    и по расписанию, чтобы подхватить файлы, записанные в обход манифеста.
+    """
+
+    def __init__(self, path=STORAGE_MANIFEST_PATH):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        """Соединение текущего потока (SQLite-соединения нельзя делить между потоками и процессами)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def record(self, path, last_access=None, vod_id=None):
+        """
+        Добавляет файл в манифест или обновляет его размер и время доступа.
+
+        vod_id нужен для файлов VOD, имя которых не начинается с его ID. Общие файлы, сохранённые
+        по хэшу, учитываются без vod_id и связываются с VOD через add_refs.
+
+        Returns:
+            int | None: Размер каталога файла в байтах после записи (None, если файла нет).
+        """
+        path = os.path.abspath(path)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return None
+
+        root = os.path.dirname(path)
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT INTO artifacts (path, root, vod_id, size, last_access) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET vod_id = excluded.vod_id, size = excluded.size, "
+                "last_access = excluded.last_access",
+                (path, root, str(vod_id or vod_id_from_path(path)), size, last_access or time.time()),
+            )
+        return self.total_bytes(root)
+
+    def touch(self, vod_id):
+        """Отмечает доступ ко всем файлам VOD и к общим файлам, на которые он ссылается."""
+        conn = self._connect()
+        with conn:
+            conn.execute("UPDATE artifacts SET last_access = ? WHERE vod_id = ? "
+                         "OR path IN (SELECT blob FROM blob_refs WHERE vod_id = ?)",
+                         (time.time(), str(vod_id), str(vod_id)))
+
+    def add_refs(self, vod_id, *blobs):
+        """Отмечает, что VOD ссылается на общие файлы blobs (пока ссылка есть, файл не удаляется отдельно)."""
+        conn = self._connect()
+        with conn:
+            conn.executemany("INSERT OR IGNORE INTO blob_refs (blob, vod_id) VALUES (?, ?)",
+                             [(os.path.abspath(blob), str(vod_id)) for blob in blobs])
+
+    def set_refs(self, vod_id, *blobs):
+        """Заменяет все ссылки VOD на общие файлы; файлы, на которые больше никто не ссылается, удаляются при очистке."""
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM blob_refs WHERE vod_id = ?", (str(vod_id),))
+            conn.executemany("INSERT OR IGNORE INTO blob_refs (blob, vod_id) VALUES (?, ?)",
+                             [(os.path.abspath(blob), str(vod_id)) for blob in blobs])
+
+    def refs(self, vod_id):
+        """Общие файлы, на которые ссылается VOD."""
+        return [blob for (blob,) in self._connect().execute("SELECT blob FROM blob_refs WHERE vod_id = ?",
+                                                             (str(vod_id),))]
+
+    def remove_unreferenced(self, *paths):
+        """
+        Удаляет файлы, на которые не ссылается ни один VOD (промежуточные файлы, заменённые другим форматом).
+
+        Returns:
+            list: Пути удалённых файлов.
+        """
+        conn = self._connect()
+        removed = []
+        for path in map(os.path.abspath, paths):
+            if conn.execute("SELECT 1 FROM blob_refs WHERE blob = ? LIMIT 1", (path,)).fetchone():
+                continue
+            if self._remove(path):
+                removed.append(path)
+        return removed
+
+    def forget(self, path):
+        """Убирает файл из манифеста (файл удалён не через evict)."""
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM artifacts WHERE path = ?", (os.path.abspath(path),))
+
+    def pin(self, vod_id, ttl=STORAGE_PIN_TTL):
+        """Закрепляет файлы VOD; закрепления считаются, ttl=None — бессрочно."""
+        expires_at = time.time() + ttl if ttl is not None else None
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT INTO pins (vod_id, count, expires_at) VALUES (?, 1, ?) "
+                "ON CONFLICT(vod_id) DO UPDATE SET count = count + 1, "
+                "expires_at = CASE WHEN expires_at IS NULL OR excluded.expires_at IS NULL THEN NULL "
+                "ELSE max(expires_at, excluded.expires_at) END",
+                (str(vod_id), expires_at),
+            )
+
+    def unpin(self, vod_id):
+        """Снимает одно закрепление VOD."""
+        conn = self._connect()
+        with conn:
+            conn.execute("UPDATE pins SET count = count - 1 WHERE vod_id = ?", (str(vod_id),))
+            conn.execute("DELETE FROM pins WHERE vod_id = ? AND count <= 0", (str(vod_id),))
+
+    def total_bytes(self, root):
+        """Текущий размер каталога по манифесту, байт."""
+        row = self._connect().execute("SELECT bytes FROM roots WHERE root = ?", (os.path.abspath(root),)).fetchone()
+        return row[0] if row else 0
+
+    def is_synced(self, root):
+        """Сверялся ли каталог с диском хотя бы раз."""
+        row = self._connect().execute("SELECT synced_at FROM roots WHERE root = ?", (os.path.abspath(root),)).fetchone()
+        return bool(row and row[0])
+
+    def sync(self, root, read_refs=None):
+        """
+        Сверяет манифест с содержимым каталога: добавляет неучтённые файлы (время доступа — atime/mtime
+        файла), обновляет размеры и убирает записи об удалённых файлах.
+
+        read_refs(path) возвращает общие файлы, на которые ссылается файл каталога (запись трансляции);
+        по ним восстанавливаются ссылки VOD, которых ещё нет в манифесте.
+
+        Returns:
+            tuple: (добавлено, удалено) записей.
+        """
+        root = os.path.abspath(root)
+        on_disk = {}
+        if os.path.isdir(root):
+            with os.scandir(root) as entries:
+                for entry in entries:
+                    if not entry.is_file() or entry.name.endswith(IN_PROGRESS_SUFFIXES):
+                        continue
+                    stat = entry.stat()
+                    on_disk[entry.path] = (stat.st_size, max(stat.st_atime, stat.st_mtime))
+
+        conn = self._connect()
+        known = dict(conn.execute("SELECT path, size FROM artifacts WHERE root = ?", (root,)))
+        added = [(path, root, vod_id_from_path(path), size, last_access)
+                 for path, (size, last_access) in on_disk.items() if path not in known]
+        resized = [(on_disk[path][0], path) for path, size in known.items()
+                   if path in on_disk and on_disk[path][0] != size]
+        missing = [(path,) for path in known if path not in on_disk]
+
+        with conn:
+            conn.executemany("INSERT OR IGNORE INTO artifacts (path, root, vod_id, size, last_access) "
+                             "VALUES (?, ?, ?, ?, ?)", added)
+            conn.executemany("UPDATE artifacts SET size = ? WHERE path = ?", resized)
+            conn.executemany("DELETE FROM artifacts WHERE path = ?", missing)
+            conn.execute("INSERT OR IGNORE INTO roots (root) VALUES (?)", (root,))
+            conn.execute("UPDATE roots SET synced_at = ? WHERE root = ?", (time.time(), root))
+
+        if read_refs is not None:
+            referencing = {vod_id for (vod_id,) in conn.execute("SELECT DISTINCT vod_id FROM blob_refs")}
+            for path in on_disk:
+                vod_id = vod_id_from_path(path)
+                if vod_id not in referencing:
+                    blobs = read_refs(path)
+                    if blobs:
+                        self.add_refs(vod_id, *blobs)
+
+        if added or missing:
+            logger.info(f"🗂 Манифест {root}: добавлено {len(added)}, убрано {len(missing)} записей")
+        return len(added), len(missing)
+
+    def evict(self, root, max_bytes=None, max_age_seconds=None, max_file_bytes=None):
+        """
+        Удаляет незакреплённые VOD, файлы которых лежат в каталоге: файл старше max_age_seconds
+        с последнего доступа, больше max_file_bytes и затем самые давно не использованные,
+        пока размер каталога больше max_bytes.
+
+        Файл удаляется вместе со всем VOD (для общего файла — со всеми VOD, которые на него ссылаются),
+        общие файлы VOD — когда на них не осталось ссылок.
+
+        Returns:
+            list: Пути удалённых файлов.
+        """
+        root = os.path.abspath(root)
+        now = time.time()
+        conn = self._connect()
+        removed = []
+
+        if max_age_seconds is not None:
+            rows = conn.execute(f"SELECT path FROM artifacts WHERE root = ? AND last_access < ? AND {NOT_PINNED}",
+                                (root, now - max_age_seconds, now)).fetchall()
+            for (path,) in rows:
+                removed += self._remove_owners(path, now)
+
+        if max_file_bytes is not None:
+            rows = conn.execute(f"SELECT path FROM artifacts WHERE root = ? AND size > ? AND {NOT_PINNED}",
+                                (root, max_file_bytes, now)).fetchall()
+            for (path,) in rows:
+                removed += self._remove_owners(path, now)
+
+        if max_bytes is not None:
+            total = self.total_bytes(root)
+            cursor = (float("-inf"), "")
+            # Обход по индексу в LRU-порядке пачками; продолжаем после последней просмотренной записи,
+            # поэтому файл, который не удалось удалить, не выбирается снова
+            while total > max_bytes:
+                rows = conn.execute(
+                    f"SELECT path, last_access FROM artifacts WHERE root = ? AND (last_access, path) > (?, ?) "
+                    f"AND {NOT_PINNED} ORDER BY last_access, path LIMIT ?",
+                    (root, *cursor, now, EVICT_BATCH),
+                ).fetchall()
+                if not rows:
+                    logger.warning(f"⚠️ {root}: {total / 2 ** 20:.0f} МБ, но удалять больше нечего (файлы закреплены)")
+                    break
+                for path, last_access in rows:
+                    cursor = (last_access, path)
+                    if total <= max_bytes:
+                        break
+                    removed += self._remove_owners(path, now)
+                    total = self.total_bytes(root)
+
+        return removed
+
+    def _remove_owners(self, path, now):
+        """
+        Удаляет VOD, которым принадлежит файл: VOD из имени файла или, для общего файла, все VOD,
+        которые на него ссылаются. Если хотя бы один из них закреплён, ничего не удаляется.
+
+        Returns:
+            list: Пути удалённых файлов.
+        """
+        conn = self._connect()
+        vod_ids = [vod_id for (vod_id,) in conn.execute("SELECT vod_id FROM blob_refs WHERE blob = ?", (path,))]
+        if not vod_ids:
+            row = conn.execute("SELECT vod_id FROM artifacts WHERE path = ?", (path,)).fetchone()
+            if row is None:
+                return []  # Файл уже удалён вместе с другим VOD
+            vod_ids = [row[0]]
+
+        pinned = {vod_id for (vod_id,) in conn.execute(PINNED, (now,))}
+        if pinned.intersection(vod_ids):
+            return []
+
+        removed = []
+        for vod_id in vod_ids:
+            removed += self._remove_vod(vod_id)
+        return removed
+
+    def _remove_vod(self, vod_id):
+        """Удаляет файлы VOD (запись трансляции — первой) и общие файлы, на которые больше никто не ссылается."""
+        conn = self._connect()
+        paths = [path for (path,) in conn.execute(
+            "SELECT path FROM artifacts WHERE vod_id = ? AND path NOT IN (SELECT blob FROM blob_refs)", (vod_id,))]
+        # Сравнивается имя целиком: {vod_id}.export.json.gz тоже оканчивается на .json.gz
+        records = {f"{vod_id}{suffix}" for suffix in RECORD_SUFFIXES}
+        paths.sort(key=lambda path: os.path.basename(path) not in records)
+
+        removed = []
+        for path in paths:
+            if not self._remove(path):
+                return removed  # Файл VOD не удалось удалить — ссылки VOD не снимаем
+            removed.append(path)
+
+        blobs = self.refs(vod_id)
+        with conn:
+            conn.execute("DELETE FROM blob_refs WHERE vod_id = ?", (vod_id,))
+        for blob in blobs:
+            still_referenced = conn.execute("SELECT 1 FROM blob_refs WHERE blob = ? LIMIT 1", (blob,)).fetchone()
+            if not still_referenced and self._remove(blob):
+                removed.append(blob)
+        logger.info(f"🗑 Удалён VOD {vod_id}: файлов {len(removed)}")
+        return removed
+
+    def _remove(self, path):
+        """Удаляет файл с диска и из манифеста."""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"⚠️ Не удалось удалить файл {path}: {e}")
+            return False
+        self.forget(path)
+        logger.info(f"🗑 Удалён файл: {path}")
+        return True
+
+    def stats(self):
+        """Размер и количество файлов по каталогам."""
+        conn = self._connect()
+        counts = dict(conn.execute("SELECT root, count(*) FROM artifacts GROUP BY root"))
+        return {
+            root: {"bytes": size, "files": counts.get(root, 0), "synced_at": synced_at}
+            for root, size, synced_at in conn.execute("SELECT root, bytes, synced_at FROM roots")
+        }
+
+
+_manifest = None
+_manifest_lock = threading.Lock()
+
+
+def get_storage_manifest():
+    """Возвращает манифест хранилища процесса."""
+    global _manifest
+
+    with _manifest_lock:
+        if _manifest is None:
+            _manifest = StorageManifest()
+        return _manifest
+
+
+def record_artifacts(*paths, vod_id=None):
+    """Учитывает записанные файлы в манифесте (ошибка манифеста не должна ломать сохранение)."""
+    try:
+        manifest = get_storage_manifest()
+        for path in paths:
+            manifest.record(path, vod_id=vod_id)
+    except sqlite3.Error as e:
+        logger.warning(f"⚠️ Не удалось обновить манифест хранилища: {e}")
+
+
+def record_blob_refs(vod_id, *blobs, replace=False):
+    """Учитывает общие файлы (чаты по хэшу) и ссылки VOD на них; replace=True заменяет прежние ссылки VOD."""
+    try:
+        manifest = get_storage_manifest()
+        for blob in blobs:
+            manifest.record(blob)
+        if replace:
+            manifest.set_refs(vod_id, *blobs)
+        else:
+            manifest.add_refs(vod_id, *blobs)
+    except sqlite3.Error as e:
+        logger.warning(f"⚠️ Не удалось обновить манифест хранилища: {e}")
+
+
+def release_artifacts(*paths):
+    """Удаляет файлы, на которые больше не ссылается ни один VOD (ошибка манифеста не должна ломать сохранение)."""
+    try:
+        get_storage_manifest().remove_unreferenced(*paths)
+    except sqlite3.Error as e:
+        logger.warning(f"⚠️ Не удалось обновить манифест хранилища: {e}")
+
+
+def touch_vod(vod_id):
+    """Отмечает доступ к файлам VOD (ошибка манифеста не должна ломать чтение)."""
+    try:
+        get_storage_manifest().touch(vod_id)
+    except sqlite3.Error as e:
+        logger.warning(f"⚠️ Не удалось обновить манифест хранилища: {e}")
+
+
+@contextmanager
+def pinned_vod(vod_id, ttl=STORAGE_PIN_TTL):
+    """Закрепляет файлы VOD на время блока with, чтобы очистка не удалила их посреди сбора."""
+    try:
+        get_storage_manifest().pin(vod_id, ttl)
+    except sqlite3.Error as e:
+        logger.warning(f"⚠️ Не удалось закрепить файлы VOD {vod_id}: {e}")
+        yield
+        return
+    try:
+        yield
+    finally:
+        try:
+            get_storage_manifest().unpin(vod_id)
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Не удалось снять закрепление VOD {vod_id}: {e}")
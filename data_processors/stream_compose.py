@@ -1,10 +1,16 @@
 import json
 import os
 from dotenv import load_dotenv
-from data_collectors.helix_api import get_times_stream_info, get_streamer_id
-from data_collectors.emote import load_emotes
-from data_collectors.chat_download import download_chat_to_file
-from data_collectors.category_parser import process_url  # Добавлен парсер категорий
+from compressed_io import atomic_writer, open_text
+from data_collectors.chat_file import CHAT_REF_EXTENSION, ChatFile
+from data_processors.chat_store import STORE_EXTENSION, open_chat_store, write_chat_store_blob
+from data_processors.chat_cache import get_cached_chat
+from data_processors.token_index import INDEX_EXTENSION, build_token_index, open_token_index
+from data_processors.stage_graph import run_stage_graph
+from data_processors.storage_manifest import record_artifacts, record_blob_refs, release_artifacts, touch_vod
+from data_processors.stream_record import (CHAT_REF_KEY, CHATS_DIR, find_stream_json, get_stream_json_path,
+                                           is_chat_store_ref, is_record_complete, make_chat_ref,
+                                           read_record_chat_ref, read_stream_record, resolve_chat_ref)
 
 # Загрузим .env.local.local для локальной разработки
 if os.environ.get('FLASK_ENV') == 'development':
@@ -17,91 +23,209 @@ PROJECT_ROOT = os.getenv('PROJECT_ROOT')
 # Директория для сохранения данных
 OUTPUT_DIR = os.path.join(PROJECT_ROOT, 'stream_data')
 os.makedirs(OUTPUT_DIR, exist_ok=True)
+os.makedirs(CHATS_DIR, exist_ok=True)
 
 
 def check_existing_data(vod_id):
-    """Проверяет, существует ли файл для этого vod_id."""
-    file_path = os.path.join(OUTPUT_DIR, f"{vod_id}.json")
-    return os.path.exists(file_path)
+    """Проверяет, собран ли VOD: запись трансляции есть и чат, на который она ссылается, не удалён."""
+    path = find_stream_json(vod_id)
+    return path is not None and is_record_complete(path)
+
+
+def get_chat_store_path(vod_id):
+    """Возвращает путь к колоночному хранилищу чата прежних версий (stream_data/{vod_id}.chat)."""
+    return os.path.join(OUTPUT_DIR, f"{vod_id}{STORE_EXTENSION}")
+
+
+def get_token_index_path(store_path):
+    """Возвращает путь к индексу токенов рядом с колоночным хранилищем."""
+    return store_path[:-len(STORE_EXTENSION)] + INDEX_EXTENSION
+
+
+def save_token_index(store_path):
+    """Строит индекс токенов для сохранённого хранилища (ошибка не мешает аналитике — она просто сканирует чат)."""
+    try:
+        with open_chat_store(store_path) as store:
+            tokens = build_token_index(store, get_token_index_path(store_path))
+        print(f"🔎 Индекс токенов построен: {tokens} токенов.")
+    except Exception as e:
+        print(f"⚠️ Не удалось построить индекс токенов для {store_path}: {e}")
 
 
 def get_chat_data(vod_id):
-    """Получает чат-данные для известного vod_id из файла."""
-    chat_file_path = os.path.join(OUTPUT_DIR, f"{vod_id}.json")
+    """
+    Получает чат-данные для известного vod_id.
+
+    Чат читается из колоночного хранилища, на которое ссылается запись трансляции, через mmap: ключ "chat"
+    содержит ChatStore, который ведёт себя как список сообщений. Запись прежнего формата (чат в самой записи
+    или в NDJSON) один раз переводится на хранилище. Открытые хранилища переиспользуются через кэш процесса
+    (data_processors.chat_cache).
+    """
+    record_path = find_stream_json(vod_id)
 
     try:
         # Проверяем, существует ли файл
-        if not os.path.exists(chat_file_path):
+        if record_path is None:
             print(f"❌ Файл с чатом для VOD {vod_id} не найден.")
             return None
 
-        # Открываем и читаем данные из файла
-        with open(chat_file_path, "r", encoding="utf-8") as f:
-            chat_data = json.load(f)
+        chat_ref = read_record_chat_ref(record_path)
+        if chat_ref is None or not is_chat_store_ref(chat_ref):
+            record_path = _convert_stream_record(vod_id, record_path)
+            if record_path is None:
+                return None
+            chat_ref = read_record_chat_ref(record_path)
+        store_path = resolve_chat_ref(chat_ref)
 
-        if not chat_data:
-            print(f"❌ Чат для VOD {vod_id} пуст.")
-            return None
+        # Отмечаем доступ для очистки хранилища (удаляются самые давно не использованные VOD)
+        touch_vod(vod_id)
 
-        return chat_data
+        # Возвращаем копию верхнего уровня, чтобы вызывающий код не менял запись в кэше
+        return dict(get_cached_chat(vod_id, store_path, lambda path: _open_stream_record(record_path, path),
+                                    version=os.stat(record_path).st_mtime_ns))
 
     except Exception as e:
         print(f"❌ Ошибка при чтении чата для VOD {vod_id}: {e}")
         return None
 
 
-def collect_stream_data(vod_id):
-    """Собирает данные о трансляции, если они ещё не сохранены."""
+def _convert_stream_record(vod_id, record_path):
+    """Переводит запись прежнего формата на колоночное хранилище; возвращает путь к новой записи или None."""
+    # Читаем запись трансляции; чат по ссылке читается лениво
+    chat_data = read_stream_record(record_path)
 
-    # Если данные уже есть, просто сообщаем и выходим
-    if check_existing_data(vod_id):
-        print(f"⚠️ Данные для {vod_id} уже существуют. Пропускаем сбор.")
-        return "exists"  # Если файл существует, возвращаем 'exists'
+    if not chat_data:
+        print(f"❌ Чат для VOD {vod_id} пуст.")
+        return None
 
-    # 1. Получаем информацию о VOD
-    vod_info = get_times_stream_info(vod_id)
-    if not vod_info:
-        return None  # Не удалось получить данные о VOD
+    output_path = _write_stream_data(vod_id, chat_data)
+    # Прежние копии чата: NDJSON по ссылке (если на него не ссылается другой VOD), запись старого формата,
+    # хранилище с индексом рядом с ней
+    legacy_store = get_chat_store_path(vod_id)
+    leftovers = [legacy_store, get_token_index_path(legacy_store)]
+    if isinstance(chat_data.get("chat"), ChatFile):
+        leftovers.append(chat_data["chat"].path)
+    if record_path != output_path:
+        leftovers.append(record_path)
+    release_artifacts(*[path for path in leftovers if os.path.exists(path)])
+    print(f"🗜 Чат для VOD {vod_id} сконвертирован в колоночный формат.")
+    return output_path
 
-    # 2. Извлекаем ID стримера
-    user_id = get_streamer_id(vod_id)
-    if not user_id:
-        return None  # Не удалось получить ID стримера
 
-    # 3. Загружаем эмоуты стримера
-    emotes = load_emotes(user_id)
+def _open_stream_record(record_path, store_path):
+    """
+    Читает запись трансляции и открывает хранилище её чата: данные трансляции с чатом в ключе "chat".
 
-    # 4. Получаем чат данных через новую функцию
-    chat_data = get_chat_data(vod_id)
-    if not chat_data:
-        print("💬 Чат не найден. Пробуем скачать...")
-        downloaded_chat = download_chat_to_file(vod_id)
-        if not downloaded_chat:
-            print("❌ Не удалось скачать чат.")
-            return None
-        chat_data = downloaded_chat  # обновим переменную
+    Индекс токенов (если он построен для этого же содержимого) кладётся в ключ "token_index".
+    """
+    with open_text(record_path) as f:
+        chat_data = json.load(f)
+    chat_data.pop(CHAT_REF_KEY, None)
+    store = open_chat_store(store_path)
+    chat_data["chat"] = store
+    chat_data["token_index"] = open_token_index(get_token_index_path(store_path), store.content_sha256)
+    return chat_data
 
-    # 5. Извлекаем категории (смена игр и разделов)
-    categories = process_url(vod_id)
 
-    # 6. Формируем итоговые данные
+def collect_stream_data(vod_id, timings=None, progress=None, fetch_categories=None):
+    """
+    Собирает данные о трансляции, если они ещё не сохранены.
+
+    Сбор описан графом этапов: после получения информации о VOD эмоуты, чат и категории
+    собираются параллельно в потоках, поэтому общее время близко к самому долгому этапу.
+
+    Args:
+        vod_id (str): ID трансляции.
+        timings (dict, optional): Сюда записывается время каждого этапа в секундах.
+        progress (callable, optional): Получает события прогресса: progress(этап, force=..., **поля)
+            (task_progress.ProgressReporter).
+        fetch_categories (callable, optional): Получает категории по ID видео вместо парсера в этом процессе
+            (воркер сбора отдаёт парсинг в очередь browser).
+    """
+
+    # Сборщики (selenium, HTTP-клиенты) нужны только при сборе: чтение чата для аналитики их не загружает
+    from data_collectors.helix_api import get_times_stream_info
+    from data_collectors.emote import load_emotes
+    if fetch_categories is None:
+        from data_collectors.category_parser import process_url as fetch_categories  # Добавлен парсер категорий
+
+    # Если данные уже есть, просто сообщаем и выходим
+    if check_existing_data(vod_id):
+        print(f"⚠️ Данные для {vod_id} уже существуют. Пропускаем сбор.")
+        return "exists"  # Если файл существует, возвращаем 'exists'
+
+    timings = {} if timings is None else timings
+    stages = {
+        # 1. Получаем информацию о VOD (в ней же ID стримера и длительность)
+        "vod_info": (lambda: _load_vod_info(vod_id, get_times_stream_info), ()),
+        # 2. Загружаем эмоуты стримера
+        "emotes": (lambda vod_info: load_emotes(vod_info["user_id"]), ("vod_info",)),
+        # 3. Получаем чат: сохранённый или скачиваем
+        "chat": (lambda vod_info: _load_chat(vod_id, vod_info, progress), ("vod_info",)),
+        # 4. Извлекаем категории (смена игр и разделов)
+        "categories": (lambda vod_info: fetch_categories(vod_id), ("vod_info",)),
+    }
+    on_stage = (lambda name, status: progress(name, force=True, status=status)) if progress else None
+    results = run_stage_graph(stages, required=("vod_info", "chat"), timings=timings, on_stage=on_stage)
+    if results is None:
+        return None  # Не удалось получить данные о VOD или чат
+    print(f"⏱ Этапы сбора VOD {vod_id}: {timings}")
+
+    # 5. Формируем итоговые данные
     stream_data = {
         "video_id": vod_id,
-        "user_id": user_id,
-        "vod_info": vod_info,
-        "emotes": emotes,
-        "chat": chat_data,
-        "categories": categories  # Добавленные категории
+        "user_id": results["vod_info"]["user_id"],
+        "vod_info": results["vod_info"],
+        "emotes": results["emotes"],
+        "chat": results["chat"],
+        "categories": results["categories"]  # Добавленные категории
     }
 
     return stream_data  # Возвращаем данные о стриме
 
 
+def _load_vod_info(vod_id, get_times_stream_info):
+    """Информация о VOD из Helix API или None, если видео или ID стримера не найдены."""
+    vod_info = get_times_stream_info(vod_id)
+    if not vod_info or not vod_info.get("user_id"):
+        return None
+    return vod_info
+
+
+def _load_chat(vod_id, vod_info, progress=None):
+    """Сохранённый чат VOD или только что скачанный (None, если скачать не удалось)."""
+    from data_collectors.helix_api import parse_duration
+    from data_collectors.chat_download import download_chat_to_file
+
+    chat_data = get_chat_data(vod_id)
+    if chat_data:
+        return chat_data
+
+    print("💬 Чат не найден. Пробуем скачать...")
+    duration = parse_duration(vod_info.get("duration") or "")
+    downloaded_chat = download_chat_to_file(vod_id, duration=duration or None, progress=progress)
+    if not downloaded_chat:
+        print("❌ Не удалось скачать чат.")
+        return None
+    if getattr(downloaded_chat, "ref", None):
+        record_blob_refs(vod_id, downloaded_chat.path)  # Чат по хэшу: не удаляется, пока VOD на него ссылается
+    elif getattr(downloaded_chat, "path", None):
+        record_artifacts(downloaded_chat.path, vod_id=vod_id)
+    return downloaded_chat
+
+
 def save_stream_data(vod_id, stream_data):
-    """Сохраняет данные о трансляции в JSON-файл с именем, соответствующим vod_id."""
+    """
+    Сохраняет данные о трансляции: колоночное хранилище чата и сжатую запись трансляции с именем,
+    соответствующим vod_id. Чат читается потоково (ChatFile из chat_download).
+
+    Чат хранится один раз — колоночным хранилищем в каталоге чатов под именем из хэша содержимого;
+    запись трансляции ссылается на него в ключе "chat_ref" вместо копии чата. Скачанный NDJSON после
+    этого удаляется, если на него не ссылается другой VOD.
+    """
 
     # Путь к файлу будет использовать vod_id как имя файла
-    output_path = os.path.join(OUTPUT_DIR, f"{vod_id}.json")
+    output_path = get_stream_json_path(vod_id)
 
     # Проверяем, существует ли файл для данного vod_id
     if check_existing_data(vod_id):
@@ -109,9 +233,12 @@ def save_stream_data(vod_id, stream_data):
         return output_path  # Если файл существует, возвращаем путь к существующему файлу
 
     try:
-        # Сохраняем данные в JSON-файл
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(stream_data, f, ensure_ascii=False, indent=4)
+        chat = stream_data.get("chat")
+        _write_stream_data(vod_id, stream_data)
+
+        # Скачанный чат (NDJSON и ссылка на него) больше не нужен: чат сохранён в хранилище
+        if isinstance(chat, ChatFile):
+            release_artifacts(chat.path, os.path.join(CHATS_DIR, f"{vod_id}{CHAT_REF_EXTENSION}"))
 
         print(f"💾 Данные сохранены в {output_path}")
         return output_path
@@ -120,6 +247,59 @@ def save_stream_data(vod_id, stream_data):
         return None
 
 
+def _write_stream_data(vod_id, stream_data):
+    """
+    Записывает чат в колоночное хранилище по хэшу (если такого ещё нет) с индексом токенов и запись
+    трансляции со ссылкой на него; ссылки VOD в манифесте заменяются ссылками на хранилище и индекс.
+
+    Returns:
+        str: Путь к записи трансляции.
+    """
+    output_path = get_stream_json_path(vod_id)
+
+    # Колоночное хранилище, из которого читает аналитика, и индекс токенов для поиска по ключевым словам
+    store_path, content_sha256 = write_chat_store_blob(CHATS_DIR, stream_data.get("chat") or [])
+    index_path = get_token_index_path(store_path)
+    if not os.path.exists(index_path):
+        save_token_index(store_path)
+    with open_chat_store(store_path) as store:
+        messages = len(store)
+
+    # Запись трансляции: те же поля, но вместо чата — ссылка на хранилище (первым ключом)
+    record = {CHAT_REF_KEY: make_chat_ref(store_path, {"sha256": content_sha256, "messages": messages})}
+    record.update((key, value) for key, value in stream_data.items() if key not in ("chat", "token_index"))
+    write_stream_json(output_path, record)
+    record_artifacts(output_path)
+    record_blob_refs(vod_id, *[path for path in (store_path, index_path) if os.path.exists(path)], replace=True)
+    return output_path
+
+
+def write_stream_json(output_path, stream_data):
+    """
+    Записывает данные трансляции в компактный JSON, не собирая чат в памяти.
+
+    stream_data["chat"] может быть любым итерируемым объектом (список, ChatFile, ChatStore).
+    Файл публикуется атомарно: сначала пишется временный файл, затем он переименовывается.
+    Если output_path оканчивается на .gz, JSON сжимается по мере записи.
+    """
+    with atomic_writer(output_path) as f:
+        f.write("{")
+        for i, (key, value) in enumerate(stream_data.items()):
+            if i:
+                f.write(",")
+            f.write(json.dumps(key, ensure_ascii=False) + ":")
+            if key == "chat":
+                f.write("[")
+                for j, msg in enumerate(value or []):
+                    if j:
+                        f.write(",\n")
+                    f.write(json.dumps(msg, ensure_ascii=False, separators=(",", ":")))
+                f.write("]")
+            else:
+                f.write(json.dumps(value, ensure_ascii=False, separators=(",", ":")))
+        f.write("}")
+
+
 # Пример использования
 if __name__ == "__main__":
     video_id = "2434728985"
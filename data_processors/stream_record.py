@@ -0,0 +1,206 @@
+# data_processors/stream_record.py
+
+import glob
+import json
+import os
+from dotenv import load_dotenv
+from compressed_io import GZIP_EXTENSION, atomic_writer, find_artifact, open_text
+from data_collectors.chat_file import CHAT_REF_EXTENSION, ChatFile, read_chat_ref
+from data_processors.chat_store import STORE_EXTENSION, ChatStore, open_chat_store
+from data_processors.storage_manifest import record_artifacts
+
+# Загрузим .env.local для локальной разработки
+if os.environ.get('FLASK_ENV') == 'development':
+    load_dotenv('.env.local')
+else:
+    load_dotenv('.env.docker')
+
+PROJECT_ROOT = os.getenv('PROJECT_ROOT')
+STREAM_DATA_DIR = os.path.join(PROJECT_ROOT or ".", 'stream_data')
+CHATS_DIR = os.path.join(PROJECT_ROOT or ".", 'chats')
+
+# Запись трансляции ({vod_id}.json.gz) хранит чат не целиком, а ссылкой на сохранённый по хэшу чат:
+#   "chat_ref": {"sha256": ..., "messages": ..., "path": "chats/{sha256}.chat"} (путь от PROJECT_ROOT)
+# Колоночное хранилище — единственная копия чата: из него читает аналитика и собирается выгрузка.
+# Ссылка пишется первым ключом, поэтому формат записи виден по её началу без разбора всего файла.
+# Записи прежних версий (чат в ключе "chat" или ссылка на NDJSON chats/{sha256}.ndjson.gz) читаются
+# как раньше и переводятся на хранилище при первом чтении чата (stream_compose.get_chat_data).
+CHAT_REF_KEY = "chat_ref"
+CHAT_REF_PREFIX = '{"chat_ref":'
+# Сжатая выгрузка JSON трансляции с чатом целиком (GET /get_file): собирается один раз и отдаётся файлом
+EXPORT_EXTENSION = ".export.json" + GZIP_EXTENSION
+
+
+def get_stream_json_path(vod_id):
+    """Возвращает путь к сжатому JSON с данными трансляции (без .gz — несжатый файл старого формата)."""
+    return os.path.join(STREAM_DATA_DIR, f"{vod_id}.json{GZIP_EXTENSION}")
+
+
+def find_stream_json(vod_id):
+    """Возвращает путь к существующему JSON трансляции (сжатому или старого формата) или None."""
+    return find_artifact(os.path.join(STREAM_DATA_DIR, f"{vod_id}.json"))
+
+
+def get_export_path(vod_id):
+    """Возвращает путь к сжатой выгрузке JSON трансляции с чатом."""
+    return os.path.join(STREAM_DATA_DIR, f"{vod_id}{EXPORT_EXTENSION}")
+
+
+def make_chat_ref(blob_path, blob_ref):
+    """Ссылка на сохранённый по хэшу чат для записи трансляции."""
+    return {
+        "sha256": blob_ref["sha256"],
+        "messages": blob_ref.get("messages"),
+        "path": os.path.relpath(os.path.abspath(blob_path), os.path.abspath(PROJECT_ROOT or ".")),
+    }
+
+
+def resolve_chat_ref(chat_ref):
+    """Путь к файлу чата по ссылке из записи трансляции."""
+    return os.path.join(PROJECT_ROOT or ".", chat_ref["path"])
+
+
+def is_chat_store_ref(chat_ref):
+    """Ссылается ли запись на колоночное хранилище (иначе — на NDJSON прежних версий)."""
+    return chat_ref["path"].endswith(STORE_EXTENSION)
+
+
+def references_chat(path):
+    """Хранит ли запись трансляции чат ссылкой (иначе чат записан в ней целиком)."""
+    with open_text(path) as f:
+        return f.read(len(CHAT_REF_PREFIX)) == CHAT_REF_PREFIX
+
+
+def read_record_chat_ref(path):
+    """Ссылка на чат из записи трансляции или None (чат записан в ней целиком или запись повреждена)."""
+    try:
+        if not references_chat(path):
+            return None
+        with open_text(path) as f:
+            return json.load(f)[CHAT_REF_KEY]
+    except (OSError, ValueError, KeyError, EOFError):
+        return None
+
+
+def is_record_complete(path):
+    """
+    Собран ли VOD полностью: запись со ссылкой на чат без самого файла чата считается несобранной
+    (чат удалён), и VOD собирается заново.
+    """
+    try:
+        if not references_chat(path):
+            return True  # Чат записан в самой записи (прежний формат)
+    except (OSError, EOFError):
+        return False
+    chat_ref = read_record_chat_ref(path)
+    return chat_ref is not None and os.path.exists(resolve_chat_ref(chat_ref))
+
+
+def read_blob_refs(path):
+    """
+    Общие файлы (чаты по хэшу), на которые ссылается файл хранилища: запись трансляции или ссылка
+    на скачанный чат ({vod_id}.ref.json). Для остальных файлов — пустой список.
+    """
+    name = os.path.basename(path)
+    if name.endswith(CHAT_REF_EXTENSION):
+        ref = read_chat_ref(path)
+        return [os.path.join(os.path.dirname(path), ref["file"])] if ref else []
+    if name.endswith((".json", ".json" + GZIP_EXTENSION)):
+        chat_ref = read_record_chat_ref(path)
+        if not chat_ref:
+            return []
+        chat_path = resolve_chat_ref(chat_ref)
+        if not is_chat_store_ref(chat_ref):
+            return [chat_path]
+        # Рядом с хранилищем — файлы с тем же хэшем в имени (индекс токенов)
+        return [entry for entry in glob.glob(chat_path[:-len(STORE_EXTENSION)] + ".*")
+                if not entry.endswith(".tmp")]
+    return []
+
+
+def read_stream_record(path):
+    """
+    Читает запись трансляции; чат по ссылке подставляется в ключ "chat": ChatStore для колоночного
+    хранилища (закрывает вызывающий код) или ChatFile для NDJSON (читается лениво).
+
+    Raises:
+        FileNotFoundError: Если чат, на который ссылается запись, не найден.
+    """
+    with open_text(path) as f:
+        record = json.load(f)
+
+    chat_ref = record.pop(CHAT_REF_KEY, None)
+    if chat_ref is not None:
+        chat_path = resolve_chat_ref(chat_ref)
+        if not os.path.exists(chat_path):
+            raise FileNotFoundError(f"Чат {chat_path} из записи {path} не найден.")
+        record["chat"] = ChatStore(chat_path) if is_chat_store_ref(chat_ref) else ChatFile(chat_path, chat_ref)
+    return record
+
+
+def iter_stream_json(path, batch_size=1000):
+    """
+    Отдаёт JSON трансляции с чатом целиком (как выгружался раньше), собирая его из записи и файла чата.
+
+    Чат выводится последним ключом и читается по одному сообщению (из хранилища через mmap, NDJSON —
+    построчно без разбора), поэтому выгрузка не зависит от размера чата по памяти.
+
+    Yields:
+        bytes: Части JSON-документа.
+    """
+    with open_text(path) as f:
+        record = json.load(f)
+    chat_ref = record.pop(CHAT_REF_KEY)
+
+    yield b"{"
+    for key, value in record.items():
+        yield (json.dumps(key, ensure_ascii=False) + ":" +
+               json.dumps(value, ensure_ascii=False, separators=(",", ":")) + ",").encode("utf-8")
+
+    yield b'"chat":['
+    first = True
+    batch = []
+    for line in _iter_chat_lines(chat_ref):
+        batch.append(line)
+        if len(batch) >= batch_size:
+            yield (("" if first else ",\n") + ",\n".join(batch)).encode("utf-8")
+            first, batch = False, []
+    if batch:
+        yield (("" if first else ",\n") + ",\n".join(batch)).encode("utf-8")
+    yield b"]}"
+
+
+def _iter_chat_lines(chat_ref):
+    """Сообщения чата по ссылке из записи — по одному компактному JSON на сообщение."""
+    chat_path = resolve_chat_ref(chat_ref)
+    if is_chat_store_ref(chat_ref):
+        with open_chat_store(chat_path) as store:
+            for msg in store:
+                yield json.dumps(msg, ensure_ascii=False, separators=(",", ":"))
+        return
+    with open_text(chat_path) as chat:
+        for line in chat:
+            line = line.rstrip("\n")
+            if line:
+                yield line
+
+
+def build_stream_export(vod_id, record_path):
+    """
+    Возвращает сжатую выгрузку JSON трансляции с чатом, собирая её, только если её нет или запись
+    трансляции новее: повторные скачивания отдают готовый файл без сборки и сжатия.
+
+    Выгрузка учитывается в манифесте как файл VOD и удаляется вместе с ним.
+    """
+    export_path = get_export_path(vod_id)
+    try:
+        if os.stat(export_path).st_mtime_ns >= os.stat(record_path).st_mtime_ns:
+            return export_path
+    except FileNotFoundError:
+        pass
+
+    with atomic_writer(export_path, text=False) as out:
+        for chunk in iter_stream_json(record_path):
+            out.write(chunk)
+    record_artifacts(export_path, vod_id=vod_id)
+    return export_path
@@ -0,0 +1,220 @@
+# data_processors/token_index.py
+
+import array
+import json
+import mmap
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+# Инвертированный индекс токенов чата одного VOD (строится при сохранении трансляции):
+#   vocab          — токены в нижнем регистре, отсортированные и соединённые через "\n"
+#   vocab_index    — int64[v + 1], границы токенов в строке vocab (в символах)
+#   postings_index — int64[v + 1], границы списков сообщений каждого токена в postings
+#   postings       — int32, отсортированные индексы сообщений в ChatStore
+#   meta           — JSON: content_sha256 хранилища чата, количество сообщений и токенов
+# Токены — слова текста в нижнем регистре, разделённые пробельными символами (в том числе эмоуты).
+MAGIC = b"CHATIDX1"
+VERSION = 1
+SECTIONS = ("vocab", "vocab_index", "postings_index", "postings", "meta")
+
+HEADER = struct.Struct("<8sII")  # magic, version, количество секций
+SECTION = struct.Struct("<QQ")  # смещение секции, длина секции
+ALIGNMENT = 8
+
+INDEX_EXTENSION = ".idx"
+
+
+def tokenize(text):
+    """Разбивает текст сообщения на токены так же, как их нормализует поиск по ключевым словам."""
+    return text.lower().split()
+
+
+def build_token_index(store, path):
+    """
+    Строит индекс токенов по открытому ChatStore и атомарно записывает его в path.
+
+    Args:
+        store (ChatStore): Колоночное хранилище чата.
+        path (str): Путь к файлу индекса.
+
+    Returns:
+        int: Количество различных токенов.
+    """
+    postings = {}
+    for index, text in enumerate(store.iter_bodies()):
+        for token in set(tokenize(text)):
+            token_postings = postings.get(token)
+            if token_postings is None:
+                token_postings = postings[token] = array.array("i")
+            token_postings.append(index)
+
+    vocab = sorted(postings)
+    vocab_index = array.array("q", [0])
+    postings_index = array.array("q", [0])
+    for token in vocab:
+        vocab_index.append(vocab_index[-1] + len(token) + 1)
+        postings_index.append(postings_index[-1] + len(postings[token]))
+
+    meta = {"content_sha256": store.content_sha256, "messages": len(store), "tokens": len(vocab)}
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.write(b"\0" * (HEADER.size + SECTION.size * len(SECTIONS)))
+            positions = []
+
+            def write_section(chunks):
+                _pad(out)
+                start = out.tell()
+                for chunk in chunks:
+                    out.write(chunk)
+                positions.append((start, out.tell() - start))
+
+            # Каждый токен завершается "\n", поэтому vocab_index[i + 1] - 1 — конец i-го токена
+            write_section(f"{token}\n".encode("utf-8") for token in vocab)
+            write_section([vocab_index.tobytes()])
+            write_section([postings_index.tobytes()])
+            write_section(postings[token].tobytes() for token in vocab)
+            write_section([json.dumps(meta).encode("utf-8")])
+
+            out.seek(0)
+            out.write(HEADER.pack(MAGIC, VERSION, len(SECTIONS)))
+            for start, length in positions:
+                out.write(SECTION.pack(start, length))
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return len(vocab)
+
+
+def _pad(out):
+    remainder = out.tell() % ALIGNMENT
+    if remainder:
+        out.write(b"\0" * (ALIGNMENT - remainder))
+
+
+class TokenIndex:
+    """
+    Индекс токенов, открытый через mmap.
+
+    lookup() возвращает те же сообщения, что и поиск подстроки без учёта регистра
+    (KeywordMatcher без regex): ключевое слово без пробелов входит в текст тогда и только тогда,
+    когда оно входит в один из его токенов, поэтому достаточно найти такие токены в словаре
+    и объединить их списки сообщений.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"Файл {path} пуст.")
+
+        magic, version, section_count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION or section_count != len(SECTIONS):
+            self.close()
+            raise ValueError(f"Файл {path} не является индексом токенов версии {VERSION}.")
+
+        sections = {}
+        for i, name in enumerate(SECTIONS):
+            start, length = SECTION.unpack_from(self._mm, HEADER.size + i * SECTION.size)
+            sections[name] = (start, length)
+
+        def section(name, dtype):
+            start, length = sections[name]
+            return np.frombuffer(self._mm, dtype=dtype, count=length // np.dtype(dtype).itemsize, offset=start)
+
+        self._vocab_index = section("vocab_index", np.int64)
+        self._postings_index = section("postings_index", np.int64)
+        self._postings = section("postings", np.int32)
+        start, length = sections["vocab"]
+        self._vocab = str(self._mm[start:start + length], "utf-8")
+
+        start, length = sections["meta"]
+        meta = json.loads(str(self._mm[start:start + length], "utf-8"))
+        self.content_sha256 = meta["content_sha256"]
+        self.messages = meta["messages"]
+
+    def __len__(self):
+        return len(self._vocab_index) - 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def supports(self, keyword, use_regex=False):
+        """Можно ли ответить на запрос по индексу (иначе нужен полный просмотр сообщений)."""
+        return not use_regex and bool(keyword) and not any(char.isspace() for char in keyword)
+
+    def token_ids(self, keyword):
+        """Номера токенов словаря, содержащих ключевое слово (без учёта регистра)."""
+        needle = keyword.lower()
+        vocab, vocab_index = self._vocab, self._vocab_index
+        ids = []
+        position = vocab.find(needle)
+        while position != -1:
+            token_id = int(np.searchsorted(vocab_index, position, side="right")) - 1
+            ids.append(token_id)
+            # Следующее вхождение ищем уже в следующем токене
+            position = vocab.find(needle, int(vocab_index[token_id + 1]))
+        return ids
+
+    def lookup(self, keyword):
+        """
+        Возвращает отсортированные индексы сообщений, содержащих ключевое слово.
+
+        Returns:
+            numpy.ndarray: Индексы сообщений (int64).
+        """
+        hits = np.zeros(self.messages, dtype=bool)
+        postings, postings_index = self._postings, self._postings_index
+        for token_id in self.token_ids(keyword):
+            hits[postings[postings_index[token_id]:postings_index[token_id + 1]]] = True
+        return np.flatnonzero(hits)
+
+    def __del__(self):
+        # Индекс из кэша чатов закрывается, когда его отпускает последний читатель
+        self.close()
+
+    def close(self):
+        """Освобождает mmap и файл (если на секции ещё ссылаются массивы numpy — вместе с последним из них)."""
+        self._vocab_index = self._postings_index = self._postings = None
+        if getattr(self, "_mm", None) is not None and not self._mm.closed:
+            try:
+                self._mm.close()
+            except BufferError:
+                pass
+        if getattr(self, "_file", None) is not None:
+            self._file.close()
+
+
+def open_token_index(path, content_sha256=None):
+    """
+    Открывает индекс токенов, если он есть и построен для того же содержимого чата.
+
+    Returns:
+        TokenIndex | None: Индекс или None, если файла нет, он повреждён или устарел.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        index = TokenIndex(path)
+    except (ValueError, OSError):
+        return None
+    if content_sha256 is not None and index.content_sha256 != content_sha256:
+        index.close()
+        return None
+    return index
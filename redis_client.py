@@ -0,0 +1,40 @@
+import uuid
+import redis
+from config import Config
+
+_client = None
+
+
+def get_redis():
+    """Возвращает общий клиент Redis (создаётся при первом обращении)."""
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(Config.REDIS_URL)
+    return _client
+
+
+def acquire_lock(client, key, timeout):
+    """
+    Ставит блокировку key на timeout секунд, если её никто не держит.
+
+    Returns:
+        str | None: Токен владельца (нужен для release_lock) или None, если блокировку держит другой.
+    """
+    token = uuid.uuid4().hex
+    return token if client.set(key, token, nx=True, px=int(timeout * 1000)) else None
+
+
+def release_lock(client, key, token):
+    """
+    Снимает блокировку, только если она всё ещё принадлежит token: блокировка, истёкшая и взятая
+    другим, не удаляется. Сравнение и удаление выполняются в транзакции (WATCH/MULTI).
+    """
+    with client.pipeline() as pipe:
+        pipe.watch(key)
+        owner = pipe.get(key)
+        if owner is not None and (owner.decode() if isinstance(owner, bytes) else owner) == token:
+            pipe.multi()
+            pipe.delete(key)
+            pipe.execute()
+        else:
+            pipe.unwatch()
@@ -1,12 +1,22 @@
-from flask import Blueprint, render_template, request, jsonify, session, send_from_directory, abort
+from flask import (Blueprint, Response, render_template, request, jsonify, session, send_from_directory, abort,
+                   stream_with_context)
 from celery.result import AsyncResult
 from config import Config
 
 from app import limiter
-from tasks import save_stream_task, run_analysis_task, get_active_tasks_count
+from tasks import app as celery, save_stream_task, run_analysis_task, get_queue_status
 from data_collectors.helix_api import extract_vod_id, get_streamer_id
+from data_processors.result_cache import get_cached_result
+from data_processors.ingest_registry import INGEST_QUEUED_TTL, claim_ingest, release_ingest
+from data_analytic.buckets import parse_bucket_seconds
+from data_analytic.heavy_hitters import parse_heavy_hitters_capacity
+from data_processors.storage_manifest import touch_vod
+from compressed_io import is_compressed, iter_decompressed
+from task_progress import DONE, iter_task_events
+from data_processors.stream_record import build_stream_export, find_stream_json, is_record_complete, references_chat
 import os
 import json
+import uuid
 
 main = Blueprint("main", __name__)
 PROJECT_ROOT = os.getenv("PROJECT_ROOT")
@@ -24,7 +34,19 @@ def index():
 
         if streamer_id is not None:
             session["vod_id"] = vod_id
-            task = save_stream_task.apply_async(args=[vod_id])
+
+            # Если этот VOD уже собирается, отдаём id той задачи: браузер следит за её прогрессом
+            task_id = str(uuid.uuid4())
+            # Пока задача ждёт в очереди, регистрацию никто не продлевает — срок дольше, чем у выполняющейся
+            owner = claim_ingest(vod_id, task_id, ttl=INGEST_QUEUED_TTL)
+            if owner is not None and owner != task_id:
+                return jsonify({"task_id": owner})
+
+            try:
+                task = save_stream_task.apply_async(args=[vod_id], task_id=task_id)
+            except Exception:
+                release_ingest(vod_id, task_id)
+                raise
             return jsonify({"task_id": task.id})
         else:
             return jsonify({"message": "Ошибка: недействительный ID трансляции"}), 400
@@ -37,8 +59,20 @@ def run_analysis():
     top_chatters_count = int(request.form.get('top_chatters_count', 10))
     top_pastes_count = int(request.form.get('top_pastes_count', 10))
     emoticons_count = int(request.form.get('emoticons_count', 10))
+    activity_dense = request.form.get('activity_dense') in ('1', 'true')
     vod_id = session.get("vod_id")
 
+    try:
+        activity_bucket_seconds = parse_bucket_seconds(request.form.get('activity_bucket_seconds'))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": f"Ошибка в ширине интервала: {str(e)}"}), 400
+
+    # Приближённый топ чаттеров и эмоутов (Space-Saving) для очень больших чатов; по умолчанию — точный
+    try:
+        heavy_hitters_capacity = parse_heavy_hitters_capacity(request.form.get('heavy_hitters_capacity'))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": f"Ошибка в размере приближённого топа: {str(e)}"}), 400
+
     keywords_raw = request.form.get('keywords', '[]')
     try:
         keywords = json.loads(keywords_raw)
@@ -50,20 +84,40 @@ def run_analysis():
     if not metrics or not vod_id:
         return jsonify({"status": "error", "message": "Отсутствуют метрики или VOD ID"}), 400
 
+    # Если такой анализ уже выполнялся, отвечаем сразу, не занимая воркер
+    received_data = {
+        "vod_id": vod_id,
+        "metrics": metrics,
+        "top_chatters_count": top_chatters_count,
+        "keywords": keywords,
+        "top_pastes_count": top_pastes_count,
+        "emoticons_count": emoticons_count,
+        "activity_bucket_seconds": activity_bucket_seconds,
+        "activity_dense": activity_dense,
+    }
+    if heavy_hitters_capacity:
+        received_data["heavy_hitters_capacity"] = heavy_hitters_capacity
+    cached = get_cached_result(received_data)
+    if cached is not None:
+        return jsonify({"status": "success", "result": {"status": "success", **cached, "cached": True}})
+
     task = run_analysis_task.delay(
         vod_id,
         metrics,
         top_chatters_count,
         keywords,
         top_pastes_count,
-        emoticons_count
+        emoticons_count,
+        activity_bucket_seconds,
+        activity_dense,
+        heavy_hitters_capacity=heavy_hitters_capacity
     )
 
     return jsonify({"status": "success", "task_id": task.id})
 
 @main.route('/check_status/<task_id>', methods=['GET'])
 def check_status(task_id):
-    task = AsyncResult(task_id)
+    task = AsyncResult(task_id, app=celery)
     if task.state == 'PENDING':
         return jsonify({"status": "pending"})
     elif task.state == 'SUCCESS':
@@ -73,25 +127,60 @@ def check_status(task_id):
     else:
         return jsonify({"status": "unknown"})
 
+@main.route('/task_events/<task_id>', methods=['GET'])
+def task_events(task_id):
+    """Поток событий прогресса задачи (SSE) до её завершения; заменяет опрос /check_status."""
+    # Задача могла завершиться раньше, чем браузер подключился (и итог в Redis уже истёк)
+    task = AsyncResult(task_id, app=celery)
+    initial_event = None
+    if task.state == 'SUCCESS':
+        initial_event = {"type": DONE, "status": "success", "result": task.result}
+    elif task.state == 'FAILURE':
+        initial_event = {"type": DONE, "status": "failure", "result": str(task.result)}
+
+    return Response(stream_with_context(iter_task_events(task_id, initial_event)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @main.route('/get_file/<file_id>', methods=['GET'])
 def get_file(file_id):
     storage_dir = os.path.join(PROJECT_ROOT, 'stream_data')
-    file_path = os.path.join(storage_dir, f'{file_id}.json')
-    if not os.path.exists(file_path):
+    file_path = find_stream_json(file_id)
+    if file_path is None or not is_record_complete(file_path):
+        # Чат, на который ссылается запись, удалён — VOD считается несобранным
         abort(404, description="File not found")
-    return send_from_directory(storage_dir, f'{file_id}.json', as_attachment=True)
+    touch_vod(file_id)
+
+    download_name = f'{file_id}.json'
+    if not is_compressed(file_path):
+        return send_from_directory(storage_dir, download_name, as_attachment=True)
+
+    if references_chat(file_path):
+        # Чат хранится отдельно (по хэшу): JSON с чатом собирается и сжимается один раз, дальше отдаётся файлом
+        file_path = build_stream_export(file_id, file_path)
+
+    if 'gzip' in request.accept_encodings:
+        # Сжатый файл отдаётся как есть, распаковывает его клиент
+        response = send_from_directory(storage_dir, os.path.basename(file_path), as_attachment=True,
+                                       download_name=download_name, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(iter_decompressed(file_path), mimetype='application/json',
+                            headers={'Content-Disposition': f'attachment; filename={download_name}'})
+    response.vary.add('Accept-Encoding')
+    return response
 
 
 @main.route('/worker_status', methods=['GET'])
 @limiter.limit("12 per minute")  # Ограничение на количество запросов
 def worker_status():
     try:
-        active_count = get_active_tasks_count()
+        queues = get_queue_status()
         max_workers = Config.MAX_WORKERS
 
         return jsonify({
-            "active_tasks": active_count,
-            "max_workers": max_workers
+            "active_tasks": sum(queue["active"] for queue in queues.values()),
+            "max_workers": max_workers,
+            "queues": queues  # {очередь: {"waiting": в брокере, "active": выполняется}}
         })
 
     except Exception as e:
@@ -5,7 +5,7 @@ document.addEventListener("DOMContentLoaded", () => {
     const resultsContainer = document.getElementById("results");
     const workerStatusCounter = document.getElementById("active_tasks_counter");
     const maxWorkersCounter = document.getElementById("max_workers_counter");
-    let intervalId;
+    const taskProgress = document.getElementById("task_progress");
 
     analyticsForm.style.display = "none";
 
@@ -41,7 +41,7 @@ document.addEventListener("DOMContentLoaded", () => {
 
             if (response.ok && data.task_id) {
                 statusMessage.textContent = "Данные загружаются, подождите...";
-                await checkDataLoadingStatus(data.task_id);
+                checkDataLoadingStatus(data.task_id);
             } else {
                 statusMessage.textContent = data.message || "Ошибка загрузки данных.";
             }
@@ -51,24 +51,113 @@ document.addEventListener("DOMContentLoaded", () => {
         }
     });
 
-    async function checkDataLoadingStatus(taskId) {
+    // Названия этапов задач для строки статуса
+    const stageLabels = {
+        waiting: "Эту трансляцию уже загружает другая задача, ждём её",
+        vod_info: "Получаем информацию о трансляции",
+        emotes: "Загружаем эмоуты",
+        chat: "Получаем чат",
+        chat_download: "Скачиваем чат",
+        categories: "Получаем категории",
+        save: "Сохраняем данные",
+        analysis: "Считаем аналитику"
+    };
+
+    // Сколько обрывов потока событий подряд допускается, прежде чем перейти на опрос /check_status
+    const maxStreamErrors = 3;
+
+    // Следит за задачей по событиям сервера (SSE): прогресс приходит сразу, без опроса /check_status.
+    // onDone получает итог в том же виде, что и /check_status: { status: "success" | "failure", result }.
+    function watchTask(taskId, onDone) {
+        if (!window.EventSource) {
+            pollTask(taskId, onDone);
+            return;
+        }
+
+        const source = new EventSource(`/task_events/${taskId}`);
+        let errors = 0;
+
+        const fallBackToPolling = () => {
+            source.close();
+            taskProgress.hidden = true;
+            pollTask(taskId, onDone);
+        };
+
+        source.onmessage = (message) => {
+            errors = 0;
+            let event;
+            try {
+                event = JSON.parse(message.data);
+            } catch (err) {
+                console.warn("Некорректное событие задачи:", message.data);
+                return;
+            }
+            if (event.type === "done") {
+                source.close();
+                taskProgress.hidden = true;
+                onDone(event);
+            } else if (event.type === "fallback") {
+                // Сервер не может передавать события (Redis недоступен)
+                fallBackToPolling();
+            } else {
+                renderProgress(event);
+            }
+        };
+        // При обрыве EventSource переподключается сам, сервер сразу присылает последнее событие.
+        // Если соединение закрыто окончательно (ответ не 200) или рвётся раз за разом — опрашиваем /check_status
+        source.onerror = () => {
+            errors += 1;
+            if (source.readyState === EventSource.CLOSED || errors >= maxStreamErrors) {
+                console.warn("Поток событий недоступен, переходим на опрос статуса задачи.");
+                fallBackToPolling();
+            } else {
+                console.warn("Соединение с потоком событий прервано, переподключаемся...");
+            }
+        };
+    }
+
+    // Запасной вариант для браузеров без EventSource и при недоступном потоке событий
+    async function pollTask(taskId, onDone) {
         try {
             const response = await fetch(`/check_status/${taskId}`);
             const data = await response.json();
+            if (data.status === "success" || data.status === "failure") {
+                onDone(data);
+            } else {
+                setTimeout(() => pollTask(taskId, onDone), 1000);
+            }
+        } catch (err) {
+            onDone({ status: "failure", result: "ошибка при проверке статуса" });
+            console.error(err);
+        }
+    }
+
+    function renderProgress(event) {
+        const label = stageLabels[event.stage] || event.stage;
 
+        if (event.stage === "chat_download") {
+            const parts = [`${label}: ${event.messages} сообщ., ${event.pages} стр.`];
+            if (event.duration) {
+                const percent = Math.min(100, Math.round(100 * event.offset_seconds / event.duration));
+                taskProgress.hidden = false;
+                taskProgress.value = percent;
+                parts.push(`${percent}%`);
+            }
+            statusMessage.textContent = parts.join(" — ") + "...";
+        } else if (event.status === "started") {
+            statusMessage.textContent = label + "...";
+        }
+    }
+
+    function checkDataLoadingStatus(taskId) {
+        watchTask(taskId, (data) => {
             if (data.status === "success") {
                 statusMessage.textContent = "Данные загружены. Можно запускать аналитику.";
                 analyticsForm.style.display = "block";
-            } else if (data.status === "failure") {
-                statusMessage.textContent = "Ошибка при загрузке данных: " + data.result;
             } else {
-                statusMessage.textContent = "Данные загружаются, подождите...";
-                setTimeout(() => checkDataLoadingStatus(taskId), 1000);
+                statusMessage.textContent = "Ошибка при загрузке данных: " + data.result;
             }
-        } catch (err) {
-            statusMessage.textContent = "Ошибка при проверке статуса загрузки.";
-            console.error(err);
-        }
+        });
     }
 
     analyticsForm.addEventListener("submit", async (event) => {
@@ -92,7 +181,12 @@ document.addEventListener("DOMContentLoaded", () => {
             const response = await fetch("/run_analysis", { method: "POST", body: formData });
             const data = await response.json();
 
-            if (data.status === "success") {
+            if (data.status === "success" && data.result) {
+                // Результат взят из кэша — задача не запускалась
+                statusMessage.textContent = "Аналитика завершена.";
+                renderResults(data.result);
+                submitButton.disabled = false;
+            } else if (data.status === "success") {
                 checkAnalysisStatus(data.task_id, submitButton);
             } else {
                 statusMessage.textContent = "Ошибка запуска аналитики.";
@@ -106,32 +200,16 @@ document.addEventListener("DOMContentLoaded", () => {
     });
 
     function checkAnalysisStatus(taskId, submitButton) {
-        intervalId = setInterval(async () => {
-            try {
-                const response = await fetch(`/check_status/${taskId}`);
-                const data = await response.json();
-
-                if (data.status === "pending") {
-                    statusMessage.textContent = "Аналитика выполняется, подождите...";
-                } else if (data.status === "success") {
-                    statusMessage.textContent = "Аналитика завершена.";
-                    renderResults(data.result);
-                    clearInterval(intervalId);
-                    submitButton.disabled = false;
-                } else {
-                    statusMessage.textContent = data.status === "failure"
-                        ? "Ошибка выполнения аналитики: " + data.result
-                        : "Неизвестный статус задачи.";
-                    clearInterval(intervalId);
-                    submitButton.disabled = false;
-                }
-            } catch (err) {
-                statusMessage.textContent = "Ошибка проверки статуса.";
-                clearInterval(intervalId);
-                submitButton.disabled = false;
-                console.error(err);
+        statusMessage.textContent = "Аналитика выполняется, подождите...";
+        watchTask(taskId, (data) => {
+            if (data.status === "success") {
+                statusMessage.textContent = "Аналитика завершена.";
+                renderResults(data.result);
+            } else {
+                statusMessage.textContent = "Ошибка выполнения аналитики: " + data.result;
             }
-        }, 1000);
+            submitButton.disabled = false;
+        });
     }
 
     function renderResults(result) {
@@ -203,7 +281,10 @@ document.addEventListener("DOMContentLoaded", () => {
         resultsContainer.appendChild(block);
     }
 
-    if (res.chat_activity?.messages_per_minute) {
+    // Словарный формат (messages_by_bucket; messages_per_minute — у результатов прежних версий) или плотный
+    const activityData = res.chat_activity;
+    if (activityData && (activityData.messages_by_bucket || activityData.messages_per_minute
+                         || Array.isArray(activityData.messages_per_bucket))) {
     const old = document.getElementById("activityChart");
     if (old) old.remove();
 
@@ -213,7 +294,7 @@ document.addEventListener("DOMContentLoaded", () => {
 
     // Заголовок
     const title = document.createElement("h3");
-    title.textContent = "Активность по минутам";
+    title.textContent = "Активность чата";
     block.appendChild(title);
 
     // Canvas для графика
@@ -236,23 +317,41 @@ document.addEventListener("DOMContentLoaded", () => {
     resultsContainer.appendChild(block);
 
     // Данные и создание графика
-    const allData = res.chat_activity.messages_per_minute;
-    const keywordData = res.chat_activity.keyword_messages_per_minute || {};
-    const categoryIntervals = res.chat_activity.category_intervals || [];
-
-    const minutes = Array.from(new Set([
-        ...Object.keys(allData),
-        ...Object.keys(keywordData)
-    ])).map(m => parseInt(m, 10)).sort((a, b) => a - b);
-
-    const total = minutes.map(m => allData[m] || 0);
-    const byKeyword = minutes.map(m => keywordData[m] || 0);
+    const activity = res.chat_activity;
+    const bucketSeconds = activity.bucket_seconds || 60;
+    const categoryIntervals = activity.category_intervals || [];
+
+    let minutes, total, byKeyword;
+    if (Array.isArray(activity.messages_per_bucket)) {
+        // Плотный формат: элемент i относится к интервалу first_bucket + i
+        total = activity.messages_per_bucket;
+        byKeyword = activity.keyword_messages_per_bucket;
+        minutes = total.map((_, i) => activity.first_bucket + i);
+    } else {
+        const allData = activity.messages_by_bucket || activity.messages_per_minute;
+        const keywordData = activity.keyword_messages_by_bucket || activity.keyword_messages_per_minute || {};
+
+        minutes = Array.from(new Set([
+            ...Object.keys(allData),
+            ...Object.keys(keywordData)
+        ])).map(m => parseInt(m, 10)).sort((a, b) => a - b);
+
+        total = minutes.map(m => allData[m] || 0);
+        byKeyword = minutes.map(m => keywordData[m] || 0);
+    }
     const categoryColors = generateCategoryColorMap(categoryIntervals);
 
+    // Подпись интервала: минуты, а для интервалов короче минуты — минуты:секунды
+    const formatBucket = bucket => {
+        const seconds = bucket * bucketSeconds;
+        if (bucketSeconds >= 60) return `${seconds / 60} мин`;
+        return `${Math.floor(seconds / 60)}:${String(seconds % 60).padStart(2, "0")}`;
+    };
+
     const chart = new Chart(canvas, {
         type: "line",
         data: {
-            labels: minutes.map(m => `${m} мин`),
+            labels: minutes.map(formatBucket),
             datasets: [
                 {
                     label: "Ключевые слова",
@@ -323,7 +422,7 @@ document.addEventListener("DOMContentLoaded", () => {
             },
             scales: {
                 x: {
-                    title: { display: true, text: "Минута стрима" }
+                    title: { display: true, text: "Время стрима" }
                 },
                 y: {
                     beginAtZero: true,
@@ -0,0 +1,133 @@
+import json
+import os
+import threading
+import time
+from logging_config import setup_logger
+from redis.exceptions import RedisError
+from redis_client import get_redis
+
+# Логгер
+logger = setup_logger("task_progress")
+
+# Прогресс задач Celery передаётся через Redis pub/sub: задача публикует события в канал task_progress:{task_id},
+# веб-процесс пересылает их браузеру по SSE. Последнее событие дополнительно хранится в ключе с тем же именем,
+# чтобы подписчик, подключившийся позже, сразу получил текущее состояние.
+CHANNEL_PREFIX = "task_progress"
+PROGRESS_TTL = int(os.getenv("TASK_PROGRESS_TTL", 3600))  # Сколько хранится последнее событие, с
+PROGRESS_MIN_INTERVAL = float(os.getenv("TASK_PROGRESS_MIN_INTERVAL", 0.5))  # Не чаще одного события за, с
+SSE_HEARTBEAT_SECONDS = 15  # Комментарий-пинг в SSE, чтобы соединение не закрывали прокси
+
+DONE = "done"
+FALLBACK = "fallback"  # Поток событий недоступен (Redis): браузер переходит на опрос /check_status
+
+
+def get_channel(task_id):
+    return f"{CHANNEL_PREFIX}:{task_id}"
+
+
+def publish_event(task_id, event):
+    """Публикует событие задачи и сохраняет его как последнее (ошибка Redis не должна ломать задачу)."""
+    payload = json.dumps(event, ensure_ascii=False)
+    try:
+        redis = get_redis()
+        pipe = redis.pipeline()
+        pipe.set(get_channel(task_id), payload, ex=PROGRESS_TTL)
+        pipe.publish(get_channel(task_id), payload)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"⚠️ Не удалось опубликовать прогресс задачи {task_id}: {e}")
+
+
+def publish_done(task_id, status, result):
+    """Публикует итог задачи: status — "success" или "failure", result — то же, что отдаёт /check_status."""
+    publish_event(task_id, {"type": DONE, "status": status, "result": result})
+
+
+class ProgressReporter:
+    """
+    Отправитель событий прогресса одной задачи.
+
+    Вызывается как функция: reporter("chat", pages=10, offset_seconds=600, duration=3600).
+    События одного этапа прореживаются до одного за min_interval секунд; смена этапа и force=True
+    отправляются сразу. Можно вызывать из нескольких потоков.
+    """
+
+    def __init__(self, task_id, min_interval=PROGRESS_MIN_INTERVAL):
+        self.task_id = task_id
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._stage = None
+        self._last_sent = 0.0
+
+    def __call__(self, stage, force=False, **fields):
+        now = time.monotonic()
+        with self._lock:
+            if not force and stage == self._stage and now - self._last_sent < self.min_interval:
+                return
+            self._stage = stage
+            self._last_sent = now
+        publish_event(self.task_id, {"type": "progress", "stage": stage, **fields})
+
+
+def get_last_event(task_id):
+    """Последнее опубликованное событие задачи или None."""
+    payload = get_redis().get(get_channel(task_id))
+    try:
+        return json.loads(payload) if payload else None
+    except ValueError:
+        logger.warning(f"⚠️ Некорректное последнее событие задачи {task_id}: {payload!r}")
+        return None
+
+
+def iter_task_events(task_id, initial_event=None, heartbeat=SSE_HEARTBEAT_SECONDS):
+    """
+    Отдаёт события задачи в формате SSE до итогового события.
+
+    Подписка оформляется до чтения последнего события, поэтому событие, опубликованное между ними,
+    не теряется. initial_event — итог, известный заранее (задача уже завершилась).
+    Некорректные сообщения пропускаются. Если Redis недоступен, поток завершается событием
+    {"type": "fallback"}: браузер дальше опрашивает /check_status.
+
+    Yields:
+        str: Сообщения SSE ("data: ...\n\n") и пинги (": ping\n\n").
+    """
+    if initial_event is not None:
+        yield _format_sse(initial_event)
+        return
+
+    pubsub = None
+    try:
+        pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(get_channel(task_id))
+        last_event = get_last_event(task_id)
+        if last_event is not None:
+            yield _format_sse(last_event)
+            if last_event.get("type") == DONE:
+                return
+
+        while True:
+            message = pubsub.get_message(timeout=heartbeat)
+            if message is None:
+                yield ": ping\n\n"
+                continue
+            try:
+                event = json.loads(message["data"])
+            except ValueError:
+                logger.warning(f"⚠️ Пропущено некорректное событие задачи {task_id}: {message['data']!r}")
+                continue
+            yield _format_sse(event)
+            if event.get("type") == DONE:
+                return
+    except (RedisError, OSError) as e:
+        logger.warning(f"⚠️ Поток событий задачи {task_id} прерван, браузер перейдёт на опрос: {e}")
+        yield _format_sse({"type": FALLBACK})
+    finally:
+        if pubsub is not None:
+            try:
+                pubsub.close()
+            except (RedisError, OSError):
+                pass
+
+
+def _format_sse(event):
+    return f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
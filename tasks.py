@@ -1,12 +1,16 @@
-from celery import Celery
+from celery import chord
+from celery.exceptions import Ignore
+from celery.signals import task_postrun
+from celery_config import BROWSER_QUEUE, BROWSER_TASK_TIMEOUT, TASK_QUEUES, get_queue_depths, make_celery
 import os
+import time
 from dotenv import load_dotenv
-from data_processors.stream_compose import collect_stream_data, save_stream_data
-from data_processors.analytic_composer import analyze_stream_data
-from data_processors.data_storage import delete_old_streams  # Импортируем функцию из нового модуля
 
-# Пример создания Celery приложения
-app = Celery('tasks', broker='pyamqp://guest@localhost//')
+# Модуль импортирует и веб-процесс (ему нужны только сигнатуры задач для отправки), поэтому
+# сборщики и аналитика (selenium, numpy и т.д.) импортируются внутри задач, то есть только в воркере.
+
+# Единое приложение Celery (брокер и бэкенд из Config, очереди и маршруты задач — в celery_config)
+app = make_celery()
 
 # Загружаем конфигурацию (если нужно)
 # Загрузим .env.local.local для локальной разработки
@@ -17,32 +21,143 @@ else:
 
 PROJECT_ROOT = os.getenv('PROJECT_ROOT')  # Для теста можно использовать /tmp
 STORAGE_PATHS = [os.path.join(PROJECT_ROOT, 'stream_data'), os.path.join(PROJECT_ROOT, 'chats')]
+STORAGE_CLEANUP_INTERVAL = int(os.getenv("STORAGE_CLEANUP_INTERVAL", 3600))  # Период плановой очистки, с
+
+# Плановая очистка хранилища (celery beat); между запусками она запускается только при превышении лимита
+app.conf.beat_schedule = {
+    "storage-cleanup": {
+        "task": "tasks.cleanup_task",
+        "schedule": STORAGE_CLEANUP_INTERVAL,
+        "args": (STORAGE_PATHS,),
+        "kwargs": {"rescan": True},
+    },
+}
+
+# Задачи, о ходе которых браузер узнаёт по SSE (/task_events/<task_id>), а не опросом /check_status
+# (итог анализа по шардам публикует merge_analysis_task: он выполняется с id исходной задачи)
+PROGRESS_TASKS = {"tasks.save_stream_task", "tasks.run_analysis_task", "tasks.merge_analysis_task"}
+
+
+@task_postrun.connect
+def publish_task_result(sender=None, task_id=None, retval=None, state=None, **kwargs):
+    """Публикует итог задачи подписчикам прогресса в том же виде, что и /check_status."""
+    if sender is None or sender.name not in PROGRESS_TASKS:
+        return
+    if state == "IGNORED":
+        return  # Задача заменена (анализ по шардам): итог опубликует задача, которая её заменила
+    from task_progress import publish_done
+
+    if state == "SUCCESS":
+        publish_done(task_id, "success", retval)
+    else:
+        publish_done(task_id, "failure", str(retval))
 
 
 # Задача для сохранения данных о стриме
 @app.task(bind=True)
 def save_stream_task(self, vod_id):
+    from data_processors.stream_compose import collect_stream_data, save_stream_data
+    from data_collectors.http_client import get_http_stats
+    from data_collectors.browser_pool import get_browser_pool_stats
+    from data_processors.storage_manifest import pinned_vod
+    from data_processors.data_storage import storage_over_limit
+    from data_processors.ingest_registry import (INGEST_WAIT_TIMEOUT, claim_ingest, ingest_heartbeat, release_ingest,
+                                                 wait_for_ingest)
+    from task_progress import ProgressReporter
+
+    progress = ProgressReporter(self.request.id)
+
+    # Один VOD собирает одна задача: если его уже собирает другая, ждём её (не дольше INGEST_WAIT_TIMEOUT)
+    # и берём готовые данные
+    deadline = time.monotonic() + INGEST_WAIT_TIMEOUT
+    owner = claim_ingest(vod_id, self.request.id)
+    while owner is not None and owner != self.request.id:
+        progress("waiting", force=True, owner_task_id=owner)
+        if not wait_for_ingest(vod_id, owner, timeout=max(0.0, deadline - time.monotonic())):
+            return {'status': 'error', 'message': f'VOD {vod_id} собирает задача {owner}: '
+                                                  f'не дождались её завершения за {INGEST_WAIT_TIMEOUT} с.'}
+        owner = claim_ingest(vod_id, self.request.id)
+
     try:
-        # Собираем данные о трансляции
-        stream_data = collect_stream_data(vod_id)
+        # Регистрация продлевается, пока идёт сбор; файлы VOD закреплены: очистка не удалит скачанный
+        # чат до сохранения
+        with ingest_heartbeat(vod_id, self.request.id), pinned_vod(vod_id):
+            # Собираем данные о трансляции (время каждого этапа попадает в stage_timings)
+            stage_timings = {}
+            stream_data = collect_stream_data(vod_id, timings=stage_timings, progress=progress,
+                                              fetch_categories=fetch_categories_in_browser_queue)
+
+            if not stream_data:
+                return {'status': 'error', 'message': 'Не удалось собрать данные для трансляции'}
 
-        if not stream_data:
-            return {'status': 'error', 'message': 'Не удалось собрать данные для трансляции'}
+            # Сохраняем данные в файл, используя vod_id в качестве имени
+            progress("save", force=True, status="started")
+            started = time.perf_counter()
+            file_path = save_stream_data(vod_id, stream_data)
+            stage_timings['save'] = round(time.perf_counter() - started, 3)
 
-        # Сохраняем данные в файл, используя vod_id в качестве имени
-        file_path = save_stream_data(vod_id, stream_data)
+        # Новые файлы могли превысить лимит хранилища — очищаем сразу, не дожидаясь планового запуска
+        if file_path and storage_over_limit(STORAGE_PATHS):
+            cleanup_task.apply_async((STORAGE_PATHS,))
 
         if file_path:
             # Возвращаем путь к файлу (или его имя)
-            return {'status': 'success', 'file_path': file_path}
+            return {'status': 'success', 'file_path': file_path, 'http_stats': get_http_stats(),
+                    'browser_pool': get_browser_pool_stats(), 'stage_timings': stage_timings}
         else:
             return {'status': 'error', 'message': 'Ошибка при сохранении файла.'}
 
     except Exception as e:
         return {'status': 'error', 'message': str(e)}
+    finally:
+        release_ingest(vod_id, self.request.id)
+
+
+def fetch_categories_in_browser_queue(vod_id):
+    """
+    Парсит категории задачей в очереди browser и ждёт результат (сборщик не запускает Chrome сам).
+
+    Этап категорий идёт параллельно со скачиванием чата внутри сбора (stage_graph), а его результат
+    нужен до сохранения записи, поэтому подзадача ожидается здесь, а не через chord.
+    """
+    # Ожидание не может заблокировать само себя, только пока очередь browser разбирает отдельный воркер
+    # (docker-compose: celery_worker_browser), а поток ingest-io лишь ждёт его. Воркер, который разбирает
+    # browser сам (запуск без -Q), мог бы занять ожиданием все свои слоты, и подзадачам не хватило бы
+    # места — тогда категории парсятся в этом же потоке
+    if BROWSER_QUEUE in app.amqp.queues.consume_from:
+        from data_collectors.category_parser import process_url
+
+        return process_url(vod_id)
+
+    result = scrape_categories_task.apply_async((vod_id,))
+    try:
+        return result.get(timeout=BROWSER_TASK_TIMEOUT, disable_sync_subtasks=False)
+    finally:
+        result.forget()
+
+
+# Задача для парсинга категорий в headless Chrome (очередь browser)
+@app.task(bind=True)
+def scrape_categories_task(self, vod_id):
+    from data_collectors.category_parser import process_url
+
+    return process_url(vod_id)
+
 
 @app.task(bind=True)
-def run_analysis_task(self, vod_id, metrics, top_chatters_count=10, keywords="", top_pastes_count=10, emoticons_count=10):
+def run_analysis_task(self, vod_id, metrics, top_chatters_count=10, keywords="", top_pastes_count=10, emoticons_count=10,
+                      activity_bucket_seconds=60, activity_dense=False, sharded=None, heavy_hitters_capacity=None):
+    """
+    Анализ чата. sharded: None — по шардам, если чат большой (ANALYSIS_SHARD_MIN_MESSAGES),
+    True — по шардам всегда, False — всегда одним процессом. heavy_hitters_capacity — приближённый
+    топ чаттеров и эмоутов в фиксированной памяти (None — точный).
+    """
+    from data_processors.analytic_composer import analyze_stream_data, plan_analysis_shards
+    from data_processors.chat_cache import get_chat_cache_stats
+    from data_processors.result_cache import get_cached_result, store_result
+    from task_progress import ProgressReporter
+
+    progress = ProgressReporter(self.request.id)
     try:
         # Подготовка входных данных в нужной структуре
         input_data = {
@@ -53,11 +168,34 @@ def run_analysis_task(self, vod_id, metrics, top_chatters_count=10, keywords="",
                 "keywords": keywords,
                 "top_pastes_count": top_pastes_count,
                 "emoticons_count": emoticons_count,
+                "activity_bucket_seconds": activity_bucket_seconds,
+                "activity_dense": activity_dense,
             },
             "status": "success"
         }
+        if heavy_hitters_capacity:
+            input_data["received_data"]["heavy_hitters_capacity"] = heavy_hitters_capacity
+
+        # Тот же VOD с теми же параметрами уже анализировали — отдаём сохранённый результат
+        cached = get_cached_result(input_data["received_data"])
+        if cached is not None:
+            return {"status": "success", **cached, "cached": True}
 
         # Вызов основной аналитической функции
+        progress("analysis", force=True, status="started", metrics=metrics)
+
+        # Большой чат: шарды считаются параллельно в очереди analytics-cpu, результат собирает
+        # merge_analysis_task; она заменяет эту задачу и завершается с её id
+        shards = plan_analysis_shards(input_data["received_data"], force=bool(sharded)) if sharded is not False else None
+        if shards:
+            progress("analysis", force=True, status="sharded", shards=len(shards))
+            # Если шард не вернул результат (воркер упал, лимит времени), merge не запустится: итог
+            # с ошибкой для подписчиков прогресса публикует errback
+            raise self.replace(chord(
+                [analyze_shard_task.s(input_data["received_data"], start, stop) for start, stop in shards],
+                merge_analysis_task.s(input_data["received_data"]),
+            ).on_error(analysis_failed_task.s(self.request.id)))
+
         analysis_result = analyze_stream_data(input_data)
 
         # Если внутри анализа что-то пошло не так — пробрасываем сообщение
@@ -67,23 +205,89 @@ def run_analysis_task(self, vod_id, metrics, top_chatters_count=10, keywords="",
                 "message": analysis_result.get("message", "Неизвестная ошибка анализа")
             }
 
-        # Вызов задачи очистки после успешного анализа
-        cleanup_task.apply_async((STORAGE_PATHS,), kwargs={'max_age_days': 30, 'max_folder_size_mb': 5000, 'max_size_mb': 500})
+        progress("analysis", force=True, status="done")
+        store_result(input_data["received_data"], {
+            "received_data": input_data["received_data"],
+            "analysis_result": analysis_result
+        })
 
         return {
             "status": "success",
             "received_data": input_data["received_data"],
+            "analysis_result": analysis_result,
+            "chat_cache": get_chat_cache_stats()
+        }
+
+    except Ignore:
+        raise
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
+# Map-шаг анализа по шардам: состояние метрик по сообщениям [start, stop)
+@app.task(bind=True)
+def analyze_shard_task(self, received_data, start, stop):
+    from data_processors.analytic_composer import analyze_stream_shard
+
+    try:
+        return analyze_stream_shard(received_data, start, stop)
+    except Exception as e:
+        # Ошибка шарда — обычный результат: merge вернёт её как итог анализа
+        return {"status": "error", "message": str(e)}
+
+
+# Reduce-шаг: складывает состояния шардов; ответ тот же, что у run_analysis_task
+@app.task(bind=True)
+def merge_analysis_task(self, partials, received_data):
+    from data_processors.analytic_composer import merge_stream_shards
+    from data_processors.chat_cache import get_chat_cache_stats
+    from data_processors.result_cache import store_result
+
+    try:
+        analysis_result = merge_stream_shards(received_data, partials)
+        if isinstance(analysis_result, dict) and analysis_result.get("status") == "error":
+            return {
+                "status": "error",
+                "message": analysis_result.get("message", "Неизвестная ошибка анализа")
+            }
+
+        store_result(received_data, {
+            "received_data": received_data,
             "analysis_result": analysis_result
+        })
+
+        return {
+            "status": "success",
+            "received_data": received_data,
+            "analysis_result": analysis_result,
+            "chat_cache": get_chat_cache_stats(),
+            "shards": len(partials)
         }
 
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
+# Errback анализа по шардам: chord не дошёл до merge_analysis_task, поэтому итог публикуется здесь
+# (без bind: Celery вызывает такой errback с запросом и исключением упавшей задачи)
+@app.task
+def analysis_failed_task(request, exc, traceback, task_id):
+    from task_progress import publish_done
+
+    publish_done(task_id, "failure", str(exc))
+
+
 @app.task(bind=True)
-def cleanup_task(self, paths=None, max_age_days=60, max_folder_size_mb=10000, max_size_mb=100):
+def cleanup_task(self, paths=None, max_age_days=None, max_folder_size_mb=None, max_size_mb=None, rescan=False):
+    from data_collectors.emote import prune_emote_cache
+    from data_processors.data_storage import delete_old_streams
+
     try:
-        # Выполнение очистки
-        deleted_files_count = delete_old_streams(paths, max_age_days, max_folder_size_mb, max_size_mb)
+        # Выполнение очистки (лимиты, которые не переданы, берутся из переменных окружения STORAGE_*)
+        limits = {'max_age_days': max_age_days, 'max_folder_size_mb': max_folder_size_mb, 'max_size_mb': max_size_mb}
+        deleted_files_count = delete_old_streams(paths or STORAGE_PATHS, rescan=rescan,
+                                                 **{k: v for k, v in limits.items() if v is not None})
+        # Кэш эмоций каналов не относится к VOD и очищается по возрасту (EMOTE_CACHE_MAX_AGE_DAYS)
+        deleted_files_count += prune_emote_cache()
 
         return {'status': 'success', 'deleted_files': deleted_files_count}
 
@@ -93,4 +297,22 @@ def cleanup_task(self, paths=None, max_age_days=60, max_folder_size_mb=10000, ma
 def get_active_tasks_count():
     i = app.control.inspect()
     active = i.active() or {}
-    return sum(len(tasks) for tasks in active.values())
\ No newline at end of file
+    return sum(len(tasks) for tasks in active.values())
+
+
+def get_queue_status():
+    """
+    Загрузка каждой очереди: сколько задач ждёт в брокере и сколько выполняется воркерами.
+
+    Returns:
+        dict: {очередь: {"waiting": int, "active": int}}.
+    """
+    depths = get_queue_depths(app)
+    active = app.control.inspect().active() or {}
+    status = {queue: {"waiting": depths.get(queue, 0), "active": 0} for queue in TASK_QUEUES}
+    for tasks in active.values():
+        for task in tasks:
+            queue = (task.get("delivery_info") or {}).get("routing_key")
+            if queue in status:
+                status[queue]["active"] += 1
+    return status
\ No newline at end of file
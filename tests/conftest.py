@@ -0,0 +1,87 @@
+import os
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Модули проекта читают окружение при импорте: каталоги данных — во временном каталоге,
+# обязательные переменные — заглушки (сеть в тестах не используется)
+os.environ.setdefault("PROJECT_ROOT", tempfile.mkdtemp(prefix="twitch-analytics-tests-"))
+os.environ.setdefault("CHAT_CLIENT_ID", "test-client-id")
+os.environ.setdefault("CHAT_CLIENT_SHA", "test-client-sha")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+SAMPLE_EMOTES = {
+    "twitch": [{"name": "Kappa", "url": "https://emotes.test/kappa"}],
+    "bttv": [{"name": "LUL", "url": "https://emotes.test/lul"}, {"name": "OMEGALUL", "url": "https://emotes.test/omegalul"}],
+    "7tv": [{"name": "Pog", "url": "https://emotes.test/pog"}],
+}
+SAMPLE_CATEGORIES = [
+    {"category": "Just Chatting", "end_time": 600, "duration": 600},
+    {"category": "Art", "end_time": 1500, "duration": 900},
+]
+SAMPLE_PASTAS = [
+    "это длинная паста которую копируют все зрители подряд",
+    "это длинная паста которую копируют все зрители подряд LUL",
+    "this is a copypasta that everyone spams in chat Kappa",
+    "this is a copypasta that everyone spams in chat Kappa Kappa",
+    "completely different repeated message here",
+]
+SAMPLE_WORDS = ["lol", "LOL", "lolol", "lo", "Kappa", "LUL", "OMEGALUL", "Pog", "pog", "привет", "ПРИВЕТ", "gg",
+                "wp", "omegalul", "🙂", "hello", "chat", "stream", "kappa123"]
+
+
+def make_sample_chat(count=600, seed=7):
+    """Синтетический чат: повторяющиеся пасты, эмоуты, ключевые слова в разном регистре, пустые сообщения."""
+    rng = random.Random(seed)
+    commenters = [{"display_name": f"User{i}", "_id": str(i), "name": f"user{i}"} for i in range(40)]
+    commenters.append({"display_name": "", "_id": "40", "name": ""})
+    offset = 0
+    chat = []
+    for n in range(count):
+        offset += rng.choice((0, 0, 1, 2, 5, 17))
+        roll = rng.random()
+        if roll < 0.2:
+            body = rng.choice(SAMPLE_PASTAS)
+        elif roll < 0.25:
+            body = ""
+        else:
+            body = " ".join(rng.choice(SAMPLE_WORDS) for _ in range(rng.randint(1, 8)))
+        commenter = commenters[min(int(rng.paretovariate(1.2)) - 1, len(commenters) - 1)]
+        chat.append({
+            "_id": f"msg-{n}",
+            "created_at": "2025-01-01T00:00:00Z",
+            "content_offset_seconds": offset,
+            "commenter": dict(commenter),
+            "message": {"body": body, "user_color": "#FFFFFF", "badges": []},
+        })
+    return chat
+
+
+@pytest.fixture
+def sample_stream():
+    """Данные трансляции с чатом списком словарей."""
+    return {"chat": make_sample_chat(), "emotes": SAMPLE_EMOTES, "categories": SAMPLE_CATEGORIES}
+
+
+@pytest.fixture(params=[False, True], ids=["columns", "token-index"])
+def sample_store_stream(request, tmp_path):
+    """Данные трансляции с чатом в колоночном хранилище (с индексом токенов и без него)."""
+    from data_processors.chat_store import ChatStore, write_chat_store
+    from data_processors.token_index import build_token_index, open_token_index
+
+    store_path = str(tmp_path / "sample.chat")
+    write_chat_store(store_path, {"chat": make_sample_chat()})
+    store = ChatStore(store_path)
+    token_index = None
+    if request.param:
+        build_token_index(store, str(tmp_path / "sample.idx"))
+        token_index = open_token_index(str(tmp_path / "sample.idx"), store.content_sha256)
+    yield {"chat": store, "token_index": token_index, "emotes": SAMPLE_EMOTES, "categories": SAMPLE_CATEGORIES}
+    if token_index is not None:
+        token_index.close()
+    store.close()
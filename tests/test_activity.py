@@ -0,0 +1,117 @@
+import random
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from data_analytic.analyse import (build_activity_histogram, count_activity_buckets, format_activity_histogram,
+                                   merge_activity_buckets)
+from data_analytic.buckets import ACTIVITY_BUCKET_SECONDS
+
+
+def make_offsets(seed, count=2000, duration=4 * 3600):
+    """Смещения с паузами в чате (пустые интервалы) и началом не с нуля."""
+    rng = random.Random(seed)
+    offsets = [rng.randrange(600, duration) for _ in range(count)]
+    # Всплеск и пауза: плотный участок и участок без сообщений
+    offsets += [rng.randrange(3600, 3700) for _ in range(count // 4)]
+    offsets = [offset for offset in offsets if not 7200 <= offset < 9000]
+    keyword_offsets = [offset for offset in offsets if rng.random() < 0.2]
+    return offsets, keyword_offsets
+
+
+def baseline(offsets, keyword_offsets, bucket_seconds):
+    return (Counter(offset // bucket_seconds for offset in offsets),
+            Counter(offset // bucket_seconds for offset in keyword_offsets))
+
+
+def as_counters(first_bucket, counts, keyword_counts):
+    return ({first_bucket + i: int(n) for i, n in enumerate(counts) if n},
+            {first_bucket + i: int(n) for i, n in enumerate(keyword_counts) if n})
+
+
+@pytest.mark.parametrize("bucket_seconds", ACTIVITY_BUCKET_SECONDS)
+@pytest.mark.parametrize("seed", [1, 2])
+def test_count_matches_counter(bucket_seconds, seed):
+    offsets, keyword_offsets = make_offsets(seed)
+    first_bucket, counts, keyword_counts = count_activity_buckets(offsets, keyword_offsets, bucket_seconds)
+    expected, expected_keywords = baseline(offsets, keyword_offsets, bucket_seconds)
+
+    assert first_bucket == min(expected)
+    assert len(counts) == len(keyword_counts) == max(expected) - first_bucket + 1
+    assert as_counters(first_bucket, counts, keyword_counts) == (dict(expected), dict(expected_keywords))
+
+
+@pytest.mark.parametrize("bucket_seconds", ACTIVITY_BUCKET_SECONDS)
+@pytest.mark.parametrize("parts", [2, 5, 13])
+def test_merge_matches_single_count(bucket_seconds, parts):
+    rng = random.Random(parts)
+    offsets, _ = make_offsets(parts)
+    messages = sorted((offset, rng.random() < 0.2) for offset in offsets)  # (смещение, есть ключевое слово)
+    bounds = sorted(rng.sample(range(1, len(messages)), parts - 1))
+    chunks = [messages[start:stop] for start, stop in zip([0] + bounds, bounds + [len(messages)])]
+
+    def count(chunk):
+        return count_activity_buckets([offset for offset, _ in chunk], [offset for offset, hit in chunk if hit],
+                                      bucket_seconds)
+
+    # Пустая часть (шард без сообщений) не влияет на результат; порядок частей не важен
+    counted = [count(chunk) for chunk in chunks] + [count([])]
+    rng.shuffle(counted)
+
+    first_bucket, counts, keyword_counts = merge_activity_buckets(counted)
+    single = count(messages)
+
+    assert first_bucket == single[0]
+    assert counts.tolist() == single[1].tolist()
+    assert keyword_counts.tolist() == single[2].tolist()
+
+
+@pytest.mark.parametrize("bucket_seconds", ACTIVITY_BUCKET_SECONDS)
+def test_sparse_format(bucket_seconds):
+    offsets, keyword_offsets = make_offsets(3)
+    result = build_activity_histogram(offsets, keyword_offsets, bucket_seconds)
+    expected, expected_keywords = baseline(offsets, keyword_offsets, bucket_seconds)
+    first, last = min(expected), max(expected)
+
+    assert result["bucket_seconds"] == bucket_seconds
+    # Пустые интервалы (пауза в чате) в словаре всех сообщений не хранятся
+    assert result["messages_by_bucket"] == dict(expected)
+    assert result["keyword_messages_by_bucket"] == \
+        {bucket: expected_keywords[bucket] for bucket in range(first, last + 1)}
+    # Ключ «в минуту» есть только там, где интервал действительно минута
+    assert ("messages_per_minute" in result) == (bucket_seconds == 60)
+    if bucket_seconds == 60:
+        assert result["messages_per_minute"] == result["messages_by_bucket"]
+        assert result["keyword_messages_per_minute"] == result["keyword_messages_by_bucket"]
+
+
+@pytest.mark.parametrize("bucket_seconds", ACTIVITY_BUCKET_SECONDS)
+def test_dense_format(bucket_seconds):
+    offsets, keyword_offsets = make_offsets(4)
+    result = build_activity_histogram(offsets, keyword_offsets, bucket_seconds, dense=True)
+    expected, expected_keywords = baseline(offsets, keyword_offsets, bucket_seconds)
+    first, last = min(expected), max(expected)
+
+    assert set(result) == {"bucket_seconds", "first_bucket", "messages_per_bucket", "keyword_messages_per_bucket"}
+    assert result["first_bucket"] == first
+    assert result["messages_per_bucket"] == [expected[bucket] for bucket in range(first, last + 1)]
+    assert result["keyword_messages_per_bucket"] == [expected_keywords[bucket] for bucket in range(first, last + 1)]
+
+
+@pytest.mark.parametrize("dense", [False, True])
+def test_empty_chat(dense):
+    result = format_activity_histogram(*merge_activity_buckets([count_activity_buckets([], None, 30)]), 30, dense)
+
+    if dense:
+        assert result["messages_per_bucket"] == result["keyword_messages_per_bucket"] == []
+    else:
+        assert result["messages_by_bucket"] == result["keyword_messages_by_bucket"] == {}
+
+
+def test_accepts_numpy_and_memoryview_offsets():
+    offsets = np.array([0, 5, 59, 60, 61, 600], dtype=np.int32)
+    expected = {0: 3, 1: 2, 10: 1}
+
+    assert build_activity_histogram(offsets)["messages_by_bucket"] == expected
+    assert build_activity_histogram(memoryview(offsets.tobytes()).cast("i"))["messages_by_bucket"] == expected
@@ -0,0 +1,109 @@
+import json
+
+import pytest
+
+from data_analytic.engine import AGGREGATORS
+from data_processors import analytic_composer
+from data_processors.analytic_composer import (analyze_stream_data, analyze_stream_shard, merge_stream_shards,
+                                               plan_analysis_shards)
+from data_processors.stream_compose import save_stream_data
+
+KEYWORD_SETS = {
+    # Без пробелов — поиск по индексу токенов, с пробелом — проход по сообщениям
+    "token-index": ["lol", "Kappa", "привет", "lo", "OMEGALUL"],
+    "scan": ["lol", "gg wp", "привет", "нет такого"],
+}
+
+
+def json_round_trip(value):
+    """Состояния шардов и итог проходят через JSON-сериализатор Celery."""
+    return json.loads(json.dumps(value, ensure_ascii=False))
+
+
+@pytest.fixture(scope="module")
+def saved_vod():
+    from conftest import SAMPLE_CATEGORIES, SAMPLE_EMOTES, make_sample_chat
+
+    vod_id = "shards-vod"
+    save_stream_data(vod_id, {"chat": make_sample_chat(), "emotes": SAMPLE_EMOTES, "categories": SAMPLE_CATEGORIES})
+    return vod_id
+
+
+def make_received_data(vod_id, keywords, **overrides):
+    received_data = {
+        "vod_id": vod_id,
+        "metrics": list(AGGREGATORS),
+        "top_chatters_count": 10,
+        "keywords": keywords,
+        "top_pastes_count": 10,
+        "emoticons_count": 3,
+        "activity_bucket_seconds": 60,
+        "activity_dense": False,
+    }
+    received_data.update(overrides)
+    return received_data
+
+
+def run_sharded(received_data, monkeypatch, shard_count):
+    monkeypatch.setattr(analytic_composer, "ANALYSIS_SHARD_MESSAGES", 1)
+    monkeypatch.setattr(analytic_composer, "ANALYSIS_MAX_SHARDS", shard_count)
+    shards = plan_analysis_shards(received_data, force=True)
+    assert shards is not None and 1 < len(shards) <= shard_count
+    partials = [json_round_trip(analyze_stream_shard(received_data, start, stop)) for start, stop in shards]
+    return merge_stream_shards(received_data, partials)
+
+
+@pytest.mark.parametrize("shard_count", [2, 3, 7, 16])
+@pytest.mark.parametrize("keywords", list(KEYWORD_SETS.values()), ids=list(KEYWORD_SETS))
+def test_sharded_analysis_matches_single_pass(saved_vod, monkeypatch, shard_count, keywords):
+    received_data = make_received_data(saved_vod, keywords)
+
+    single = analyze_stream_data({"received_data": received_data})
+    sharded = run_sharded(received_data, monkeypatch, shard_count)
+
+    for metric in AGGREGATORS:
+        assert json_round_trip(sharded[metric]) == json_round_trip(single[metric]), metric
+
+
+@pytest.mark.parametrize("bucket_seconds, dense", [(10, True), (300, False)])
+def test_sharded_activity_with_other_buckets(saved_vod, monkeypatch, bucket_seconds, dense):
+    received_data = make_received_data(saved_vod, KEYWORD_SETS["scan"], metrics=["chat_activity"],
+                                       activity_bucket_seconds=bucket_seconds, activity_dense=dense)
+
+    single = analyze_stream_data({"received_data": received_data})
+
+    assert json_round_trip(run_sharded(received_data, monkeypatch, 5)) == json_round_trip(single)
+
+
+def test_sharded_heavy_hitters_with_enough_capacity(saved_vod, monkeypatch):
+    received_data = make_received_data(saved_vod, [], metrics=["top_chatters", "top_emoticons"],
+                                       heavy_hitters_capacity=1000)
+
+    single = analyze_stream_data({"received_data": received_data})
+
+    assert json_round_trip(run_sharded(received_data, monkeypatch, 4)) == json_round_trip(single)
+
+
+def test_shard_tasks_match_single_pass(saved_vod, monkeypatch):
+    tasks = pytest.importorskip("tasks")
+    monkeypatch.setattr("data_processors.result_cache.store_result", lambda *args: None)
+    monkeypatch.setattr(analytic_composer, "ANALYSIS_SHARD_MESSAGES", 1)
+    monkeypatch.setattr(analytic_composer, "ANALYSIS_MAX_SHARDS", 4)
+    received_data = make_received_data(saved_vod, KEYWORD_SETS["scan"])
+
+    shards = plan_analysis_shards(received_data, force=True)
+    partials = [json_round_trip(tasks.analyze_shard_task.apply(args=[received_data, start, stop]).get())
+                for start, stop in shards]
+    merged = tasks.merge_analysis_task.apply(args=[partials, received_data]).get()
+
+    assert merged["status"] == "success"
+    assert merged["shards"] == len(shards)
+    assert json_round_trip(merged["analysis_result"]) == \
+        json_round_trip(analyze_stream_data({"received_data": received_data}))
+
+
+def test_failed_shard_fails_the_merge(saved_vod):
+    received_data = make_received_data(saved_vod, [])
+    partials = [analyze_stream_shard(received_data, 0, 10), {"status": "error", "message": "шард упал"}]
+
+    assert merge_stream_shards(received_data, partials) == {"status": "error", "message": "шард упал"}
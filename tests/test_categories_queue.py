@@ -0,0 +1,51 @@
+import pytest
+
+tasks = pytest.importorskip("tasks")
+
+from celery_config import BROWSER_QUEUE, INGEST_QUEUE
+
+
+class FakeResult:
+    def __init__(self, value):
+        self.value = value
+        self.forgotten = False
+        self.get_kwargs = None
+
+    def get(self, **kwargs):
+        self.get_kwargs = kwargs
+        return self.value
+
+    def forget(self):
+        self.forgotten = True
+
+
+def consume_only(monkeypatch, *queues):
+    """Воркер, запущенный с -Q: разбирает только перечисленные очереди."""
+    selected = {name: queue for name, queue in tasks.app.amqp.queues.items() if name in queues}
+    monkeypatch.setattr(tasks.app.amqp.queues, "_consume_from", selected)
+
+
+def test_waits_for_browser_worker(monkeypatch):
+    consume_only(monkeypatch, INGEST_QUEUE)
+    result = FakeResult([{"name": "Just Chatting"}])
+    monkeypatch.setattr(tasks.scrape_categories_task, "apply_async", lambda args: result)
+
+    assert tasks.fetch_categories_in_browser_queue("1") == [{"name": "Just Chatting"}]
+    assert result.get_kwargs["timeout"] == tasks.BROWSER_TASK_TIMEOUT
+    assert result.forgotten
+
+
+@pytest.mark.parametrize("queues", [None, (INGEST_QUEUE, BROWSER_QUEUE)], ids=["all-queues", "ingest-and-browser"])
+def test_parses_in_place_when_worker_consumes_browser_queue(monkeypatch, queues):
+    # Ждать подзадачу в своей же очереди нельзя: все слоты могли бы уйти на ожидание
+    if queues is not None:
+        consume_only(monkeypatch, *queues)
+    category_parser = pytest.importorskip("data_collectors.category_parser")
+    monkeypatch.setattr(category_parser, "process_url", lambda vod_id: [{"vod": vod_id}])
+
+    def unexpected(*args, **kwargs):
+        raise AssertionError("подзадача не должна отправляться")
+
+    monkeypatch.setattr(tasks.scrape_categories_task, "apply_async", unexpected)
+
+    assert tasks.fetch_categories_in_browser_queue("7") == [{"vod": "7"}]
@@ -0,0 +1,77 @@
+from pathlib import Path
+
+import pytest
+
+from data_collectors import category_parser
+from data_collectors.category_parser import html_to_text, parse_categories
+
+PAGES_DIR = Path(__file__).parent / "fixtures" / "category_parser"
+
+
+def load_page_text(name):
+    """Текст сохранённой страницы VOD, как его получает парсер после браузера."""
+    return html_to_text((PAGES_DIR / name).read_text(encoding="utf-8"))
+
+
+def test_html_to_text_flattens_markup_without_scripts():
+    text = load_page_text("vod_chapters.html")
+
+    assert "Volume 00:00:00 03:12:45 Just Chatting 1 hour 5 minutes left Minecraft" in text
+    assert "Share Minecraft ·" in text
+    assert "__twilightBuildID" not in text
+    assert "<" not in text
+
+
+def test_parse_categories_with_chapters():
+    current, categories = parse_categories(load_page_text("vod_chapters.html"))
+
+    assert current == "Minecraft"
+    assert categories == [
+        {"category": "Just Chatting", "end_time": 3900, "duration": 3900},
+        {"category": "Minecraft", "end_time": 11565, "duration": 7665},
+    ]
+
+
+def test_parse_categories_without_chapters():
+    current, categories = parse_categories(load_page_text("vod_single_category.html"))
+
+    assert current == "Just Chatting"
+    assert categories is None
+
+
+def test_parse_categories_unavailable_vod():
+    assert parse_categories(load_page_text("vod_unavailable.html")) == (None, None)
+
+
+@pytest.mark.parametrize("time_str, seconds", [
+    ("1 hour 5 minutes", 3900),
+    ("2 hours 7 minutes 45 seconds", 7665),
+    ("45 seconds", 45),
+    ("3 minutes", 180),
+])
+def test_time_to_seconds(time_str, seconds):
+    assert category_parser.time_to_seconds(time_str) == seconds
+
+
+def test_process_url_uses_page_chapters(monkeypatch):
+    monkeypatch.setattr(category_parser, "parse_data", lambda video_id: load_page_text("vod_chapters.html"))
+    monkeypatch.setattr(category_parser, "get_stream_duration", lambda video_id: pytest.fail("не должен вызываться"))
+
+    categories = category_parser.process_url("123")
+
+    assert [category["category"] for category in categories] == ["Just Chatting", "Minecraft"]
+
+
+def test_process_url_falls_back_to_vod_duration(monkeypatch):
+    monkeypatch.setattr(category_parser, "parse_data", lambda video_id: load_page_text("vod_single_category.html"))
+    monkeypatch.setattr(category_parser, "get_stream_duration", lambda video_id: 5400)
+
+    assert category_parser.process_url("123") == [
+        {"category": "Just Chatting", "end_time": 5400, "duration": 5400},
+    ]
+
+
+def test_process_url_without_page(monkeypatch):
+    monkeypatch.setattr(category_parser, "parse_data", lambda video_id: None)
+
+    assert category_parser.process_url("123") is None
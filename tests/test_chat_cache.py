@@ -0,0 +1,71 @@
+import gc
+import os
+
+import pytest
+
+from data_processors import chat_cache
+from data_processors.chat_cache import clear_chat_cache, get_cached_chat, get_chat_cache_stats
+from data_processors.chat_store import ChatStore, write_chat_store
+
+
+def make_chat(vod_id, count=20):
+    return [{
+        "_id": f"{vod_id}-{n}",
+        "created_at": "2025-01-01T00:00:00Z",
+        "content_offset_seconds": n,
+        "commenter": {"display_name": f"User{n % 3}", "_id": str(n % 3), "name": f"user{n % 3}"},
+        "message": {"body": f"message {n}", "user_color": "#FFFFFF", "badges": []},
+    } for n in range(count)]
+
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    # Бюджет меньше одного файла: в кэше остаётся только последний открытый чат
+    monkeypatch.setattr(chat_cache, "CHAT_CACHE_MAX_MB", 1e-6)
+    clear_chat_cache()
+    paths = {}
+    for vod_id in ("first", "second", "third"):
+        paths[vod_id] = str(tmp_path / f"{vod_id}.chat")
+        write_chat_store(paths[vod_id], {"chat": make_chat(vod_id)})
+    yield paths
+    clear_chat_cache()
+
+
+def load(vod_id, path):
+    return get_cached_chat(vod_id, path, lambda store_path: {"chat": ChatStore(store_path)})
+
+
+def test_evicted_unreferenced_store_is_closed(stores):
+    mapping = load("first", stores["first"])["chat"]._mm
+
+    load("second", stores["second"])
+    gc.collect()
+
+    assert mapping.closed
+    assert get_chat_cache_stats()["evicted_in_use"] == 0
+
+
+def test_evicted_store_stays_open_while_in_use(stores):
+    chat = load("first", stores["first"])["chat"]
+    mapping = chat._mm
+
+    load("second", stores["second"])
+    load("third", stores["third"])
+
+    # Вытесненный чат ещё читает анализ: хранилище не закрыто
+    assert not mapping.closed
+    assert chat[5]["_id"] == "first-5"
+    assert get_chat_cache_stats()["evicted_in_use"] == 1
+
+    del chat
+    gc.collect()
+    assert mapping.closed
+    assert get_chat_cache_stats()["evicted_in_use"] == 0
+
+
+def test_budget_counts_store_file_size(stores):
+    load("third", stores["third"])
+
+    stats = get_chat_cache_stats()
+    assert stats["entries"] == 1
+    assert stats["size_mb"] == round(os.path.getsize(stores["third"]) / (1024 * 1024), 2)
@@ -0,0 +1,91 @@
+import os
+
+import pytest
+
+from benchmarks.gql_stub_server import PAGE_SIZE, start_server
+from data_collectors import chat_download
+from data_collectors.chat_download import download_chat_to_file, get_segment_file_path
+
+DURATION = 120
+RATE = 5
+EXPECTED_IDS = [f"comment-{n}" for n in range(DURATION * RATE)]
+
+
+@pytest.fixture
+def gql_server(monkeypatch):
+    server, url = start_server(duration=DURATION, rate=RATE, latency=0)
+    monkeypatch.setattr(chat_download, "GQL_URL", url)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def comment_ids(chat):
+    return [comment["_id"] for comment in chat]
+
+
+def test_single_segment_download(gql_server):
+    chat = download_chat_to_file("stub-single", force_download=True, segments=1)
+
+    assert comment_ids(chat) == EXPECTED_IDS
+    assert gql_server.requests == len(EXPECTED_IDS) // PAGE_SIZE
+
+
+@pytest.mark.parametrize("segments", [2, 4, 7])
+def test_segmented_download_matches_single_segment(gql_server, segments):
+    single = download_chat_to_file("stub-reference", force_download=True, segments=1)
+    segmented = download_chat_to_file(f"stub-segments-{segments}", force_download=True, segments=segments,
+                                      duration=DURATION)
+
+    assert comment_ids(segmented) == comment_ids(single) == EXPECTED_IDS
+
+
+def test_download_retries_transient_errors(gql_server):
+    gql_server.faults.extend([None, None, 503, 429, None, 502])
+
+    chat = download_chat_to_file("stub-retry", force_download=True, segments=3, duration=DURATION)
+
+    assert comment_ids(chat) == EXPECTED_IDS
+    assert not gql_server.faults
+
+
+def test_download_resumes_after_interruption(gql_server, monkeypatch):
+    video_id = "stub-resume"
+    monkeypatch.setattr(chat_download.http_client, "HTTP_MAX_RETRIES", 0)
+
+    # Четвёртая страница не приходит: загрузка прерывается, файл отрезка остаётся на диске
+    gql_server.faults.extend([None, None, None, 503])
+    assert download_chat_to_file(video_id, force_download=True, segments=1) is None
+    segment_path = get_segment_file_path(video_id, 0, None)
+    assert os.path.exists(segment_path)
+
+    # Сбой посреди записи строки: оборванная строка отбрасывается при продолжении
+    with open(segment_path, "ab") as part:
+        part.write(b'{"_id": "comment-15')
+
+    requests_before = gql_server.requests
+    chat = download_chat_to_file(video_id, segments=1)
+
+    assert comment_ids(chat) == EXPECTED_IDS
+    assert not os.path.exists(segment_path)
+    # Продолжение начинается с последней записанной страницы, а не с начала чата
+    assert gql_server.requests - requests_before < len(EXPECTED_IDS) // PAGE_SIZE
+
+
+@pytest.mark.parametrize("page", [
+    b"not json",
+    b'{"data": null}',
+    b'{"data": {"video": {"comments": {"edges": [{"node": {"id": "x", "commenter": {"id": "1"}}}]}}}}',
+], ids=["not-json", "null-data", "broken-node"])
+def test_malformed_page_fails_segment_and_resumes(gql_server, monkeypatch, page):
+    video_id = "stub-malformed"
+    monkeypatch.setattr(chat_download.http_client, "HTTP_MAX_RETRIES", 0)
+
+    # Битая страница роняет только свой отрезок: загрузка сообщает об ошибке, а не падает
+    gql_server.faults.extend([None, None, None, page])
+    assert download_chat_to_file(video_id, force_download=True, segments=3, duration=DURATION) is None
+    assert not gql_server.faults
+
+    chat = download_chat_to_file(video_id, segments=3, duration=DURATION)
+
+    assert comment_ids(chat) == EXPECTED_IDS
@@ -0,0 +1,177 @@
+import json
+
+import pytest
+
+from data_processors import chat_store
+from data_processors.chat_store import ChatStore, open_chat_store, write_chat_store, write_chat_store_blob
+
+
+def make_chat():
+    return [
+        {
+            "_id": "a1",
+            "created_at": "2025-01-01T00:00:00Z",
+            "content_offset_seconds": 0,
+            "commenter": {"display_name": "Alice", "_id": "1", "name": "alice"},
+            "message": {"body": "привет чат LUL", "user_color": "#FF0000",
+                        "badges": [{"set_id": "subscriber", "version": "12"}]},
+        },
+        {
+            "_id": "b2",
+            "created_at": "2025-01-01T00:00:05Z",
+            "content_offset_seconds": 5,
+            "commenter": {"display_name": "Bob", "_id": "2", "name": "bob"},
+            "message": {"body": "", "user_color": None, "badges": []},
+        },
+        {
+            "_id": "a3",
+            "created_at": "2025-01-01T00:01:00Z",
+            "content_offset_seconds": 60,
+            "commenter": {"display_name": "Alice", "_id": "1", "name": "alice"},
+            "message": {"body": "🙂 emoji\nи перевод строки", "user_color": "#FF0000", "badges": []},
+        },
+    ]
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = str(tmp_path / "vod.chat")
+    write_chat_store(path, {"chat": make_chat(), "title": "stream"})
+    with ChatStore(path) as store:
+        yield store
+
+
+def test_round_trip_messages(store):
+    chat = make_chat()
+
+    assert len(store) == len(chat)
+    assert list(store) == chat
+    assert [store[i] for i in range(len(chat))] == chat
+    assert store[-1] == chat[-1]
+    with pytest.raises(IndexError):
+        store[len(chat)]
+    assert store.stream == {"title": "stream"}
+
+
+def test_slicing(store):
+    chat = make_chat()
+
+    assert store[1:] == chat[1:]
+    assert store[::2] == chat[::2]
+    assert store[5:] == []
+
+
+def test_columns(store):
+    chat = make_chat()
+
+    assert list(store.offsets) == [msg["content_offset_seconds"] for msg in chat]
+    assert [store.commenter_name(i) for i in range(len(chat))] == [msg["commenter"]["name"] for msg in chat]
+    assert [store.message_id(i) for i in range(len(chat))] == [msg["_id"] for msg in chat]
+    bodies = [msg["message"]["body"] for msg in chat]
+    assert list(store.iter_bodies()) == bodies
+    for start in range(len(chat) + 1):
+        for stop in range(len(chat) + 2):
+            assert list(store.iter_bodies(start, stop)) == bodies[start:stop]
+
+
+def make_long_chat(count):
+    return [{
+        "_id": f"id{i}",
+        "created_at": f"2025-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}Z",
+        "content_offset_seconds": i,
+        "commenter": {"display_name": f"User{i % 7}", "_id": str(i % 7), "name": f"user{i % 7}"},
+        "message": {"body": f"сообщение {i}", "user_color": None if i % 3 else "#00FF00",
+                    "badges": [{"set_id": "subscriber", "version": str(i % 13)}] if i % 2 else []},
+    } for i in range(count)]
+
+
+@pytest.mark.parametrize("count", [chat_store.EXTRA_BLOCK_MESSAGES - 1, chat_store.EXTRA_BLOCK_MESSAGES,
+                                   2 * chat_store.EXTRA_BLOCK_MESSAGES + 5])
+def test_compressed_extra_blocks(tmp_path, count):
+    chat = make_long_chat(count)
+    path = str(tmp_path / "long.chat")
+    write_chat_store(path, {"chat": chat})
+
+    with ChatStore(path) as store:
+        assert list(store) == chat
+        # Произвольный доступ с переходами между блоками в обе стороны
+        for i in [count - 1, 0, count // 2, chat_store.EXTRA_BLOCK_MESSAGES - 1, count - 1, 1]:
+            if i < count:
+                assert store[i] == chat[i]
+        assert store[::-97] == chat[::-97]
+
+
+def write_version_1(path, store):
+    """Записывает хранилище в формате версии 1 (extra без сжатия) по колонкам открытого хранилища."""
+    extra = b"".join(bytes(store._extra_bytes(i)) for i in range(len(store)))
+    meta = {"commenters": store.commenters, "stream": store.stream, "content_sha256": store.content_sha256}
+    sections = [bytes(store.offsets), bytes(store.commenter_index), bytes(store._body_index), bytes(store._body),
+                bytes(store._id_index), bytes(store._ids), bytes(store._extra_index), extra,
+                json.dumps(meta).encode("utf-8")]
+    position = chat_store.HEADER.size + chat_store.SECTION.size * len(sections)
+    table, data = [], b""
+    for section in sections:
+        padding = -position % chat_store.ALIGNMENT
+        data += b"\0" * padding + section
+        position += padding
+        table.append(chat_store.SECTION.pack(position, len(section)))
+        position += len(section)
+    header = chat_store.HEADER.pack(chat_store.MAGIC, 1, len(sections), len(store))
+    with open(path, "wb") as f:
+        f.write(header + b"".join(table) + data)
+
+
+def test_reads_version_1_with_same_content_sha256(tmp_path):
+    chat = make_long_chat(chat_store.EXTRA_BLOCK_MESSAGES + 10)
+    path = str(tmp_path / "v2.chat")
+    sha = write_chat_store(path, {"chat": chat, "title": "stream"})
+    old_path = str(tmp_path / "v1.chat")
+    with ChatStore(path) as store:
+        write_version_1(old_path, store)
+
+    with ChatStore(old_path) as old:
+        assert old._extra_blocks is None
+        assert list(old) == chat
+        assert old.stream == {"title": "stream"}
+        # Хэш считается по несжатым данным: пересохранение старого файла даёт тот же хэш
+        assert write_chat_store(str(tmp_path / "again.chat"), {"chat": old}) == sha
+
+
+def test_content_sha256_depends_only_on_chat(tmp_path):
+    first = write_chat_store(str(tmp_path / "first.chat"), {"chat": make_chat(), "title": "one"})
+    second = write_chat_store(str(tmp_path / "second.chat"), {"chat": iter(make_chat()), "title": "two"})
+    changed = make_chat()
+    changed[1]["message"]["body"] = "изменено"
+    third = write_chat_store(str(tmp_path / "third.chat"), {"chat": changed})
+
+    assert first == second != third
+    with ChatStore(str(tmp_path / "first.chat")) as store:
+        assert store.content_sha256 == first
+
+
+def test_blob_deduplicates_same_chat(tmp_path):
+    path, sha = write_chat_store_blob(str(tmp_path), make_chat())
+    again, again_sha = write_chat_store_blob(str(tmp_path), make_chat())
+
+    assert (path, sha) == (again, again_sha)
+    assert sorted(p.name for p in tmp_path.iterdir()) == [f"{sha}.chat"]
+
+
+def test_empty_chat(tmp_path):
+    path = str(tmp_path / "empty.chat")
+    write_chat_store(path, {"chat": []})
+
+    with open_chat_store(path) as store:
+        assert len(store) == 0
+        assert list(store) == []
+        assert list(store.iter_bodies()) == []
+        assert store[:] == []
+
+
+def test_rejects_foreign_file(tmp_path):
+    path = tmp_path / "broken.chat"
+    path.write_bytes(b"not a chat store at all, just some bytes")
+
+    with pytest.raises(ValueError):
+        ChatStore(str(path))
+    assert open_chat_store(str(tmp_path / "missing.chat")) is None
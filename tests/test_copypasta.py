@@ -0,0 +1,49 @@
+import random
+from collections import Counter
+
+import pytest
+
+from benchmarks.copypasta_benchmark import generate_pastas, group_similar_pastas_bruteforce
+from data_analytic import copypasta
+from data_analytic.copypasta import PASTA_MIN_LENGTH, extract_pastas, group_similar_pastas
+
+
+def random_pastas(rng, size):
+    """Короткие строки из маленького алфавита с повторами: много пар у самого порога схожести."""
+    pastas = {}
+    while len(pastas) < size:
+        base = "".join(rng.choice("aabbc !") for _ in range(rng.randint(1, 40)))
+        for _ in range(rng.randint(1, 5)):
+            chars = list(base)
+            for _ in range(rng.randint(0, 4)):
+                position = rng.randrange(len(chars) + 1)
+                if chars and rng.random() < 0.5:
+                    del chars[min(position, len(chars) - 1)]
+                else:
+                    chars.insert(position, rng.choice("abcd"))
+            pastas["".join(chars) or "a"] = rng.randint(2, 9)
+    return pastas
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_index_matches_pairwise_on_near_threshold_pairs(monkeypatch, seed):
+    monkeypatch.setattr(copypasta, "BRUTE_FORCE_LIMIT", 0)
+    pastas = random_pastas(random.Random(seed), 400)
+
+    assert group_similar_pastas(pastas) == group_similar_pastas_bruteforce(pastas)
+
+
+def test_index_matches_pairwise_on_chat_like_pastas(monkeypatch):
+    monkeypatch.setattr(copypasta, "BRUTE_FORCE_LIMIT", 0)
+    pastas = generate_pastas(600, random.Random(42))
+
+    assert group_similar_pastas(pastas) == group_similar_pastas_bruteforce(pastas)
+
+
+def test_extract_pastas_counts_repeats(sample_stream, sample_store_stream):
+    bodies = Counter(msg["message"]["body"] for msg in sample_stream["chat"])
+    expected = {text: count for text, count in bodies.items() if count > 1 and len(text) >= PASTA_MIN_LENGTH}
+
+    assert expected
+    assert extract_pastas(sample_stream["chat"]) == expected
+    assert extract_pastas(sample_store_stream["chat"]) == expected
@@ -0,0 +1,59 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from data_collectors import emote
+from data_collectors.emote import load_cached_emotes, prune_emote_cache, save_cached_emotes
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    directory = tmp_path / "emotes"
+    monkeypatch.setattr(emote, "EMOTE_CACHE_DIR", str(directory))
+    return directory
+
+
+def entries(n):
+    return {"ffz": {"emotes": [{"name": f"emote{i}", "url": f"u{i}"} for i in range(n)], "fetched_at": n}}
+
+
+def test_concurrent_saves_of_one_channel(cache_dir):
+    # Потоки одного процесса пишут кэш одного канала: каждый через свой временный файл
+    barrier = threading.Barrier(8, timeout=5)
+
+    def save(n):
+        barrier.wait()
+        for _ in range(20):
+            save_cached_emotes("42", entries(n * 50))
+
+    threads = [threading.Thread(target=save, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    cached = load_cached_emotes("42")
+    assert cached in [entries(n * 50) for n in range(8)]
+    assert os.listdir(cache_dir) == ["42.json"]
+
+
+def test_prune_removes_stale_channels_and_temp_files(cache_dir):
+    save_cached_emotes("fresh", entries(1))
+    save_cached_emotes("stale", entries(2))
+    old = time.time() - 40 * 86400
+    os.utime(cache_dir / "stale.json", (old, old))
+    (cache_dir / "fresh.abc.tmp").write_text("{")
+    (cache_dir / "stale.abc.tmp").write_text("{")
+    hour_ago = time.time() - 2 * emote.EMOTE_CACHE_TMP_MAX_AGE
+    os.utime(cache_dir / "stale.abc.tmp", (hour_ago, hour_ago))
+
+    assert prune_emote_cache(max_age_days=30) == 2
+    assert sorted(os.listdir(cache_dir)) == ["fresh.abc.tmp", "fresh.json"]
+    assert json.loads((cache_dir / "fresh.json").read_text()) == entries(1)
+
+
+def test_prune_without_cache_dir(cache_dir):
+    assert prune_emote_cache() == 0
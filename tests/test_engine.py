@@ -0,0 +1,101 @@
+from collections import Counter
+
+import pytest
+
+from data_analytic.analyse import analyze_chat_activity
+from data_analytic.copypasta import PASTA_MIN_LENGTH, group_similar_pastas
+from data_analytic.emotes import analyze_emotes
+from data_analytic.engine import AGGREGATORS, run_metrics
+from data_analytic.filter import filter_messages_by_keywords
+from data_analytic.top_chatters import get_top_chatters
+
+METRICS = list(AGGREGATORS)
+KEYWORDS = ["lol", "Kappa", "привет", "lo", "omegalul", "gg wp", "нет такого"]
+
+
+def make_params(**overrides):
+    params = {
+        "top_chatters_count": 10,
+        "top_pastes_count": 10,
+        "emoticons_count": 3,
+        "keywords": KEYWORDS,
+        "activity_bucket_seconds": 60,
+        "activity_dense": False,
+        "heavy_hitters_capacity": None,
+    }
+    params.update(overrides)
+    return params
+
+
+def baseline_metrics(stream, params):
+    """Результаты отдельных функций метрик, которые движок заменил одним проходом."""
+    chat = stream["chat"]
+    keywords = params["keywords"]
+    bodies = [msg["message"]["body"] for msg in chat]
+    pasta_counts = Counter(body for body in bodies if len(body) >= PASTA_MIN_LENGTH)
+    return {
+        "top_chatters": get_top_chatters(stream, top_n=params["top_chatters_count"]),
+        "keywords_search": filter_messages_by_keywords(chat, keywords),
+        "keyword_counts": {kw: sum(kw.lower() in body.lower() for body in bodies) for kw in keywords},
+        "top_pastes": group_similar_pastas({text: count for text, count in pasta_counts.items()
+                                            if count > 1})[:params["top_pastes_count"]],
+        "top_emoticons": analyze_emotes(stream, top_n=params["emoticons_count"]),
+        "chat_activity": analyze_chat_activity(stream, keywords=keywords,
+                                               bucket_seconds=params["activity_bucket_seconds"],
+                                               dense=params["activity_dense"]),
+    }
+
+
+@pytest.mark.parametrize("bucket_seconds, dense", [(60, False), (10, True), (300, False)])
+def test_engine_matches_baseline_on_dicts(sample_stream, bucket_seconds, dense):
+    params = make_params(activity_bucket_seconds=bucket_seconds, activity_dense=dense)
+
+    assert run_metrics(sample_stream, METRICS, params) == baseline_metrics(sample_stream, params)
+
+
+@pytest.mark.parametrize("bucket_seconds, dense", [(60, False), (30, True)])
+def test_engine_matches_baseline_on_store(sample_store_stream, sample_stream, bucket_seconds, dense):
+    params = make_params(activity_bucket_seconds=bucket_seconds, activity_dense=dense)
+
+    # Базовые функции считаются по списку словарей — независимо от кода колоночного хранилища
+    assert run_metrics(sample_store_stream, METRICS, params) == baseline_metrics(sample_stream, params)
+
+
+@pytest.mark.parametrize("metric", METRICS)
+def test_each_metric_alone(sample_store_stream, sample_stream, metric):
+    # Метрика без соседей идёт другим путём (только индекс токенов, только столбцы или проход по сообщениям)
+    params = make_params()
+
+    assert run_metrics(sample_store_stream, [metric], params) == {metric: baseline_metrics(sample_stream, params)[metric]}
+
+
+def test_keyword_free_run(sample_stream):
+    params = make_params(keywords=[])
+    result = run_metrics(sample_stream, METRICS, params)
+
+    assert result["keywords_search"] == []
+    assert result["keyword_counts"] == {}
+    assert result == baseline_metrics(sample_stream, params)
+
+
+@pytest.mark.parametrize("store", [False, True], ids=["dicts", "store"])
+def test_heavy_hitters_with_enough_capacity_are_exact(sample_stream, sample_store_stream, store):
+    # Таблица вмещает всех авторов и все эмоуты: приближённый подсчёт совпадает с точным, погрешность 0
+    stream = sample_store_stream if store else sample_stream
+    exact = run_metrics(stream, ["top_chatters", "top_emoticons"], make_params())
+    approximate = run_metrics(stream, ["top_chatters", "top_emoticons"], make_params(heavy_hitters_capacity=1000))
+
+    assert [(name, count) for name, count, _ in approximate["top_chatters"]] == exact["top_chatters"]
+    assert all(error == 0 for _, _, error in approximate["top_chatters"])
+    assert [{k: v for k, v in emote.items() if k != "error"} for emote in approximate["top_emoticons"]] == \
+        exact["top_emoticons"]
+    assert all(emote["error"] == 0 for emote in approximate["top_emoticons"])
+
+
+def test_token_index_path_matches_baseline(sample_store_stream, sample_stream):
+    # Слова без пробелов и без regex ищутся по индексу токенов (если он есть)
+    params = make_params(keywords=["lol", "Kappa", "привет", "lo", "OMEGALUL", "🙂"])
+    result = run_metrics(sample_store_stream, METRICS, params)
+
+    assert result == baseline_metrics(sample_stream, params)
+    assert result["keyword_counts"]["lo"] > result["keyword_counts"]["lol"] > 0
@@ -0,0 +1,91 @@
+import re
+
+import pytest
+
+from conftest import make_sample_chat
+from data_analytic.filter import KeywordMatcher, filter_messages_by_keywords
+
+TEXTS = [
+    "lol",
+    "lolol",
+    "LOL what",
+    "lo",
+    "l o l",
+    "hello world",
+    "OMEGALUL LUL",
+    "Привет, ПРИВЕТИК",
+    "",
+    "kappa123",
+]
+
+
+def baseline_find(keywords, text, use_regex=False, match_case=True):
+    """Исходная семантика: каждое слово проверяется отдельно (подстрока без учёта регистра или re.search)."""
+    keywords = list(dict.fromkeys(keywords))
+    if use_regex:
+        flags = 0 if match_case else re.IGNORECASE
+        return [kw for kw in keywords if re.search(kw, text, flags)]
+    return [kw for kw in keywords if kw.lower() in text.lower()]
+
+
+KEYWORD_SETS = [
+    ["lol", "lo"],  # пересекающиеся слова с общим началом
+    ["lo", "lol"],  # тот же набор в другом порядке перечисления
+    ["olo", "lol", "lo"],  # перекрывающиеся вхождения в "lolol"
+    ["omegalul", "lul", "gal", "mega"],  # слова, входящие в другие слова
+    ["LUL", "lul", "Lul"],  # одно слово в разном регистре
+    ["привет", "ПРИВЕТИК", "вет"],
+    ["kappa", "123", "a1"],
+    ["l o", "o l"],
+    ["missing"],
+    [],
+]
+
+
+@pytest.mark.parametrize("keywords", KEYWORD_SETS)
+def test_find_and_matches_equal_baseline(keywords):
+    matcher = KeywordMatcher(keywords)
+    for text in TEXTS:
+        expected = baseline_find(keywords, text)
+        assert matcher.find(text) == expected, (keywords, text)
+        assert matcher.matches(text) == bool(expected), (keywords, text)
+
+
+@pytest.mark.parametrize("match_case", [True, False])
+@pytest.mark.parametrize("keywords", [[r"lo+l", r"^l"], [r"LUL\b", r"\bLUL"], [r"прив\w+", r"\d{3}"]])
+def test_regex_mode_equals_baseline(keywords, match_case):
+    matcher = KeywordMatcher(keywords, use_regex=True, match_case=match_case)
+    for text in TEXTS:
+        expected = baseline_find(keywords, text, use_regex=True, match_case=match_case)
+        assert matcher.find(text) == expected, (keywords, text)
+        assert matcher.matches(text) == bool(expected), (keywords, text)
+
+
+def test_regex_special_characters_are_literal_without_regex():
+    matcher = KeywordMatcher(["a.b", "(x)"])
+
+    assert matcher.find("a.b (x)") == ["a.b", "(x)"]
+    assert matcher.find("axb x") == []
+
+
+def test_per_keyword_hit_counts_on_chat():
+    bodies = [msg["message"]["body"] for msg in make_sample_chat()]
+    keywords = ["lol", "lo", "LOL", "omegalul", "lul", "привет", "pog"]
+    matcher = KeywordMatcher(keywords)
+
+    counts = dict.fromkeys(dict.fromkeys(keywords), 0)
+    for body in bodies:
+        for kw in matcher.find(body):
+            counts[kw] += 1
+
+    assert counts == {kw: sum(kw.lower() in body.lower() for body in bodies) for kw in dict.fromkeys(keywords)}
+    assert counts["lo"] >= counts["lol"] > 0
+    assert counts["lul"] >= counts["omegalul"] > 0
+
+
+def test_filter_messages_by_keywords_matches_baseline():
+    chat = make_sample_chat()
+    keywords = ["lol", "привет"]
+
+    assert filter_messages_by_keywords(chat, keywords) == \
+        [msg for msg in chat if baseline_find(keywords, msg["message"]["body"])]
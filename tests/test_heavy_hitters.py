@@ -0,0 +1,138 @@
+import json
+import random
+from collections import Counter
+
+import pytest
+
+from data_analytic import heavy_hitters
+from data_analytic.heavy_hitters import SpaceSaving, make_heavy_hitters, parse_heavy_hitters_capacity
+
+
+def zipf_stream(length, items, seed, exponent=1.2):
+    rng = random.Random(seed)
+    names = [f"item{i}" for i in range(items)]
+    weights = [1 / (rank ** exponent) for rank in range(1, items + 1)]
+    return rng.choices(names, weights=weights, k=length)
+
+
+def count(stream, capacity):
+    sketch = SpaceSaving(capacity)
+    for item in stream:
+        sketch.add(item)
+    return sketch
+
+
+def assert_guarantees(sketch, exact):
+    total = sum(exact.values())
+    assert sketch.total == total
+    assert len(sketch) <= sketch.capacity
+    for item, counted, error in sketch.top():
+        assert counted - error <= exact[item] <= counted, item
+        assert error <= total / sketch.capacity
+    # Любой элемент, встретившийся больше total / capacity раз, остаётся в таблице
+    for item, frequency in exact.items():
+        if frequency > total / sketch.capacity:
+            assert item in sketch.counts, item
+
+
+def test_exact_below_capacity():
+    stream = zipf_stream(5000, 50, seed=1)
+    sketch = count(stream, 60)
+    exact = Counter(stream)
+
+    assert sketch.counts == dict(exact)
+    assert all(error == 0 for _, _, error in sketch.top())
+    assert sketch.min_count() == 0
+    assert [(item, counted) for item, counted, _ in sketch.top()] == exact.most_common()
+
+
+@pytest.mark.parametrize("capacity", [10, 50, 200])
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_bounds_on_skewed_stream(capacity, seed):
+    stream = zipf_stream(20_000, 2_000, seed)
+    sketch = count(stream, capacity)
+
+    assert_guarantees(sketch, Counter(stream))
+    assert sketch.error_bound() == len(stream) / capacity
+
+
+def test_weighted_add():
+    sketch = SpaceSaving(2)
+    sketch.add("a", 5)
+    sketch.add("b", 3)
+    sketch.add("c", 2)  # вытесняет b (минимум 3): счётчик 5, погрешность 3
+
+    assert sketch.top() == [("a", 5, 0), ("c", 5, 3)]
+    assert sketch.total == 10
+
+
+@pytest.mark.parametrize("parts", [2, 3, 8])
+@pytest.mark.parametrize("capacity", [20, 100])
+def test_merge_keeps_guarantees(parts, capacity):
+    stream = zipf_stream(30_000, 3_000, seed=parts)
+    chunks = [stream[i * len(stream) // parts:(i + 1) * len(stream) // parts] for i in range(parts)]
+
+    merged = count(chunks[0], capacity)
+    for chunk in chunks[1:]:
+        merged.merge(count(chunk, capacity))
+
+    assert_guarantees(merged, Counter(stream))
+
+
+def test_merge_below_capacity_is_exact():
+    stream = zipf_stream(3000, 40, seed=5)
+    merged = count(stream[:1000], 100)
+    merged.merge(count(stream[1000:], 100))
+
+    assert merged.counts == dict(Counter(stream))
+    # Порядок равных счётчиков тот же, что при одном проходе
+    assert merged.top() == count(stream, 100).top()
+
+
+def test_state_round_trip():
+    stream = zipf_stream(10_000, 500, seed=4)
+    sketch = count(stream, 30)
+
+    restored = SpaceSaving.from_state(json.loads(json.dumps(sketch.to_state())))
+
+    assert restored.top() == sketch.top()
+    assert restored.total == sketch.total
+    assert restored.capacity == sketch.capacity
+    assert restored.min_count() == sketch.min_count()
+    # Восстановленная таблица продолжает подсчёт так же, как исходная
+    for item in stream[:2000]:
+        sketch.add(item)
+        restored.add(item)
+    assert restored.top() == sketch.top()
+
+
+def test_invalid_capacity():
+    with pytest.raises(ValueError):
+        SpaceSaving(0)
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, None), ("", None), ("0", None), (0, None), ("1", 1), ("500", 500), (1000, 1000),
+])
+def test_parse_capacity(value, expected):
+    assert parse_heavy_hitters_capacity(value) == expected
+
+
+@pytest.mark.parametrize("value", ["-1", "abc", "1.5", []])
+def test_parse_capacity_rejects(value):
+    with pytest.raises(ValueError):
+        parse_heavy_hitters_capacity(value)
+
+
+def test_parse_capacity_upper_bound():
+    maximum = heavy_hitters.HEAVY_HITTERS_MAX_CAPACITY
+
+    assert parse_heavy_hitters_capacity(str(maximum)) == maximum
+    with pytest.raises(ValueError):
+        parse_heavy_hitters_capacity(str(maximum + 1))
+
+
+def test_make_heavy_hitters():
+    assert make_heavy_hitters({}) is None
+    assert make_heavy_hitters({"heavy_hitters_capacity": None}) is None
+    assert make_heavy_hitters({"heavy_hitters_capacity": 7}).capacity == 7
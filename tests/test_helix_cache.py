@@ -0,0 +1,158 @@
+import threading
+import time
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+import redis_client
+from data_collectors import helix_api
+from data_collectors.helix_api import cached_request
+
+ENDPOINT = "/videos"
+PARAMS = {"id": "123"}
+
+
+class FakeHelix:
+    """Подмена make_request: считает запросы, может задерживать ответ до release и падать."""
+
+    def __init__(self, response):
+        self.response = response
+        self.calls = 0
+        self.lock = threading.Lock()
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+        self.error = None
+
+    def __call__(self, endpoint, params=None):
+        with self.lock:
+            self.calls += 1
+            error, self.error = self.error, None
+        self.started.set()
+        self.release.wait(timeout=5)
+        if error is not None:
+            raise error
+        return self.response
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    client = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+    monkeypatch.setattr(redis_client, "_client", client)
+    monkeypatch.setattr(helix_api, "_local_cache", {})
+    monkeypatch.setattr(helix_api, "_inflight", {})
+    monkeypatch.setattr(helix_api, "HELIX_LOCK_TIMEOUT", 5)
+    return client
+
+
+@pytest.fixture
+def helix(redis, monkeypatch):
+    fake = FakeHelix({"data": [{"id": "123", "duration": "1h"}]})
+    monkeypatch.setattr(helix_api, "make_request", fake)
+    return fake
+
+
+def cache_key():
+    return f"{helix_api.CACHE_PREFIX}:{ENDPOINT}:{{\"id\": \"123\"}}"
+
+
+def test_response_cached_until_ttl(helix, redis):
+    assert cached_request(ENDPOINT, PARAMS, ttl=1) == helix.response
+    assert cached_request(ENDPOINT, PARAMS, ttl=1) == helix.response
+    assert helix.calls == 1
+    assert 0 < redis.ttl(cache_key()) <= 1
+
+    time.sleep(1.2)
+
+    assert cached_request(ENDPOINT, PARAMS, ttl=1) == helix.response
+    assert helix.calls == 2
+
+
+def test_redis_cache_shared_between_processes(helix, monkeypatch):
+    cached_request(ENDPOINT, PARAMS)
+    # Другой процесс: своего кэша в памяти нет, ответ берётся из Redis
+    monkeypatch.setattr(helix_api, "_local_cache", {})
+
+    assert cached_request(ENDPOINT, PARAMS) == helix.response
+    assert helix.calls == 1
+
+
+def test_empty_data_cached_for_negative_ttl(helix, redis):
+    helix.response = {"data": []}
+
+    assert cached_request(ENDPOINT, PARAMS, ttl=300, negative_ttl=7) == {"data": []}
+    assert cached_request(ENDPOINT, PARAMS, ttl=300, negative_ttl=7) == {"data": []}
+    assert helix.calls == 1
+    assert 0 < redis.ttl(cache_key()) <= 7
+
+
+def test_errors_are_not_cached(helix, redis):
+    helix.response = None
+
+    assert cached_request(ENDPOINT, PARAMS) is None
+    assert cached_request(ENDPOINT, PARAMS) is None
+    assert helix.calls == 2
+    assert redis.get(cache_key()) is None
+
+
+def test_redis_unavailable_falls_back_to_request(helix, monkeypatch):
+    def broken_redis():
+        raise ConnectionError("Redis недоступен")
+
+    monkeypatch.setattr(helix_api, "get_redis", broken_redis)
+
+    assert cached_request(ENDPOINT, PARAMS) == helix.response
+    assert cached_request(ENDPOINT, PARAMS) == helix.response  # из памяти процесса
+    assert helix.calls == 1
+
+
+def run_concurrently(count, helix):
+    """Первый поток становится ведущим, остальные приходят, пока его запрос выполняется."""
+    results = [None] * count
+    errors = [None] * count
+
+    def call(i):
+        try:
+            results[i] = cached_request(ENDPOINT, PARAMS)
+        except Exception as e:
+            errors[i] = e
+
+    helix.release.clear()
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(count)]
+    threads[0].start()
+    assert helix.started.wait(timeout=5)
+    for thread in threads[1:]:
+        thread.start()
+    time.sleep(0.1)
+    started = time.monotonic()
+    helix.release.set()
+    for thread in threads:
+        thread.join(timeout=10)
+    assert not any(thread.is_alive() for thread in threads)
+    return results, errors, time.monotonic() - started
+
+
+def test_concurrent_requests_coalesce(helix):
+    results, errors, _ = run_concurrently(6, helix)
+
+    assert errors == [None] * 6
+    assert results == [helix.response] * 6
+    assert helix.calls == 1
+    assert helix_api._inflight == {}
+
+
+def test_leader_error_releases_waiters(helix, redis):
+    helix.error = RuntimeError("Helix упал")
+
+    results, errors, elapsed = run_concurrently(4, helix)
+
+    # Ведущий поток получает своё исключение, ожидающие не висят до таймаута, а запрашивают сами
+    assert isinstance(errors[0], RuntimeError)
+    assert errors[1:] == [None] * 3
+    assert results[1:] == [helix.response] * 3
+    assert elapsed < helix_api.HELIX_LOCK_TIMEOUT
+    assert helix_api._inflight == {}
+    # Блокировка в Redis снята: другие процессы не ждут её истечения
+    assert redis.get(f"{cache_key()}:lock") is None
+    assert cached_request(ENDPOINT, PARAMS) == helix.response
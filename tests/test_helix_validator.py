@@ -0,0 +1,90 @@
+import json
+import time
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+import redis_client
+from data_collectors import helix_validator
+from data_collectors.helix_validator import TOKEN_REDIS_KEY, HelixTokenManager
+
+
+def shared_token(token):
+    return json.dumps({"access_token": token, "expires_at": time.time() + 7200})
+
+
+class RacingClient:
+    """Клиент Redis, у которого другой процесс публикует новый токен сразу после чтения в pipeline."""
+
+    def __init__(self, client, other, token):
+        self.client = client
+        self.other = other
+        self.token = token
+
+    def pipeline(self):
+        pipe = self.client.pipeline()
+        read = pipe.get
+
+        def get(key):
+            value = read(key)
+            self.other.set(TOKEN_REDIS_KEY, shared_token(self.token))
+            return value
+
+        pipe.get = get
+        return pipe
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+@pytest.fixture
+def server(monkeypatch, tmp_path):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis_client, "_client", fakeredis.FakeRedis(server=server))
+    monkeypatch.setattr(helix_validator, "TOKEN_FILE", str(tmp_path / ".helix_token"))
+    return server
+
+
+def test_invalidate_removes_rejected_token(server):
+    client = redis_client.get_redis()
+    client.set(TOKEN_REDIS_KEY, shared_token("old"))
+    helix_validator.save_token_to_file("old", time.time() + 7200)
+
+    HelixTokenManager("id", "secret").invalidate("old")
+
+    assert client.get(TOKEN_REDIS_KEY) is None
+    assert not helix_validator.load_token_from_file()[0]
+
+
+def test_invalidate_keeps_other_token(server):
+    client = redis_client.get_redis()
+    client.set(TOKEN_REDIS_KEY, shared_token("new"))
+
+    HelixTokenManager("id", "secret").invalidate("old")
+
+    assert json.loads(client.get(TOKEN_REDIS_KEY))["access_token"] == "new"
+
+
+def test_invalidate_keeps_token_refreshed_concurrently(server, monkeypatch):
+    client = fakeredis.FakeRedis(server=server)
+    client.set(TOKEN_REDIS_KEY, shared_token("old"))
+    # Между чтением отклонённого токена и удалением другой процесс успевает сохранить новый
+    monkeypatch.setattr(redis_client, "_client", RacingClient(client, fakeredis.FakeRedis(server=server), "new"))
+
+    HelixTokenManager("id", "secret").invalidate("old")
+
+    assert json.loads(client.get(TOKEN_REDIS_KEY))["access_token"] == "new"
+
+
+def test_invalidate_without_redis(server, monkeypatch):
+    def broken_redis():
+        raise ConnectionError("Redis недоступен")
+
+    monkeypatch.setattr(helix_validator, "get_redis", broken_redis)
+    manager = HelixTokenManager("id", "secret")
+    manager._token, manager._expires_at = "old", time.time() + 7200
+
+    manager.invalidate("old")
+
+    assert manager._token is None
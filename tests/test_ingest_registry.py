@@ -0,0 +1,75 @@
+import time
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+import redis_client
+from data_processors import ingest_registry
+from data_processors.ingest_registry import (claim_ingest, get_ingest_key, ingest_heartbeat, release_ingest,
+                                             wait_for_ingest)
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    client = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+    monkeypatch.setattr(redis_client, "_client", client)
+    monkeypatch.setattr(ingest_registry, "INGEST_LOCK_TTL", 1)
+    monkeypatch.setattr(ingest_registry, "INGEST_POLL_INTERVAL", 0.05)
+    return client
+
+
+def test_registration_expires_without_heartbeat(redis):
+    assert claim_ingest("vod", "task", ttl=1) == "task"
+    time.sleep(1.3)
+    assert claim_ingest("vod", "other") == "other"
+
+
+def test_heartbeat_keeps_running_ingest_registered(redis):
+    assert claim_ingest("vod", "task", ttl=ingest_registry.INGEST_QUEUED_TTL) == "task"
+
+    with ingest_heartbeat("vod", "task", interval=0.1):
+        # Срок из очереди сразу заменяется коротким
+        time.sleep(0.05)
+        assert redis.ttl(get_ingest_key("vod")) <= 1
+        time.sleep(1.3)
+        assert claim_ingest("vod", "other") == "task"
+
+    release_ingest("vod", "task")
+    assert claim_ingest("vod", "other") == "other"
+
+
+def test_heartbeat_does_not_renew_foreign_registration(redis):
+    claim_ingest("vod", "task")
+
+    with ingest_heartbeat("vod", "task", interval=0.1):
+        redis.set(get_ingest_key("vod"), "other", ex=1)
+        time.sleep(1.3)
+        assert redis.get(get_ingest_key("vod")) is None
+
+
+def test_wait_for_ingest_times_out(redis):
+    claim_ingest("vod", "task")
+
+    with ingest_heartbeat("vod", "task", interval=0.1):
+        started = time.monotonic()
+        assert wait_for_ingest("vod", "task", timeout=0.3) is False
+        assert time.monotonic() - started < 1
+
+
+def test_wait_for_ingest_returns_when_owner_finishes(redis):
+    claim_ingest("vod", "task", ttl=1)
+    assert wait_for_ingest("vod", "task", timeout=5) is True
+
+
+def test_duplicate_save_task_gives_up_after_wait_timeout(redis, monkeypatch):
+    tasks = pytest.importorskip("tasks")
+    monkeypatch.setattr(ingest_registry, "INGEST_WAIT_TIMEOUT", 0.3)
+    claim_ingest("vod", "owner")
+
+    with ingest_heartbeat("vod", "owner", interval=0.1):
+        result = tasks.save_stream_task.apply(args=["vod"], task_id="duplicate").get()
+
+    assert result["status"] == "error"
+    assert "owner" in result["message"]
+    assert redis.get(get_ingest_key("vod")) == b"owner"
@@ -0,0 +1,43 @@
+import gzip
+import json
+import os
+
+from data_processors.result_cache import get_vod_fingerprint
+from data_processors.stream_record import get_stream_json_path
+
+CHAT_REF = {"sha256": "a" * 64, "messages": 3, "path": f"chats/{'a' * 64}.chat"}
+
+
+def write_record(vod_id, **fields):
+    path = get_stream_json_path(vod_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        json.dump({"chat_ref": CHAT_REF, **fields}, f)
+    # Новая запись должна отличаться от прежней по mtime даже на грубых файловых системах
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+def test_fingerprint_changes_with_non_chat_fields():
+    write_record("fp-vod", emotes=[{"name": "LUL"}], categories=[{"name": "Just Chatting"}])
+    original = get_vod_fingerprint("fp-vod")
+
+    write_record("fp-vod", emotes=[{"name": "LUL"}, {"name": "Kappa"}], categories=[{"name": "Just Chatting"}])
+    new_emotes = get_vod_fingerprint("fp-vod")
+
+    write_record("fp-vod", emotes=[{"name": "LUL"}, {"name": "Kappa"}], categories=[{"name": "Art"}])
+    new_categories = get_vod_fingerprint("fp-vod")
+
+    assert len({original, new_emotes, new_categories}) == 3
+
+
+def test_fingerprint_is_stable_for_same_record():
+    write_record("fp-stable", emotes=[], categories=[])
+    first = get_vod_fingerprint("fp-stable")
+    write_record("fp-stable", emotes=[], categories=[])
+
+    assert get_vod_fingerprint("fp-stable") == first
+
+
+def test_fingerprint_missing_record():
+    assert get_vod_fingerprint("fp-missing") is None
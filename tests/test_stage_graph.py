@@ -0,0 +1,132 @@
+import threading
+import time
+
+import pytest
+
+from data_processors.stage_graph import run_stage_graph
+
+
+class Recorder:
+    """Журнал событий этапов в порядке их наступления (из потоков пула)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.events = []
+
+    def add(self, *event):
+        with self.lock:
+            self.events.append(event)
+
+    def stage(self, name, result=None, delay=0.0, error=None, wait_for=None):
+        def func(**kwargs):
+            self.add(name, "started", kwargs)
+            if wait_for is not None:
+                wait_for.wait(timeout=5)
+            time.sleep(delay)
+            self.add(name, "finished")
+            if error is not None:
+                raise error
+            return name if result is None else result
+        return func
+
+    def position(self, name, event):
+        return next(i for i, (stage, kind, *_) in enumerate(self.events) if stage == name and kind == event)
+
+    def started(self):
+        return {stage for stage, kind, *_ in self.events if kind == "started"}
+
+
+def test_dependents_start_after_dependencies():
+    log = Recorder()
+    stages = {
+        "c": (log.stage("c"), ("a", "b")),
+        "a": (log.stage("a", result=1, delay=0.05), ()),
+        "b": (log.stage("b", result=2, delay=0.02), ()),
+        "d": (log.stage("d"), ("c",)),
+    }
+
+    results = run_stage_graph(stages)
+
+    assert results == {"a": 1, "b": 2, "c": "c", "d": "d"}
+    assert log.position("c", "started") > max(log.position("a", "finished"), log.position("b", "finished"))
+    assert log.position("d", "started") > log.position("c", "finished")
+    # Зависимости передаются именованными аргументами
+    assert next(rest for stage, kind, *rest in log.events if (stage, kind) == ("c", "started")) == [{"a": 1, "b": 2}]
+
+
+def test_independent_stages_overlap():
+    barrier = threading.Barrier(3, timeout=5)
+
+    def meet():
+        barrier.wait()  # BrokenBarrierError, если этапы выполняются по очереди
+        return True
+
+    assert run_stage_graph({name: (meet, ()) for name in "abc"}) == {"a": True, "b": True, "c": True}
+
+
+def test_failing_stage_raises_after_running_stages_finish():
+    log = Recorder()
+    release = threading.Event()
+    stages = {
+        "broken": (log.stage("broken", error=RuntimeError("этап упал")), ()),
+        "slow": (log.stage("slow", delay=0.1), ()),
+        "after_broken": (log.stage("after_broken"), ("broken",)),
+        "after_slow": (log.stage("after_slow", wait_for=release), ("slow",)),
+    }
+
+    with pytest.raises(RuntimeError, match="этап упал"):
+        run_stage_graph(stages)
+
+    # Запущенный этап доработал до того, как исключение вышло наружу; этапы после ошибки не запускаются
+    assert ("slow", "finished") in log.events
+    assert "after_broken" not in log.started()
+    release.set()
+
+
+def test_required_none_stops_new_stages():
+    log = Recorder()
+    timings = {}
+    stages = {
+        "chat": (lambda: None, ()),
+        "slow": (log.stage("slow", delay=0.1), ()),
+        "after_chat": (log.stage("after_chat"), ("chat",)),
+        "after_slow": (log.stage("after_slow"), ("slow",)),
+    }
+
+    assert run_stage_graph(stages, required=("chat",), timings=timings) is None
+    # Уже запущенный этап дорабатывает, новые не запускаются
+    assert ("slow", "finished") in log.events
+    assert log.started() == {"slow"}
+    assert "total" in timings
+
+
+def test_optional_none_does_not_stop_graph():
+    results = run_stage_graph({"emotes": (lambda: None, ()), "chat": (lambda: "chat", ())}, required=("chat",))
+
+    assert results == {"emotes": None, "chat": "chat"}
+
+
+def test_timings_and_stage_events():
+    log = Recorder()
+    timings = {}
+    events = []
+    stages = {
+        "a": (log.stage("a", delay=0.05), ()),
+        "b": (log.stage("b", delay=0.02), ("a",)),
+        "empty": (lambda: None, ()),
+    }
+
+    run_stage_graph(stages, timings=timings, on_stage=lambda name, status: events.append((name, status)))
+
+    assert set(timings) == {"a", "b", "empty", "total"}
+    assert timings["a"] >= 0.05 and timings["b"] >= 0.02
+    assert timings["total"] >= timings["a"] + timings["b"] - 0.002  # b ждёт a; времена округлены до мс
+    assert sorted(events) == sorted([("a", "started"), ("a", "done"), ("b", "started"), ("b", "done"),
+                                     ("empty", "started"), ("empty", "failed")])
+
+
+def test_empty_graph():
+    timings = {}
+
+    assert run_stage_graph({}, timings=timings) == {}
+    assert set(timings) == {"total"}
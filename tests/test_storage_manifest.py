@@ -0,0 +1,203 @@
+import os
+
+import pytest
+
+from data_processors.storage_manifest import StorageManifest
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    return StorageManifest(str(tmp_path / "manifest.sqlite3"))
+
+
+@pytest.fixture
+def stream_dir(tmp_path):
+    directory = tmp_path / "stream_data"
+    directory.mkdir()
+    return directory
+
+
+@pytest.fixture
+def chats_dir(tmp_path):
+    directory = tmp_path / "chats"
+    directory.mkdir()
+    return directory
+
+
+def write_file(directory, name, size):
+    path = directory / name
+    path.write_bytes(b"x" * size)
+    return str(path)
+
+
+def disk_bytes(directory):
+    return sum(entry.stat().st_size for entry in os.scandir(directory)
+               if not entry.name.endswith((".tmp", ".part")))
+
+
+def store_vod(manifest, directory, vod_id, last_access, size=100, extra=(".export.json.gz",)):
+    """Файлы VOD: запись трансляции и производные файлы с одним временем доступа."""
+    paths = [write_file(directory, f"{vod_id}{suffix}", size) for suffix in (*extra, ".json.gz")]
+    for path in paths:
+        manifest.record(path, last_access=last_access)
+    return paths
+
+
+def test_sync_totals_match_disk(manifest, stream_dir):
+    for name, size in [("1.json.gz", 300), ("2.json.gz", 50), ("2.export.json.gz", 70)]:
+        write_file(stream_dir, name, size)
+    write_file(stream_dir, "3.json.gz.tmp", 1000)  # ещё пишется — не учитывается
+    write_file(stream_dir, "4.0-end.ndjson.part", 1000)
+
+    assert not manifest.is_synced(str(stream_dir))
+    assert manifest.sync(str(stream_dir)) == (3, 0)
+    assert manifest.is_synced(str(stream_dir))
+    assert manifest.total_bytes(str(stream_dir)) == disk_bytes(stream_dir) == 420
+
+    # Изменения в обход манифеста подхватываются следующей сверкой
+    write_file(stream_dir, "1.json.gz", 10)
+    os.remove(stream_dir / "2.export.json.gz")
+    write_file(stream_dir, "5.json.gz", 25)
+
+    assert manifest.sync(str(stream_dir)) == (1, 1)
+    assert manifest.total_bytes(str(stream_dir)) == disk_bytes(stream_dir) == 85
+    assert manifest.stats()[str(stream_dir)]["files"] == 3
+
+
+def test_record_updates_totals_incrementally(manifest, stream_dir):
+    path = write_file(stream_dir, "1.json.gz", 100)
+
+    assert manifest.record(path) == 100
+    write_file(stream_dir, "1.json.gz", 40)
+    assert manifest.record(path) == 40
+    assert manifest.record(write_file(stream_dir, "2.json.gz", 60)) == 100
+    assert manifest.record(str(stream_dir / "missing.json.gz")) is None
+
+    manifest.forget(path)
+    assert manifest.total_bytes(str(stream_dir)) == 60
+
+
+def test_evict_in_lru_order(manifest, stream_dir):
+    for last_access, vod_id in enumerate(["a", "b", "c", "d"], start=1):
+        store_vod(manifest, stream_dir, vod_id, last_access)
+    manifest.touch("a")  # a становится самым свежим
+
+    removed = manifest.evict(str(stream_dir), max_bytes=400)
+
+    assert [os.path.basename(path) for path in removed] == \
+        ["b.json.gz", "b.export.json.gz", "c.json.gz", "c.export.json.gz"]
+    assert sorted(os.listdir(stream_dir)) == ["a.export.json.gz", "a.json.gz", "d.export.json.gz", "d.json.gz"]
+    assert manifest.total_bytes(str(stream_dir)) == disk_bytes(stream_dir) == 400
+
+
+def test_evict_by_age_and_file_size(manifest, stream_dir):
+    store_vod(manifest, stream_dir, "old", last_access=1)
+    store_vod(manifest, stream_dir, "big", last_access=None, size=500, extra=())
+    store_vod(manifest, stream_dir, "fresh", last_access=None)
+
+    assert {os.path.basename(path) for path in manifest.evict(str(stream_dir), max_age_seconds=3600)} == \
+        {"old.json.gz", "old.export.json.gz"}
+    assert [os.path.basename(path) for path in manifest.evict(str(stream_dir), max_file_bytes=200)] == ["big.json.gz"]
+    assert sorted(os.listdir(stream_dir)) == ["fresh.export.json.gz", "fresh.json.gz"]
+
+
+def test_pinned_vods_are_skipped(manifest, stream_dir):
+    for last_access, vod_id in enumerate(["a", "b", "c"], start=1):
+        store_vod(manifest, stream_dir, vod_id, last_access)
+    manifest.pin("a")
+    manifest.pin("b", ttl=None)
+    manifest.pin("b", ttl=None)
+    manifest.unpin("b")  # закрепления считаются: b остаётся закреплённым
+
+    removed = manifest.evict(str(stream_dir), max_bytes=0)
+
+    assert {os.path.basename(path) for path in removed} == {"c.json.gz", "c.export.json.gz"}
+    assert manifest.evict(str(stream_dir), max_age_seconds=0) == []
+
+    manifest.unpin("a")
+    manifest.unpin("b")
+    assert len(manifest.evict(str(stream_dir), max_bytes=0)) == 4
+    assert os.listdir(stream_dir) == []
+
+
+def test_expired_pin_does_not_protect(manifest, stream_dir):
+    store_vod(manifest, stream_dir, "crashed", last_access=1)
+    manifest.pin("crashed", ttl=-1)  # воркер упал, не сняв закрепление
+
+    assert len(manifest.evict(str(stream_dir), max_bytes=0)) == 2
+
+
+def test_shared_blob_removed_with_last_reference(manifest, stream_dir, chats_dir):
+    blob = write_file(chats_dir, f"{'0' * 64}.chat", 1000)
+    manifest.record(blob, last_access=10)
+    for last_access, vod_id in enumerate(["x", "y"], start=1):
+        store_vod(manifest, stream_dir, vod_id, last_access)
+        manifest.add_refs(vod_id, blob)
+
+    removed = manifest.evict(str(stream_dir), max_bytes=200)
+
+    # Запись трансляции удаляется первой: без неё VOD считается несобранным и не ссылается на удалённый чат
+    assert [os.path.basename(path) for path in removed] == ["x.json.gz", "x.export.json.gz"]
+    assert os.path.exists(blob)
+    assert manifest.refs("x") == []
+    assert manifest.refs("y") == [blob]
+
+    removed = manifest.evict(str(stream_dir), max_bytes=0)
+
+    assert [os.path.basename(path) for path in removed] == ["y.json.gz", "y.export.json.gz", os.path.basename(blob)]
+    assert not os.path.exists(blob)
+    assert manifest.total_bytes(str(chats_dir)) == 0
+
+
+def test_evicting_shared_blob_removes_all_referencing_vods(manifest, stream_dir, chats_dir):
+    blob = write_file(chats_dir, f"{'1' * 64}.chat", 1000)
+    manifest.record(blob, last_access=1)
+    for vod_id in ("x", "y"):
+        store_vod(manifest, stream_dir, vod_id, last_access=None)
+        manifest.add_refs(vod_id, blob)
+
+    removed = manifest.evict(str(chats_dir), max_bytes=0)
+
+    assert sorted(os.path.basename(path) for path in removed) == \
+        sorted([os.path.basename(blob), "x.json.gz", "x.export.json.gz", "y.json.gz", "y.export.json.gz"])
+    assert os.listdir(stream_dir) == os.listdir(chats_dir) == []
+
+
+def test_shared_blob_of_pinned_vod_is_kept(manifest, stream_dir, chats_dir):
+    blob = write_file(chats_dir, f"{'2' * 64}.chat", 1000)
+    manifest.record(blob, last_access=1)
+    for vod_id in ("x", "y"):
+        store_vod(manifest, stream_dir, vod_id, last_access=None)
+        manifest.add_refs(vod_id, blob)
+    manifest.pin("y")
+
+    assert manifest.evict(str(chats_dir), max_bytes=0) == []
+    assert os.path.exists(blob)
+    assert len(os.listdir(stream_dir)) == 4
+
+
+def test_remove_unreferenced_keeps_referenced_blobs(manifest, chats_dir):
+    referenced = write_file(chats_dir, "a.chat", 10)
+    orphan = write_file(chats_dir, "b.ndjson.gz", 10)
+    for path in (referenced, orphan):
+        manifest.record(path)
+    manifest.add_refs("vod", referenced)
+
+    assert manifest.remove_unreferenced(referenced, orphan) == [orphan]
+    assert os.listdir(chats_dir) == ["a.chat"]
+
+    manifest.set_refs("vod")
+    assert manifest.remove_unreferenced(referenced) == [referenced]
+
+
+def test_sync_restores_refs(manifest, stream_dir, chats_dir):
+    blob = write_file(chats_dir, "c.chat", 10)
+    write_file(stream_dir, "v.json.gz", 10)
+    write_file(stream_dir, "w.json.gz", 10)
+    read_refs = {str(stream_dir / "v.json.gz"): [blob]}.get
+
+    manifest.sync(str(chats_dir))
+    manifest.sync(str(stream_dir), read_refs=read_refs)
+
+    assert manifest.refs("v") == [blob]
+    assert manifest.refs("w") == []
@@ -0,0 +1,116 @@
+import json
+import threading
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+import redis
+import redis_client
+import task_progress
+from task_progress import (DONE, FALLBACK, ProgressReporter, get_channel, iter_task_events, publish_done,
+                           publish_event)
+
+TASK_ID = "task-1"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+    monkeypatch.setattr(redis_client, "_client", client)
+    monkeypatch.setattr(task_progress, "get_redis", lambda: client)
+    return client
+
+
+def parse_sse(chunk):
+    """Разбирает одно сообщение SSE: событие для "data: ...", None для пинга."""
+    assert chunk.endswith("\n\n"), chunk
+    if chunk.startswith(":"):
+        return None
+    assert chunk.startswith("data: "), chunk
+    return json.loads(chunk[len("data: "):-2])
+
+
+def read_events(stream):
+    return [event for event in map(parse_sse, stream) if event is not None]
+
+
+def test_streams_published_events_until_done(client):
+    # Событие, опубликованное до подключения, приходит первым (из ключа с последним событием)
+    reporter = ProgressReporter(TASK_ID, min_interval=0)
+    reporter("chat_download", pages=1, messages=50)
+    stream = iter_task_events(TASK_ID, heartbeat=0.05)
+
+    assert parse_sse(next(stream)) == {"type": "progress", "stage": "chat_download", "pages": 1, "messages": 50}
+
+    def publish():
+        reporter("chat_download", pages=2, messages=100)
+        reporter("save", status="started")
+        publish_done(TASK_ID, "success", {"file_path": "x.json.gz"})
+
+    publisher = threading.Thread(target=publish)
+    publisher.start()
+    events = read_events(stream)
+    publisher.join()
+
+    assert events == [
+        {"type": "progress", "stage": "chat_download", "pages": 2, "messages": 100},
+        {"type": "progress", "stage": "save", "status": "started"},
+        {"type": DONE, "status": "success", "result": {"file_path": "x.json.gz"}},
+    ]
+    assert client.pubsub_numsub(get_channel(TASK_ID)) == [(get_channel(TASK_ID).encode(), 0)]
+
+
+def test_late_subscriber_gets_done_immediately(client):
+    publish_done(TASK_ID, "failure", "ошибка")
+
+    assert read_events(iter_task_events(TASK_ID)) == [{"type": DONE, "status": "failure", "result": "ошибка"}]
+
+
+def test_initial_event_is_sent_without_redis(monkeypatch):
+    def broken_redis():
+        raise AssertionError("Redis не нужен")
+
+    monkeypatch.setattr(task_progress, "get_redis", broken_redis)
+    done = {"type": DONE, "status": "success", "result": 1}
+
+    assert read_events(iter_task_events(TASK_ID, initial_event=done)) == [done]
+
+
+def test_heartbeat_and_malformed_messages(client):
+    stream = iter_task_events(TASK_ID, heartbeat=0.05)
+
+    assert next(stream) == ": ping\n\n"
+    client.publish(get_channel(TASK_ID), "не JSON")
+    publish_event(TASK_ID, {"type": DONE, "status": "success", "result": None})
+
+    assert read_events(stream) == [{"type": DONE, "status": "success", "result": None}]
+
+
+def test_malformed_last_event_is_ignored(client):
+    client.set(get_channel(TASK_ID), "{оборванный")
+    stream = iter_task_events(TASK_ID, heartbeat=0.05)
+
+    assert next(stream) == ": ping\n\n"
+    stream.close()
+
+
+def test_redis_error_ends_stream_with_fallback(client, monkeypatch):
+    stream = iter_task_events(TASK_ID, heartbeat=0.05)
+    assert next(stream) == ": ping\n\n"
+
+    def broken_get_message(self, *args, **kwargs):
+        raise redis.ConnectionError("соединение с Redis потеряно")
+
+    monkeypatch.setattr(type(client.pubsub()), "get_message", broken_get_message)
+
+    assert read_events(stream) == [{"type": FALLBACK}]
+
+
+def test_unavailable_redis_sends_fallback(monkeypatch):
+    def broken_redis():
+        raise redis.ConnectionError("Redis недоступен")
+
+    monkeypatch.setattr(task_progress, "get_redis", broken_redis)
+
+    assert read_events(iter_task_events(TASK_ID)) == [{"type": FALLBACK}]
@@ -0,0 +1,101 @@
+import pytest
+
+from conftest import make_sample_chat
+from data_processors.chat_store import ChatStore, write_chat_store
+from data_processors.token_index import TokenIndex, build_token_index, open_token_index
+
+BODIES = [
+    "lolol lol LOL",
+    "ab cd",  # "bc" есть в словаре только через границу токенов "ab\ncd"
+    "Привет ЧАТ привет",
+    "Straße STRASSE",
+    "emoji🙂emoji 🙂",
+    "",
+    "   ",
+    "kappa123 Kappa kappa",
+    "ΣΑΣ σας",
+    "lo",
+    "tab\tseparated\nnew line",
+]
+KEYWORDS = [
+    "lo", "lol", "olo", "l", "LOL",  # несколько вхождений в одном токене
+    "bc", "b", "c", "abcd",  # стык токенов
+    "привет", "ПРИВ", "ет", "чат",  # не-ASCII и регистр
+    "straße", "STRASSE", "ss",
+    "🙂", "oji🙂e",
+    "kappa", "123", "a1",
+    "σας", "ΣΑΣ", "ας",
+    "tab", "separated", "new",
+    "нет такого", "zzz",
+]
+
+
+def make_chat(bodies):
+    return [{
+        "_id": str(i),
+        "content_offset_seconds": i,
+        "commenter": {"display_name": "U", "_id": "1", "name": "u"},
+        "message": {"body": body},
+    } for i, body in enumerate(bodies)]
+
+
+def build(tmp_path, bodies):
+    store_path = str(tmp_path / "chat.chat")
+    write_chat_store(store_path, {"chat": make_chat(bodies)})
+    store = ChatStore(store_path)
+    index_path = str(tmp_path / "chat.idx")
+    build_token_index(store, index_path)
+    return store, index_path
+
+
+def brute_force(bodies, keyword):
+    """Поиск подстроки без учёта регистра — то, что делает KeywordMatcher без regex."""
+    return [i for i, body in enumerate(bodies) if keyword.lower() in body.lower()]
+
+
+@pytest.mark.parametrize("bodies", [BODIES, [msg["message"]["body"] for msg in make_sample_chat()]],
+                         ids=["edge-cases", "sample-chat"])
+def test_lookup_matches_substring_scan(tmp_path, bodies):
+    store, index_path = build(tmp_path, bodies)
+    with store, TokenIndex(index_path) as index:
+        assert index.messages == len(bodies)
+        for keyword in KEYWORDS + ["Kappa", "OMEGALUL", "gg", "pog"]:
+            if index.supports(keyword):
+                assert index.lookup(keyword).tolist() == brute_force(bodies, keyword), keyword
+
+
+def test_supports_only_plain_keywords_without_spaces(tmp_path):
+    store, index_path = build(tmp_path, BODIES)
+    with store, TokenIndex(index_path) as index:
+        assert index.supports("lol")
+        assert not index.supports("нет такого")
+        assert not index.supports("tab\tsep")
+        assert not index.supports("")
+        assert not index.supports("lo+l", use_regex=True)
+
+
+def test_open_token_index_checks_content_hash(tmp_path):
+    store, index_path = build(tmp_path, BODIES)
+    with store:
+        index = open_token_index(index_path, store.content_sha256)
+        assert index is not None
+        index.close()
+
+        assert open_token_index(index_path, "0" * 64) is None
+        assert open_token_index(str(tmp_path / "missing.idx"), store.content_sha256) is None
+
+
+def test_open_token_index_rejects_other_chat(tmp_path):
+    store, index_path = build(tmp_path, BODIES)
+    other_path = str(tmp_path / "other.chat")
+    write_chat_store(other_path, {"chat": make_chat(BODIES[:-1])})
+    with store, ChatStore(other_path) as other:
+        assert other.content_sha256 != store.content_sha256
+        assert open_token_index(index_path, other.content_sha256) is None
+
+
+def test_open_token_index_rejects_broken_file(tmp_path):
+    path = tmp_path / "broken.idx"
+    path.write_bytes(b"\0" * 64)
+
+    assert open_token_index(str(path)) is None